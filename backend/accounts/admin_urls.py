@@ -6,6 +6,7 @@ from .admin_views import (
     AdminRestaurantListView,
     AdminRestaurantApprovalView,
     AdminOrderListView,
+    AdminCacheStatsView,
 )
 
 urlpatterns = [
@@ -15,4 +16,5 @@ urlpatterns = [
     path('restaurants/', AdminRestaurantListView.as_view(), name='admin-restaurants'),
     path('restaurants/<int:pk>/approve/', AdminRestaurantApprovalView.as_view(), name='admin-restaurant-approve'),
     path('orders/', AdminOrderListView.as_view(), name='admin-orders'),
+    path('cache-stats/', AdminCacheStatsView.as_view(), name='admin-cache-stats'),
 ]
@@ -3,6 +3,7 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
+from core.pagination import KeysetPaginationMixin
 from django.db.models import Count, Sum, Q
 from django.db.models.functions import TruncDate
 from django.utils import timezone
@@ -13,11 +14,12 @@ from accounts.models import CustomUser
 from accounts.serializers import UserProfileSerializer
 from restaurants.models import Restaurant
 from restaurants.serializers import RestaurantListSerializer
+from restaurants.cache import get_stats as get_restaurant_cache_stats
 from orders.models import Order
 from orders.serializers import OrderListSerializer
 
 
-class StandardPagination(PageNumberPagination):
+class StandardPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
 
@@ -213,7 +215,7 @@ class AdminOrderListView(generics.ListAPIView):
     pagination_class = StandardPagination
 
     def get_queryset(self):
-        qs = Order.objects.select_related('user', 'restaurant').order_by('-created_at')
+        qs = Order.objects.for_list().order_by('-created_at')
         order_status = self.request.query_params.get('status')
         payment_status = self.request.query_params.get('payment_status')
         date_from = self.request.query_params.get('date_from')
@@ -228,3 +230,10 @@ class AdminOrderListView(generics.ListAPIView):
         if date_to:
             qs = qs.filter(created_at__date__lte=date_to)
         return qs
+
+
+class AdminCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response({'restaurant_detail': get_restaurant_cache_stats()})
@@ -9,6 +9,7 @@ from restaurants.models import Restaurant, RestaurantCategory
 from menu.models import MenuCategory, MenuItem
 from orders.models import Order, OrderItem
 from reviews.models import Review
+from reviews.services import RatingService
 
 
 class Command(BaseCommand):
@@ -193,6 +194,7 @@ class Command(BaseCommand):
                 is_active=True, is_approved=True,
                 average_rating=Decimal(str(r['average_rating'])),
                 total_reviews=r['total_reviews'],
+                rating_sum=round(r['average_rating'] * r['total_reviews']),
                 minimum_order=Decimal(str(r['minimum_order'])),
                 delivery_fee=Decimal(str(r['delivery_fee'])),
                 estimated_delivery_time=r['estimated_delivery_time'],
@@ -478,14 +480,9 @@ class Command(BaseCommand):
             reviews_created += 1
 
         # Update restaurant ratings from actual reviews
-        for rest in restaurant_objs:
-            reviews = Review.objects.filter(restaurant=rest)
-            if reviews.exists():
-                from django.db.models import Avg
-                avg = reviews.aggregate(a=Avg('rating'))['a']
-                rest.average_rating = Decimal(str(round(avg, 2)))
-                rest.total_reviews = reviews.count()
-                rest.save(update_fields=['average_rating', 'total_reviews'])
+        RatingService.recompute(Restaurant.objects.filter(
+            pk__in=Review.objects.filter(restaurant__in=restaurant_objs).values('restaurant')
+        ))
 
         self.stdout.write(f'  Created {reviews_created} reviews')
 
@@ -24,6 +24,7 @@ class CustomUser(AbstractUser):
             models.Index(fields=['user_type']),
             models.Index(fields=['email']),
             models.Index(fields=['city']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
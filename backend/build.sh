@@ -3,5 +3,8 @@ set -o errexit
 
 pip install -r requirements.txt
 
+python manage.py check --deploy --fail-level ERROR
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py update_search_vectors --missing
+python manage.py recompute_ratings --missing
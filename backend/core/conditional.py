@@ -0,0 +1,60 @@
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class NotModified(Exception):
+    pass
+
+
+class ConditionalGetMixin:
+    """Answer ``If-None-Match`` with 304 before any query or serialization runs.
+
+    Every view using it must define ``get_etag_version()``, returning a
+    cheap version token for the rows behind the response, or ``None`` to
+    skip validation. The ETag also covers the full path, so each filter and
+    page gets its own. The check runs after authentication, permissions and
+    throttling.
+
+    Version tokens live in the cache, so ETags are only sent when the cache
+    is shared by every process (``settings.CACHE_SHARED``). With a
+    per-process cache a write made elsewhere would never change them.
+    """
+
+    etag = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not callable(getattr(cls, 'get_etag_version', None)):
+            raise ImproperlyConfigured(f'{cls.__name__} must define get_etag_version().')
+
+    def get_etag(self, request):
+        if not settings.CACHE_SHARED:
+            return None
+        version = self.get_etag_version()
+        if version is None:
+            return None
+        digest = hashlib.md5(f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+        return quote_etag(digest)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self.etag = self.get_etag(request)
+            if self.etag and self.etag in parse_etags(request.headers.get('If-None-Match', '')):
+                raise NotModified
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.etag
+        return response
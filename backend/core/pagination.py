@@ -0,0 +1,121 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPaginationMixin:
+    """Opt-in keyset (cursor) pagination for page-number paginators.
+
+    Requests with ``?pagination=cursor`` or a ``cursor`` parameter are paged
+    by the queryset's own ordering plus an ``id`` tiebreaker: the cursor holds
+    the last row's sort values and the next page is fetched with a
+    ``WHERE (ordering) < (cursor)`` filter, so it costs the same at any depth
+    and needs no ``COUNT(*)``. Other requests keep page-number pagination.
+    Ordering fields must be non-null.
+    """
+
+    cursor_query_param = 'cursor'
+    cursor_mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def use_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.cursor_mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.use_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.ordering = self.get_keyset_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            try:
+                queryset = queryset.filter(self.keyset_filter(self.decode_cursor(token)))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({'next': self.get_next_cursor_link(), 'results': data})
+
+    # ── Keyset helpers ───────────────────────────────────
+
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        ordering = [o for o in ordering if isinstance(o, str) and o != '?']
+        names = {o.lstrip('-') for o in ordering}
+        if 'id' not in names and 'pk' not in names:
+            descending = ordering[0].startswith('-') if ordering else True
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    def keyset_filter(self, values):
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_next_cursor_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        values = [self._encode_value(self._get_value(last, field.lstrip('-'))) for field in self.ordering]
+        token = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, token):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def _get_value(obj, name):
+        for part in name.split('__'):
+            obj = getattr(obj, part)
+        return obj
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+
+class DefaultPagination(KeysetPaginationMixin, PageNumberPagination):
+    pass
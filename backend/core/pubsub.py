@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker named by ``settings.EVENT_BROKER``."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENT_BROKER)()
+    return _broker
+
+
+class Subscription:
+    def __init__(self, broker, channels, maxsize):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def offer(self, message):
+        # Runs on the subscriber's loop. A client that stops reading loses
+        # its oldest messages rather than growing the queue without bound.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Wait for the next message; ``None`` if ``timeout`` passes first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fan messages out to subscribers in this process.
+
+    ``publish`` may be called from any thread, including sync views running
+    under ASGI. Messages published by another process (the payment worker,
+    another web worker) never arrive; deployments with more than one
+    process use ``PostgresBroker``. Clients only ever see messages
+    published after they subscribed.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, message)
+            except RuntimeError:
+                # The subscriber's loop is gone; it will unsubscribe itself.
+                pass
+
+    def subscribe(self, channels):
+        """Return a ``Subscription``; use it as ``async with`` to clean up."""
+        subscription = Subscription(self, channels, self.maxsize)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+
+class PostgresBroker(InProcessBroker):
+    """Carry messages between processes with Postgres ``LISTEN``/``NOTIFY``.
+
+    ``publish`` sends a notification on the default database, delivered
+    once the publishing transaction commits. The first ``subscribe`` in a
+    process starts a thread holding one ``LISTEN`` connection, which hands
+    what arrives to that process's subscribers. Messages must be JSON and
+    under Postgres's 8000-byte payload limit.
+    """
+
+    CHANNEL = 'feastdash_events'
+
+    def __init__(self, maxsize=100, alias=DEFAULT_DB_ALIAS):
+        super().__init__(maxsize)
+        self.alias = alias
+        self.listening = threading.Event()
+        self._closed = threading.Event()
+        self._listener = None
+
+    def publish(self, channel, message):
+        payload = json.dumps({'channel': channel, 'message': message}, cls=DjangoJSONEncoder)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.CHANNEL, payload])
+
+    def subscribe(self, channels):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+        return super().subscribe(channels)
+
+    def close(self):
+        """Stop listening and drop the listener's connection."""
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.join()
+
+    def _listen(self):
+        while not self._closed.is_set():
+            try:
+                self._listen_once()
+            except Exception:
+                logger.exception('Lost the event listener connection; reconnecting.')
+                time.sleep(1)
+            self.listening.clear()
+
+    def _listen_once(self):
+        wrapper = connections.create_connection(self.alias)
+        try:
+            wrapper.ensure_connection()
+            conn = wrapper.connection
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.CHANNEL}')
+            self.listening.set()
+            while not self._closed.is_set():
+                if select.select([conn], [], [], 1) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    data = json.loads(conn.notifies.pop(0).payload)
+                    super().publish(data['channel'], data['message'])
+        finally:
+            wrapper.close()
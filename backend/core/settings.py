@@ -15,6 +15,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Third party
     'rest_framework',
     'rest_framework_simplejwt',
@@ -154,7 +155,7 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.DefaultPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_THROTTLE_CLASSES': [
@@ -165,6 +166,7 @@ REST_FRAMEWORK = {
         'anon': '50/hour',
         'user': '200/hour',
         'auth': '100/minute',
+        'suggest': '120/minute',
     },
 }
 
@@ -177,6 +179,64 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Caching. Cached payloads and their version keys must be seen by every
+# process that serves or changes them (web workers, the payment worker,
+# cron jobs, management commands), so deployments set REDIS_URL. The
+# local-memory fallback is only correct for a single development process;
+# `check --deploy` fails without a shared cache.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+CACHE_SHARED = bool(REDIS_URL)
+RESTAURANT_DETAIL_CACHE_TIMEOUT = config('RESTAURANT_DETAIL_CACHE_TIMEOUT', default=60 * 15, cast=int)
+SUGGEST_INDEX_MAX_AGE = config('SUGGEST_INDEX_MAX_AGE', default=60 * 5, cast=int)
+
+# Carts: 'orders.carts.DatabaseCartBackend' or 'orders.carts.CacheCartBackend'.
+# The cache backend needs a cache shared by all workers and a periodic
+# `manage.py flush_carts` to persist carts.
+CART_BACKEND = config('CART_BACKEND', default='orders.carts.DatabaseCartBackend')
+CART_CACHE_TIMEOUT = config('CART_CACHE_TIMEOUT', default=60 * 60 * 24 * 7, cast=int)
+
+# Payment job queue: seconds a worker holds a job, and gateway attempts before failing it
+PAYMENT_JOB_LEASE = config('PAYMENT_JOB_LEASE', default=60, cast=int)
+PAYMENT_JOB_MAX_ATTEMPTS = config('PAYMENT_JOB_MAX_ATTEMPTS', default=5, cast=int)
+
+# Payment gateways: an HTTP adapter when <METHOD>_GATEWAY_URL is set, otherwise the simulator
+PAYMENT_GATEWAY_TIMEOUT = config('PAYMENT_GATEWAY_TIMEOUT', default=5, cast=float)
+PAYMENT_GATEWAY_POOL_SIZE = config('PAYMENT_GATEWAY_POOL_SIZE', default=4, cast=int)
+PAYMENT_GATEWAYS = {
+    method: {
+        'BACKEND': 'payments.gateways.HTTPGateway',
+        'OPTIONS': {'url': url, 'timeout': PAYMENT_GATEWAY_TIMEOUT, 'pool_size': PAYMENT_GATEWAY_POOL_SIZE},
+    } if url else {'BACKEND': 'payments.gateways.SimulatedGateway'}
+    for method, url in (
+        ('jazzcash', config('JAZZCASH_GATEWAY_URL', default='')),
+        ('easypaisa', config('EASYPAISA_GATEWAY_URL', default='')),
+        ('card', config('CARD_GATEWAY_URL', default='')),
+    )
+}
+
+# Shared secrets for verifying gateway webhooks (HMAC-SHA256 of the body); empty disables a gateway's webhook
+PAYMENT_WEBHOOK_SECRETS = {
+    'jazzcash': config('JAZZCASH_WEBHOOK_SECRET', default=''),
+    'easypaisa': config('EASYPAISA_WEBHOOK_SECRET', default=''),
+    'card': config('CARD_WEBHOOK_SECRET', default=''),
+}
+
+# Idempotency-Key replays are kept this long (seconds)
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24, cast=int)
+
+# Live order updates (server-sent events). The in-process broker only
+# reaches streams in the publishing process; deployments use
+# core.pubsub.PostgresBroker so the payment worker's events get through.
+EVENT_BROKER = config('EVENT_BROKER', default='core.pubsub.InProcessBroker')
+EVENT_STREAM_KEEPALIVE = config('EVENT_STREAM_KEEPALIVE', default=15, cast=int)
+
 # Email (Gmail SMTP)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -0,0 +1,62 @@
+"""Fixtures shared by the app test suites."""
+from decimal import Decimal
+
+from accounts.models import CustomUser
+from menu.models import MenuCategory, MenuItem
+from orders.models import Order
+from restaurants.models import Restaurant
+
+
+def create_customer(username='cust', **fields):
+    fields = {'first_name': 'Cust', 'last_name': 'User', **fields}
+    return CustomUser.objects.create_user(
+        username=username, email=f'{username}@test.com', password='test1234',
+        user_type='customer', **fields,
+    )
+
+
+def create_owner(username='owner', **fields):
+    return CustomUser.objects.create_user(
+        username=username, email=f'{username}@test.com', password='test1234',
+        user_type='restaurant_owner', **fields,
+    )
+
+
+def create_restaurant(owner, name='Test Resto', slug='test-resto', **fields):
+    fields = {
+        'address': '1 St', 'city': 'Karachi', 'phone': '021111', 'email': 'r@t.com',
+        'cuisine_type': 'Pakistani', 'is_active': True, 'is_approved': True,
+        'delivery_fee': Decimal('100'), 'minimum_order': Decimal('200'),
+        'estimated_delivery_time': 30, 'opening_time': '10:00:00', 'closing_time': '23:00:00',
+        **fields,
+    }
+    return Restaurant.objects.create(owner=owner, name=name, slug=slug, **fields)
+
+
+def create_menu_item(restaurant, name='Item 1', slug='item-1', price=Decimal('300'), category=None, **fields):
+    if category is None:
+        category, _ = MenuCategory.objects.get_or_create(restaurant=restaurant, name='Main')
+    return MenuItem.objects.create(
+        category=category, restaurant=restaurant, name=name, slug=slug, price=price, **fields,
+    )
+
+
+def create_order(user, restaurant, **fields):
+    fields = {
+        'total_amount': Decimal('300'), 'grand_total': Decimal('415'),
+        'delivery_address': '1 St', 'delivery_city': 'Karachi',
+        **fields,
+    }
+    return Order.objects.create(user=user, restaurant=restaurant, **fields)
+
+
+class MarketplaceFixtures:
+    """Test case mixin: a customer, a restaurant owner and the owner's
+    approved "Test Resto" with one menu item."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+        self.owner = create_owner()
+        self.restaurant = create_restaurant(self.owner)
+        self.item = create_menu_item(self.restaurant)
@@ -0,0 +1,54 @@
+# Generated by Django 5.1 on 2026-10-17 22:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_menuitem_search_vector_and_more'),
+        ('restaurants', '0006_restaurant_menu_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('category', 'Category'), ('item', 'Item')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('menu_version', models.PositiveBigIntegerField()),
+            ],
+            options={
+                'ordering': ['menu_version'],
+            },
+        ),
+        migrations.AddField(
+            model_name='menucategory',
+            name='menu_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='menu_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='menucategory',
+            index=models.Index(fields=['restaurant', 'menu_version'], name='menu_menuca_restaur_76f6cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['restaurant', 'menu_version'], name='menu_menuit_restaur_de83e7_idx'),
+        ),
+        migrations.AddField(
+            model_name='menutombstone',
+            name='restaurant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='menu_tombstones', to='restaurants.restaurant'),
+        ),
+        migrations.AddIndex(
+            model_name='menutombstone',
+            index=models.Index(fields=['restaurant', 'menu_version'], name='menu_menuto_restaur_734697_idx'),
+        ),
+    ]
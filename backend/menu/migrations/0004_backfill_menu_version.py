@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+
+def stamp_existing_rows(apps, schema_editor):
+    # Rows written before versioning sit at 0, which ``since=0`` never
+    # returns. Give each restaurant a new version and stamp them with it.
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    Restaurant.objects.update(menu_version=F('menu_version') + 1)
+    version = Subquery(Restaurant.objects.filter(pk=OuterRef('restaurant_id')).values('menu_version'))
+    for model in ('MenuCategory', 'MenuItem'):
+        apps.get_model('menu', model).objects.filter(menu_version=0).update(menu_version=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_menutombstone_menucategory_menu_version_and_more'),
+        ('restaurants', '0006_restaurant_menu_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(stamp_existing_rows, migrations.RunPython.noop),
+    ]
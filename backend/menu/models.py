@@ -1,7 +1,26 @@
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from restaurants.models import Restaurant
 
 
-class MenuCategory(models.Model):
+class MenuVersionedModel(models.Model):
+    menu_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'menu_version'}
+        # Keep the restaurant row locked until this write commits.
+        with transaction.atomic():
+            self.menu_version = Restaurant.next_menu_version(self.restaurant_id)
+            super().save(*args, **kwargs)
+
+
+class MenuCategory(MenuVersionedModel):
     restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='menu_categories')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -11,12 +30,15 @@ class MenuCategory(models.Model):
     class Meta:
         ordering = ['sort_order', 'name']
         verbose_name_plural = 'Menu Categories'
+        indexes = [
+            models.Index(fields=['restaurant', 'menu_version']),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.restaurant.name}"
 
 
-class MenuItem(models.Model):
+class MenuItem(MenuVersionedModel):
     category = models.ForeignKey(MenuCategory, on_delete=models.CASCADE, related_name='items')
     restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='menu_items')
     name = models.CharField(max_length=200)
@@ -30,13 +52,43 @@ class MenuItem(models.Model):
     is_spicy = models.BooleanField(default=False)
     preparation_time = models.PositiveIntegerField(help_text='Preparation time in minutes', default=15)
     created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    SEARCH_FIELDS = ('name', 'description')
 
     class Meta:
         ordering = ['category__sort_order', 'name']
         indexes = [
             models.Index(fields=['restaurant', 'is_available']),
             models.Index(fields=['slug']),
+            GinIndex(fields=['search_vector']),
+            models.Index(fields=['restaurant', 'menu_version']),
         ]
 
+    @classmethod
+    def search_vector_expression(cls):
+        return SearchVector(*cls.SEARCH_FIELDS)
+
     def __str__(self):
         return f"{self.name} - Rs. {self.price}"
+
+
+class MenuTombstone(models.Model):
+    KIND_CHOICES = [
+        ('category', 'Category'),
+        ('item', 'Item'),
+    ]
+
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='menu_tombstones')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    menu_version = models.PositiveBigIntegerField()
+
+    class Meta:
+        ordering = ['menu_version']
+        indexes = [
+            models.Index(fields=['restaurant', 'menu_version']),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.kind} #{self.object_id} (v{self.menu_version})"
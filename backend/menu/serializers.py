@@ -75,3 +75,20 @@ class MenuCategoryWithItemsSerializer(serializers.ModelSerializer):
     class Meta:
         model = MenuCategory
         fields = ['id', 'name', 'description', 'sort_order', 'is_active', 'items']
+
+
+class MenuCategorySyncSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MenuCategory
+        fields = ['id', 'name', 'description', 'sort_order', 'is_active']
+
+
+class MenuImportRowSerializer(serializers.ModelSerializer):
+    category = serializers.CharField(max_length=100)
+
+    class Meta:
+        model = MenuItem
+        fields = [
+            'category', 'name', 'description', 'price', 'discounted_price',
+            'is_available', 'is_vegetarian', 'is_spicy', 'preparation_time',
+        ]
@@ -0,0 +1,85 @@
+import csv
+import io
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils.text import slugify
+
+from restaurants.cache import bump_version
+from restaurants.models import Restaurant
+from restaurants.suggest import suggest_index
+from .models import MenuCategory, MenuItem
+from .serializers import MenuImportRowSerializer
+
+MAX_IMPORT_ROWS = 1000
+
+
+class MenuImportService:
+    @staticmethod
+    def parse_csv(file):
+        text = io.TextIOWrapper(file, encoding='utf-8-sig')
+        # Blank cells mean "use the default", not an empty value.
+        return [
+            {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip() != ''}
+            for row in csv.DictReader(text)
+        ]
+
+    @staticmethod
+    def validate_rows(rows):
+        """Return ``(validated_rows, errors)``; ``errors`` lists rows by index."""
+        validated, errors = [], []
+        for index, row in enumerate(rows):
+            serializer = MenuImportRowSerializer(data=row)
+            if serializer.is_valid():
+                validated.append(serializer.validated_data)
+            else:
+                errors.append({'row': index, 'errors': serializer.errors})
+        return validated, errors
+
+    @staticmethod
+    @transaction.atomic
+    def import_rows(restaurant, rows):
+        # One version for the whole import; bulk_create skips save().
+        version = Restaurant.next_menu_version(restaurant.pk)
+        categories = {c.name.lower(): c for c in MenuCategory.objects.filter(restaurant=restaurant)}
+        next_sort = (
+            MenuCategory.objects.filter(restaurant=restaurant).aggregate(m=Max('sort_order'))['m'] or 0
+        ) + 1
+
+        new_categories = []
+        for row in rows:
+            key = row['category'].strip().lower()
+            if key not in categories:
+                categories[key] = MenuCategory(
+                    restaurant=restaurant, name=row['category'].strip(), sort_order=next_sort,
+                    menu_version=version,
+                )
+                new_categories.append(categories[key])
+                next_sort += 1
+        MenuCategory.objects.bulk_create(new_categories)
+
+        # Same suffixing as MenuItemCreateUpdateSerializer._unique_slug, but
+        # resolved against one prefetched set instead of a query per attempt.
+        taken = set(MenuItem.objects.filter(restaurant=restaurant).values_list('slug', flat=True))
+        items = []
+        for row in rows:
+            fields = dict(row)
+            category = categories[fields.pop('category').strip().lower()]
+            base = slug = slugify(fields['name'])
+            n = 1
+            while slug in taken:
+                slug = f"{base}-{n}"
+                n += 1
+            taken.add(slug)
+            items.append(MenuItem(
+                restaurant=restaurant, category=category, slug=slug, menu_version=version, **fields,
+            ))
+        MenuItem.objects.bulk_create(items)
+
+        # bulk_create skips post_save, so do what the signal handlers would.
+        MenuItem.objects.filter(pk__in=[i.pk for i in items]).update(
+            search_vector=MenuItem.search_vector_expression(),
+        )
+        transaction.on_commit(lambda: bump_version(restaurant.slug))
+        transaction.on_commit(lambda: suggest_index.refresh_restaurant(restaurant))
+        return new_categories, items
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from restaurants.models import Restaurant
+from .models import MenuCategory, MenuItem, MenuTombstone
+
+
+@receiver(post_save, sender=MenuItem)
+def update_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & set(MenuItem.SEARCH_FIELDS):
+        MenuItem.objects.filter(pk=instance.pk).update(
+            search_vector=MenuItem.search_vector_expression(),
+        )
+
+
+@receiver(post_delete, sender=MenuCategory)
+@receiver(post_delete, sender=MenuItem)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    # Nothing to sync when the whole restaurant is going away.
+    if isinstance(origin, Restaurant):
+        return
+    MenuTombstone.objects.create(
+        restaurant_id=instance.restaurant_id,
+        kind='category' if sender is MenuCategory else 'item',
+        object_id=instance.pk,
+        menu_version=Restaurant.next_menu_version(instance.restaurant_id),
+    )
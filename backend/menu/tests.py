@@ -1,3 +1,131 @@
-from django.test import TestCase
+from decimal import Decimal
+from importlib import import_module
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APITestCase
+from rest_framework import status
+from restaurants.models import Restaurant
+from .models import MenuCategory, MenuItem
+from core.testing import create_menu_item, create_owner, create_restaurant
 
-# Create your tests here.
+
+class MenuImportTests(APITestCase):
+    def setUp(self):
+        self.owner = create_owner()
+        self.restaurant = create_restaurant(self.owner)
+        cat = MenuCategory.objects.create(restaurant=self.restaurant, name='Rice')
+        create_menu_item(self.restaurant, name='Biryani', slug='biryani', price=Decimal('450'), category=cat)
+        self.url = f'/api/restaurants/{self.restaurant.slug}/menu/import/'
+
+    def _auth(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_import_json(self):
+        self._auth(self.owner)
+        items = [
+            {'category': 'rice', 'name': 'Biryani', 'price': '500'},
+            {'category': 'Rice', 'name': 'Biryani', 'price': '550'},
+            {'category': 'Drinks', 'name': 'Lassi', 'price': '150', 'is_vegetarian': True},
+        ]
+        with self.assertNumQueries(12):
+            resp = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['created_categories'], 1)
+        self.assertEqual(
+            [i['slug'] for i in resp.data['items']], ['biryani-1', 'biryani-2', 'lassi'],
+        )
+        self.assertEqual(MenuCategory.objects.filter(restaurant=self.restaurant).count(), 2)
+        self.assertTrue(MenuItem.objects.get(slug='lassi').is_vegetarian)
+        self.assertIsNotNone(MenuItem.objects.get(slug='lassi').search_vector)
+
+    def test_import_csv(self):
+        self._auth(self.owner)
+        csv_file = SimpleUploadedFile(
+            'menu.csv',
+            b'category,name,price,discounted_price,is_spicy\n'
+            b'Grill,Seekh Kabab,600,,yes\n'
+            b'Grill,Tikka,700,650,no\n',
+            content_type='text/csv',
+        )
+        resp = self.client.post(self.url, {'file': csv_file}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['created_items'], 2)
+        self.assertTrue(MenuItem.objects.get(slug='seekh-kabab').is_spicy)
+        self.assertEqual(MenuItem.objects.get(slug='tikka').discounted_price, Decimal('650'))
+
+    def test_import_reports_row_errors(self):
+        self._auth(self.owner)
+        items = [
+            {'category': 'Rice', 'name': 'Pulao', 'price': '400'},
+            {'category': 'Rice', 'name': 'Zarda'},
+        ]
+        resp = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['errors'][0]['row'], 1)
+        self.assertIn('price', resp.data['errors'][0]['errors'])
+        self.assertFalse(MenuItem.objects.filter(slug='pulao').exists())
+
+    def test_import_by_other_owner(self):
+        other = create_owner('other')
+        self._auth(other)
+        resp = self.client.post(self.url, {'items': [{'category': 'X', 'name': 'Y', 'price': '1'}]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MenuChangesTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = create_owner()
+        self.restaurant = create_restaurant(self.owner)
+        self.category = MenuCategory.objects.create(restaurant=self.restaurant, name='Rice')
+        self.item = create_menu_item(
+            self.restaurant, name='Biryani', slug='biryani', price=Decimal('450'), category=self.category,
+        )
+        self.url = f'/api/restaurants/{self.restaurant.slug}/menu/changes/'
+
+    def test_full_sync(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['version'], 2)
+        self.assertEqual([c['id'] for c in resp.data['categories']], [self.category.id])
+        self.assertEqual([i['slug'] for i in resp.data['items']], ['biryani'])
+
+    def test_delta_returns_only_changes_and_removals(self):
+        since = self.client.get(self.url).data['version']
+        self.item.price = Decimal('500')
+        self.item.save(update_fields=['price'])
+        extra = MenuItem.objects.create(
+            category=self.category, restaurant=self.restaurant, name='Pulao',
+            slug='pulao', price=Decimal('350'),
+        )
+        extra_id = extra.id
+        extra.delete()
+
+        resp = self.client.get(self.url, {'since': since})
+        self.assertEqual(resp.data['version'], since + 3)
+        self.assertEqual(resp.data['categories'], [])
+        self.assertEqual([i['slug'] for i in resp.data['items']], ['biryani'])
+        self.assertEqual(resp.data['removed_items'], [extra_id])
+
+        resp = self.client.get(self.url, {'since': resp.data['version']})
+        self.assertEqual(resp.data['items'], [])
+        self.assertEqual(resp.data['removed_items'], [])
+
+    def test_backfill_stamps_rows_written_before_versioning(self):
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(menu_version=0)
+        MenuCategory.objects.update(menu_version=0)
+        MenuItem.objects.update(menu_version=0)
+        self.assertEqual(self.client.get(self.url, {'since': 0}).data['items'], [])
+
+        migration = import_module('menu.migrations.0004_backfill_menu_version')
+        migration.stamp_existing_rows(apps, None)
+        cache.clear()
+        resp = self.client.get(self.url, {'since': 0})
+        self.assertEqual(resp.data['version'], 1)
+        self.assertEqual([c['id'] for c in resp.data['categories']], [self.category.id])
+        self.assertEqual([i['slug'] for i in resp.data['items']], ['biryani'])
+
+    def test_invalid_since(self):
+        resp = self.client.get(self.url, {'since': 'abc'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
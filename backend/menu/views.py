@@ -1,16 +1,22 @@
 from rest_framework import generics, status, filters
+from rest_framework.views import APIView
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
 from accounts.permissions import IsRestaurantOwner
+from core.conditional import ConditionalGetMixin
 from restaurants.models import Restaurant
-from .models import MenuCategory, MenuItem
+from restaurants.cache import get_version
+from .models import MenuCategory, MenuItem, MenuTombstone
 from .serializers import (
     MenuCategorySerializer,
+    MenuCategorySyncSerializer,
     MenuItemListSerializer,
     MenuItemDetailSerializer,
     MenuItemCreateUpdateSerializer,
 )
+from .services import MAX_IMPORT_ROWS, MenuImportService
 
 
 class IsOwnerOrReadOnly:
@@ -58,11 +64,14 @@ class MenuCategoryUpdateDeleteView(IsOwnerOrReadOnly, generics.RetrieveUpdateDes
         instance.delete()
 
 
-class MenuItemListCreateView(IsOwnerOrReadOnly, generics.ListCreateAPIView):
+class MenuItemListCreateView(ConditionalGetMixin, IsOwnerOrReadOnly, generics.ListCreateAPIView):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['category', 'is_available', 'is_vegetarian']
     search_fields = ['name', 'description']
 
+    def get_etag_version(self):
+        return get_version(self.kwargs['restaurant_slug'])
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return MenuItemCreateUpdateSerializer
@@ -83,10 +92,13 @@ class MenuItemListCreateView(IsOwnerOrReadOnly, generics.ListCreateAPIView):
         serializer.save()
 
 
-class MenuItemDetailView(generics.RetrieveAPIView):
+class MenuItemDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     permission_classes = [AllowAny]
     serializer_class = MenuItemDetailSerializer
 
+    def get_etag_version(self):
+        return get_version(self.kwargs['restaurant_slug'])
+
     def get_queryset(self):
         return MenuItem.objects.filter(
             restaurant__slug=self.kwargs['restaurant_slug']
@@ -98,7 +110,10 @@ class MenuItemDetailView(generics.RetrieveAPIView):
         )
 
 
-class MenuItemUpdateDeleteView(IsOwnerOrReadOnly, generics.RetrieveUpdateDestroyAPIView):
+class MenuItemUpdateDeleteView(ConditionalGetMixin, IsOwnerOrReadOnly, generics.RetrieveUpdateDestroyAPIView):
+
+    def get_etag_version(self):
+        return get_version(self.kwargs['restaurant_slug'])
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -125,3 +140,84 @@ class MenuItemUpdateDeleteView(IsOwnerOrReadOnly, generics.RetrieveUpdateDestroy
         restaurant = self.get_restaurant()
         self.check_owner(self.request, restaurant)
         instance.delete()
+
+
+class MenuChangesView(ConditionalGetMixin, IsOwnerOrReadOnly, APIView):
+    """Menu rows changed or removed since ``?since=<menu_version>``.
+
+    Clients keep the returned ``version`` and send it back as ``since`` on
+    the next sync; ``since=0`` returns the whole menu.
+    """
+    permission_classes = [AllowAny]
+
+    def get_etag_version(self):
+        return get_version(self.kwargs['restaurant_slug'])
+
+    def get(self, request, restaurant_slug):
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            return Response(
+                {'error': '"since" must be a non-negative integer.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        restaurant = self.get_restaurant()
+        # Rows above this version may belong to a write still in flight.
+        changed = {'menu_version__gt': since, 'menu_version__lte': restaurant.menu_version}
+        categories = MenuCategory.objects.filter(restaurant=restaurant, **changed)
+        items = MenuItem.objects.filter(restaurant=restaurant, **changed).select_related('category')
+        removed = {'category': [], 'item': []}
+        for kind, object_id in MenuTombstone.objects.filter(
+            restaurant=restaurant, **changed,
+        ).values_list('kind', 'object_id'):
+            removed[kind].append(object_id)
+
+        return Response({
+            'version': restaurant.menu_version,
+            'since': since,
+            'categories': MenuCategorySyncSerializer(categories, many=True).data,
+            'items': MenuItemListSerializer(items, many=True).data,
+            'removed_categories': removed['category'],
+            'removed_items': removed['item'],
+        })
+
+
+class MenuImportView(IsOwnerOrReadOnly, APIView):
+    permission_classes = [IsAuthenticated, IsRestaurantOwner]
+
+    def post(self, request, restaurant_slug):
+        restaurant = self.get_restaurant()
+        self.check_owner(request, restaurant)
+
+        upload = request.FILES.get('file')
+        if upload:
+            try:
+                rows = MenuImportService.parse_csv(upload)
+            except (UnicodeDecodeError, ValueError):
+                return Response({'error': 'Could not read the CSV file.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {'error': 'Send a non-empty "items" list or a CSV "file".'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(rows) > MAX_IMPORT_ROWS:
+            return Response(
+                {'error': f'At most {MAX_IMPORT_ROWS} rows can be imported at once.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        validated, errors = MenuImportService.validate_rows(rows)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        categories, items = MenuImportService.import_rows(restaurant, validated)
+        return Response({
+            'created_categories': len(categories),
+            'created_items': len(items),
+            'items': MenuItemListSerializer(items, many=True).data,
+        }, status=status.HTTP_201_CREATED)
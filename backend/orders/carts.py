@@ -0,0 +1,389 @@
+"""Cart storage backends, chosen with ``settings.CART_BACKEND``.
+
+``DatabaseCartBackend`` keeps carts in ``Cart``/``CartItem`` rows.
+``CacheCartBackend`` keeps active carts in the Django cache and only writes
+them to those tables on a write-behind flush (``manage.py flush_carts``);
+checkout reads the cart from whichever backend holds it. Both return the
+same unsaved-or-saved ``Cart`` objects, so ``CartSerializer`` output does
+not change.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Case, Exists, F, OuterRef, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+from rest_framework import status
+
+from menu.models import MenuItem
+from .models import Cart, CartItem, DirtyCart
+from .services import CartConflict, OrderStateError
+
+
+def get_cart_backend():
+    return import_string(settings.CART_BACKEND)()
+
+
+class BaseCartBackend:
+    EMPTY = {
+        'id': None, 'restaurant': None, 'items': [],
+        'total_amount': '0', 'items_count': 0, 'created_at': None,
+    }
+
+    def get_cart(self, user):
+        """The user's ``Cart`` with ``items`` (and their menu items) loaded, or ``None``."""
+        raise NotImplementedError
+
+    def add_item(self, user, menu_item_id, quantity, instructions=''):
+        """Add ``quantity`` of an item, raising ``OrderStateError`` if it cannot go in this cart."""
+        raise NotImplementedError
+
+    def set_quantity(self, user, line, quantity):
+        """Set the quantity of the line matching ``line`` (0 removes it).
+
+        ``line`` is a lookup such as ``{'pk': 5}`` or ``{'menu_item_id': 3}``;
+        returns ``False`` if the user has no such line.
+        """
+        raise NotImplementedError
+
+    def remove_item(self, user, line):
+        raise NotImplementedError
+
+    def clear(self, user):
+        raise NotImplementedError
+
+    def remove_ordered(self, user, lines):
+        """Take the quantities in ``lines`` out of the cart once the order commits.
+
+        Checkout calls this instead of ``clear()``: anything added while the
+        order was being placed stays in the cart, and nothing is removed if
+        the order rolls back.
+        """
+        raise NotImplementedError
+
+    def batch(self, user):
+        """Context manager making the operations inside it all-or-nothing."""
+        raise NotImplementedError
+
+    def flush(self, batch_size=500):
+        """Persist carts changed since the last flush; returns how many."""
+        return 0
+
+    def apply_batch(self, user, operations):
+        """Apply validated add/update/remove operations in order, all or nothing.
+
+        A failing operation raises ``OrderStateError`` with its ``index`` set.
+        """
+        with self.batch(user):
+            for index, op in enumerate(operations):
+                line = {'pk': op['item_id']} if op.get('item_id') else {'menu_item_id': op.get('menu_item_id')}
+                try:
+                    if op['op'] == 'add':
+                        self.add_item(user, op['menu_item_id'], op['quantity'], op.get('special_instructions', ''))
+                    elif op['op'] == 'update':
+                        found = self.set_quantity(user, line, op['quantity'])
+                    else:
+                        found = self.remove_item(user, line)
+                    if op['op'] != 'add' and not found:
+                        raise OrderStateError('Cart item not found.', status.HTTP_404_NOT_FOUND)
+                except OrderStateError as exc:
+                    exc.index = index
+                    raise
+
+    @staticmethod
+    def _missing_item(menu_item_id):
+        if MenuItem.objects.filter(pk=menu_item_id).exists():
+            return OrderStateError('This item is currently unavailable.', status.HTTP_400_BAD_REQUEST)
+        return OrderStateError('Menu item not found.', status.HTTP_400_BAD_REQUEST)
+
+
+class DatabaseCartBackend(BaseCartBackend):
+    """Cart writes as single statements; reads as a single query.
+
+    The unique ``(user)`` and ``(cart, menu_item)`` constraints let every
+    add be one ``INSERT ... ON CONFLICT`` that increments the quantity in
+    the database, so concurrent adds never create a second cart or lose a
+    quantity.
+    """
+
+    ADD_SQL = f"""
+        WITH item AS (
+            SELECT id, restaurant_id FROM {MenuItem._meta.db_table}
+            WHERE id = %(menu_item)s AND is_available
+        ), cart AS (
+            INSERT INTO {Cart._meta.db_table} (user_id, restaurant_id, created_at, updated_at)
+            SELECT %(user)s, restaurant_id, %(now)s, %(now)s FROM item
+            ON CONFLICT (user_id) DO UPDATE SET updated_at = CASE
+                WHEN {Cart._meta.db_table}.restaurant_id = EXCLUDED.restaurant_id
+                THEN EXCLUDED.updated_at ELSE {Cart._meta.db_table}.updated_at END
+            RETURNING id, restaurant_id
+        ), line AS (
+            INSERT INTO {CartItem._meta.db_table} (cart_id, menu_item_id, quantity, special_instructions)
+            SELECT cart.id, item.id, %(quantity)s, %(instructions)s
+            FROM cart JOIN item ON item.restaurant_id = cart.restaurant_id
+            ON CONFLICT (cart_id, menu_item_id) DO UPDATE SET
+                quantity = {CartItem._meta.db_table}.quantity + EXCLUDED.quantity,
+                special_instructions = COALESCE(
+                    NULLIF(EXCLUDED.special_instructions, ''),
+                    {CartItem._meta.db_table}.special_instructions
+                )
+            RETURNING id
+        )
+        SELECT cart.restaurant_id, (SELECT id FROM line) FROM cart
+    """
+
+    def get_cart(self, user):
+        lines = list(
+            CartItem.objects.filter(cart__user=user)
+            .select_related('cart__restaurant', 'menu_item')
+            .order_by('id')
+        )
+        if not lines:
+            return None
+        cart = lines[0].cart
+        for line in lines:
+            line.cart = cart
+        cart._prefetched_objects_cache = {'items': lines}
+        return cart
+
+    def add_item(self, user, menu_item_id, quantity, instructions=''):
+        with connection.cursor() as cursor:
+            cursor.execute(self.ADD_SQL, {
+                'user': user.pk, 'menu_item': menu_item_id, 'quantity': quantity,
+                'instructions': instructions, 'now': timezone.now(),
+            })
+            row = cursor.fetchone()
+        if row is None:
+            raise self._missing_item(menu_item_id)
+        restaurant_id, line_id = row
+        if line_id is None:
+            raise CartConflict(restaurant_id)
+
+    def set_quantity(self, user, line, quantity):
+        if quantity == 0:
+            return self.remove_item(user, line)
+        return bool(CartItem.objects.filter(cart__user=user, **line).update(quantity=quantity))
+
+    def remove_item(self, user, line):
+        deleted, _ = CartItem.objects.filter(cart__user=user, **line).delete()
+        if deleted:
+            Cart.objects.filter(user=user).exclude(
+                Exists(CartItem.objects.filter(cart=OuterRef('pk')))
+            ).delete()
+        return bool(deleted)
+
+    def clear(self, user):
+        Cart.objects.filter(user=user).delete()
+
+    def remove_ordered(self, user, lines):
+        # Rows change inside the checkout transaction, so they roll back with it.
+        ordered = {line.menu_item_id: line.quantity for line in lines}
+        CartItem.objects.filter(cart__user=user, menu_item_id__in=list(ordered)).update(quantity=Case(
+            *[When(menu_item_id=pk, then=Greatest(F('quantity') - quantity, 0)) for pk, quantity in ordered.items()],
+        ))
+        CartItem.objects.filter(cart__user=user, quantity=0).delete()
+        Cart.objects.filter(user=user).exclude(Exists(CartItem.objects.filter(cart=OuterRef('pk')))).delete()
+
+    def batch(self, user):
+        return transaction.atomic()
+
+
+_local = threading.local()
+
+
+class CacheCartBackend(BaseCartBackend):
+    """Active carts live in the cache as small dicts keyed by user.
+
+    A cart is ``{'id', 'restaurant', 'created_at', 'lines'}`` where ``lines``
+    maps menu item id to ``{'quantity', 'special_instructions'}``; a line's
+    public id is its menu item id. Writes to one cart are serialized with a
+    short lock held in the cache; carts never wait on each other.
+
+    The first change after a flush sets the cart's ``DIRTY_KEY`` marker and
+    adds a ``DirtyCart`` row, which ``flush()`` works through and clears.
+    A cart missing from the cache is reloaded from the database, so the
+    cache must be shared by all processes and must not evict keys (Redis
+    with ``maxmemory-policy noeviction``); the backend refuses to start
+    without a shared cache.
+    """
+
+    KEY = 'cart:{user_id}'
+    LOCK_KEY = 'cart:{user_id}:lock'
+    DIRTY_KEY = 'cart:{user_id}:dirty'
+    LOCK_TIMEOUT = 5
+
+    def __init__(self):
+        if not settings.CACHE_SHARED:
+            raise ImproperlyConfigured(
+                'CacheCartBackend needs a cache shared by every process; set REDIS_URL.'
+            )
+
+    # ── Locking and state ────────────────────────────────
+
+    @contextmanager
+    def _lock(self, key):
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while not cache.add(key, 1, self.LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise OrderStateError('Your cart is busy, please try again.')
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            cache.delete(key)
+
+    def _load(self, user_id):
+        state = cache.get(self.KEY.format(user_id=user_id))
+        if state is not None:
+            return state
+        state = {'id': None, 'restaurant': None, 'created_at': None, 'lines': {}}
+        cart = Cart.objects.filter(user_id=user_id).prefetch_related('items').first()
+        if cart is not None:
+            state.update(id=cart.id, restaurant=cart.restaurant_id, created_at=cart.created_at.isoformat())
+            state['lines'] = {
+                item.menu_item_id: {'quantity': item.quantity, 'special_instructions': item.special_instructions}
+                for item in cart.items.all()
+            }
+        return state
+
+    def _store(self, user_id, state):
+        cache.set(self.KEY.format(user_id=user_id), state, settings.CART_CACHE_TIMEOUT)
+        # Only the first change since the last flush touches the database.
+        if cache.add(self.DIRTY_KEY.format(user_id=user_id), 1, None):
+            DirtyCart.objects.bulk_create([DirtyCart(user_id=user_id)], ignore_conflicts=True)
+
+    @contextmanager
+    def _mutate(self, user):
+        current = getattr(_local, 'batch', None)
+        if current is not None and current[0] == user.pk:
+            yield current[1]
+            return
+        with self._lock(self.LOCK_KEY.format(user_id=user.pk)):
+            state = self._load(user.pk)
+            yield state
+            self._store(user.pk, state)
+
+    @contextmanager
+    def batch(self, user):
+        with self._mutate(user) as state:
+            _local.batch = (user.pk, state)
+            try:
+                yield
+            finally:
+                _local.batch = None
+
+    @staticmethod
+    def _line_key(line):
+        return line.get('menu_item_id', line.get('pk'))
+
+    # ── Backend API ──────────────────────────────────────
+
+    def get_cart(self, user):
+        state = self._load(user.pk)
+        if not state['lines']:
+            return None
+        menu_items = MenuItem.objects.select_related('restaurant').in_bulk(list(state['lines']))
+        lines = [(menu_items.get(pk), line) for pk, line in state['lines'].items()]
+        lines = [(item, line) for item, line in lines if item is not None]
+        if not lines:
+            return None
+        cart = Cart(
+            id=state['id'], user=user, restaurant=lines[0][0].restaurant,
+            created_at=parse_datetime(state['created_at']),
+        )
+        cart._lines = [CartItem(id=item.pk, cart=cart, menu_item=item, **line) for item, line in lines]
+        cart._prefetched_objects_cache = {'items': cart._lines}
+        return cart
+
+    def add_item(self, user, menu_item_id, quantity, instructions=''):
+        item = MenuItem.objects.filter(pk=menu_item_id, is_available=True).only('restaurant_id').first()
+        if item is None:
+            raise self._missing_item(menu_item_id)
+        with self._mutate(user) as state:
+            if state['lines'] and state['restaurant'] != item.restaurant_id:
+                raise CartConflict(state['restaurant'])
+            if not state['lines']:
+                state.update(restaurant=item.restaurant_id, created_at=timezone.now().isoformat())
+            line = state['lines'].setdefault(item.pk, {'quantity': 0, 'special_instructions': ''})
+            line['quantity'] += quantity
+            if instructions:
+                line['special_instructions'] = instructions
+
+    def set_quantity(self, user, line, quantity):
+        if quantity == 0:
+            return self.remove_item(user, line)
+        with self._mutate(user) as state:
+            entry = state['lines'].get(self._line_key(line))
+            if entry is None:
+                return False
+            entry['quantity'] = quantity
+            return True
+
+    def remove_item(self, user, line):
+        with self._mutate(user) as state:
+            return state['lines'].pop(self._line_key(line), None) is not None
+
+    def clear(self, user):
+        Cart.objects.filter(user=user).delete()
+        DirtyCart.objects.filter(user=user).delete()
+
+        def forget():
+            with self._lock(self.LOCK_KEY.format(user_id=user.pk)):
+                cache.delete_many([self.KEY.format(user_id=user.pk), self.DIRTY_KEY.format(user_id=user.pk)])
+
+        # The cache can't roll back; leave it alone until the rows are gone for good.
+        transaction.on_commit(forget, robust=True)
+
+    def remove_ordered(self, user, lines):
+        ordered = {line.menu_item_id: line.quantity for line in lines}
+
+        def remove():
+            with self._mutate(user) as state:
+                for pk, quantity in ordered.items():
+                    entry = state['lines'].get(pk)
+                    if entry is not None:
+                        entry['quantity'] -= quantity
+                        if entry['quantity'] <= 0:
+                            del state['lines'][pk]
+
+        transaction.on_commit(remove, robust=True)
+
+    def flush(self, batch_size=500):
+        flushed = 0
+        while True:
+            user_ids = list(DirtyCart.objects.order_by('marked_at').values_list('user_id', flat=True)[:batch_size])
+            for user_id in user_ids:
+                with self._lock(self.LOCK_KEY.format(user_id=user_id)):
+                    state = cache.get(self.KEY.format(user_id=user_id))
+                    if state is not None:
+                        state['id'] = self._persist(user_id, state)
+                        cache.set(self.KEY.format(user_id=user_id), state, settings.CART_CACHE_TIMEOUT)
+                        flushed += 1
+                    cache.delete(self.DIRTY_KEY.format(user_id=user_id))
+                    DirtyCart.objects.filter(user_id=user_id).delete()
+            if len(user_ids) < batch_size:
+                return flushed
+
+    @staticmethod
+    @transaction.atomic
+    def _persist(user_id, state):
+        if not state['lines']:
+            Cart.objects.filter(user_id=user_id).delete()
+            return None
+        cart, _ = Cart.objects.update_or_create(
+            user_id=user_id, defaults={'restaurant_id': state['restaurant']},
+        )
+        CartItem.objects.filter(cart=cart).exclude(menu_item_id__in=list(state['lines'])).delete()
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, menu_item_id=pk, **line) for pk, line in state['lines'].items()],
+            update_conflicts=True, unique_fields=['cart', 'menu_item'],
+            update_fields=['quantity', 'special_instructions'],
+        )
+        return cart.id
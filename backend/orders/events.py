@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from core.pubsub import get_broker
+from .models import OrderEvent
+
+
+def order_channel(order_number):
+    return f'order:{order_number}'
+
+
+def restaurant_channel(restaurant_id):
+    return f'restaurant:{restaurant_id}'
+
+
+def driver_channel(driver_id):
+    return f'driver:{driver_id}'
+
+
+def dispatch_channel(city):
+    """Ready orders waiting for any driver in ``city``."""
+    return f'dispatch:{city.strip().lower()}'
+
+
+def event_data(event, order):
+    return {
+        'id': event.id,
+        'order_number': order.order_number,
+        'status': event.status,
+        'previous_status': event.previous_status,
+        'restaurant': event.restaurant_id,
+        'driver': event.driver_id,
+        'at': event.created_at.isoformat(),
+    }
+
+
+def events_for(user):
+    """The ``OrderEvent`` rows ``user`` may read."""
+    events = OrderEvent.objects.all()
+    if user.user_type == 'admin':
+        return events
+    if user.user_type == 'restaurant_owner':
+        return events.filter(restaurant__owner=user)
+    if user.user_type == 'delivery_driver':
+        visible = Q(driver=user)
+        if user.city:
+            visible |= Q(order__delivery_city__iexact=user.city) & (
+                Q(status='ready') | Q(previous_status='ready')
+            )
+        return events.filter(visible)
+    return events.filter(order__user=user)
+
+
+def visible_events(events, after=0):
+    """``events`` logged after event ``after``, in log order, that can no longer be overtaken.
+
+    Ids are taken at insert but rows appear at commit, so a reader going by
+    id alone would skip a row that commits late. Instead the log is ordered
+    by writing transaction, then id, and only rows from transactions older
+    than every one still running are returned (plus the reader's own):
+    whatever commits later sorts after them.
+    """
+    events = events.filter(
+        Q(txid__lt=RawSQL('txid_snapshot_xmin(txid_current_snapshot())', []))
+        | Q(txid=RawSQL('txid_current_if_assigned()', []))
+    )
+    if after:
+        txid = OrderEvent.objects.filter(pk=after).values_list('txid', flat=True).first()
+        if txid is None:
+            events = events.filter(id__gt=after)
+        else:
+            events = events.filter(Q(txid__gt=txid) | Q(txid=txid, id__gt=after))
+    return events.order_by('txid', 'id')
+
+
+def record_status_change(order, previous_status):
+    """Append an ``OrderEvent`` for ``order``'s new status and push it once committed."""
+    event = OrderEvent.objects.create(
+        order=order, restaurant_id=order.restaurant_id, driver_id=order.driver_id,
+        status=order.status, previous_status=previous_status or '',
+    )
+
+    data = event_data(event, order)
+    channels = [order_channel(order.order_number), restaurant_channel(order.restaurant_id)]
+    if order.driver_id:
+        channels.append(driver_channel(order.driver_id))
+    if 'ready' in (order.status, previous_status):
+        channels.append(dispatch_channel(order.delivery_city))
+
+    def publish():
+        broker = get_broker()
+        for channel in channels:
+            broker.publish(channel, data)
+
+    transaction.on_commit(publish)
+    return event
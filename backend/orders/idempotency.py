@@ -0,0 +1,115 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class Replay(Exception):
+    def __init__(self, record):
+        self.record = record
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request.'
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+class IdempotentMixin:
+    """Honour an ``Idempotency-Key`` header on POST requests.
+
+    A request with a key runs in one transaction that reserves the key,
+    runs the handler and stores the response, so the key and the handler's
+    writes commit together or not at all. Repeats get the stored response
+    back without the handler running again; a repeat arriving while the
+    first is running waits on the key's unique index. Server errors roll
+    everything back so the client can retry. The check runs after
+    authentication and permissions.
+    """
+
+    idempotency_record = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method == 'POST' and request.headers.get(HEADER):
+            with transaction.atomic():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        value = request.headers.get(HEADER)
+        if request.method != 'POST' or not value:
+            return
+        if len(value) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: f'Must be at most {MAX_KEY_LENGTH} characters.'})
+
+        key = hashlib.sha256(
+            f'{request.user.pk}:{request.method}:{request.path}:{value}'.encode()
+        ).hexdigest()
+        request_hash = self.get_request_hash(request)
+        self.idempotency_record = self.reserve(key, request_hash)
+
+    def get_request_hash(self, request):
+        data = request.data
+        if hasattr(data, 'lists'):
+            data = dict(data.lists())
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    def reserve(self, key, request_hash):
+        record = IdempotencyKey.objects.filter(key=key).first()
+        if record is not None and record.created_at < expired_before():
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            record = None
+        if record is None:
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(key=key, request_hash=request_hash)
+            except IntegrityError:
+                # Another request with this key won the insert.
+                record = IdempotencyKey.objects.filter(key=key).first()
+                if record is None:
+                    raise IdempotencyConflict
+
+        if record.request_hash != request_hash:
+            raise IdempotencyKeyReused
+        if record.status_code is None:
+            raise IdempotencyConflict
+        raise Replay(record)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Replay):
+            response = Response(exc.record.response, status=exc.record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record, self.idempotency_record = self.idempotency_record, None
+        if record is not None:
+            if response.status_code >= 500:
+                transaction.set_rollback(True)
+            else:
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    status_code=response.status_code, response=response.data,
+                )
+        return response
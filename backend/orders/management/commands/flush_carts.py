@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.carts import get_cart_backend
+
+
+class Command(BaseCommand):
+    help = 'Write carts changed in the cache back to the database (cache cart backend only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        flushed = get_cart_backend().flush(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} carts.'))
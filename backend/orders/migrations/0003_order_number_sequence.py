@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-17 22:27
+
+import orders.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_orders_orde_created_0fb29d_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE SEQUENCE orders_order_number_seq START 100000',
+            'DROP SEQUENCE orders_order_number_seq',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(db_default=orders.models.NextOrderNumber('Asia/Karachi'), editable=False, max_length=32, unique=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-17 22:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    Cart = apps.get_model('orders', 'Cart')
+    CartItem = apps.get_model('orders', 'CartItem')
+
+    # Keep each user's most recently updated cart.
+    for row in Cart.objects.values('user').annotate(n=Count('id')).filter(n__gt=1):
+        keep = Cart.objects.filter(user=row['user']).order_by('-updated_at', '-id').first()
+        Cart.objects.filter(user=row['user']).exclude(pk=keep.pk).delete()
+
+    # Fold repeated lines for the same item into one.
+    rows = CartItem.objects.values('cart', 'menu_item').annotate(n=Count('id'), total=Sum('quantity'))
+    for row in rows.filter(n__gt=1):
+        lines = CartItem.objects.filter(cart=row['cart'], menu_item=row['menu_item']).order_by('id')
+        keep = lines.first()
+        lines.exclude(pk=keep.pk).delete()
+        CartItem.objects.filter(pk=keep.pk).update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+    # The cleanup commits on its own: deleting carts leaves deferred foreign
+    # key checks pending, and Postgres won't ALTER orders_cart until they run.
+    atomic = False
+
+    dependencies = [
+        ('menu', '0003_menutombstone_menucategory_menu_version_and_more'),
+        ('orders', '0005_idempotencykey'),
+        ('restaurants', '0006_restaurant_menu_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop, atomic=True),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'menu_item'), name='unique_cart_menu_item'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1 on 2026-10-17 23:32
+
+import orders.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_unique_cart_rows'),
+        ('restaurants', '0007_restaurant_rating_sum'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='orderevent',
+            options={'ordering': ['txid', 'id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='orderevent',
+            name='orders_orde_restaur_f68f69_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='orderevent',
+            name='orders_orde_driver__c74007_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='orderevent',
+            name='orders_orde_order_i_2001ca_idx',
+        ),
+        migrations.AddField(
+            model_name='orderevent',
+            name='txid',
+            field=models.BigIntegerField(db_default=orders.models.CurrentTransactionId(), editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['txid', 'id'], name='orders_orde_txid_038c45_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['restaurant', 'txid', 'id'], name='orders_orde_restaur_1b6780_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['driver', 'txid', 'id'], name='orders_orde_driver__abba91_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['order', 'txid', 'id'], name='orders_orde_order_i_129399_idx'),
+        ),
+    ]
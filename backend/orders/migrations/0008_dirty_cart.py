@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-17 23:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_accounts_cu_created_9e8408_idx'),
+        ('orders', '0007_order_event_txid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyCart',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('marked_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,7 +1,33 @@
-import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.conf import settings
 
+ORDER_NUMBER_SEQUENCE = 'orders_order_number_seq'
+
+
+class NextOrderNumber(models.Func):
+    """``FD-YYYYMMDD-<n>`` built by the database from a sequence on INSERT.
+
+    ``nextval`` never hands out the same value twice, so numbers cannot
+    collide, and the value comes back through ``RETURNING`` on the insert
+    itself. The date is taken in ``time_zone``.
+    """
+    template = (
+        "'FD-' || to_char(statement_timestamp() AT TIME ZONE %(expressions)s, 'YYYYMMDD')"
+        f" || '-' || nextval('{ORDER_NUMBER_SEQUENCE}')"
+    )
+    output_field = models.CharField()
+
+    def __init__(self, time_zone, **extra):
+        super().__init__(models.Value(time_zone), **extra)
+
+
+class CurrentTransactionId(models.Func):
+    """The id of the inserting transaction, assigned by the database."""
+    function = 'txid_current'
+    template = '%(function)s()'
+    output_field = models.BigIntegerField()
+
 
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='carts')
@@ -11,10 +37,20 @@ class Cart(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='unique_cart_per_user'),
+        ]
 
     def __str__(self):
         return f"Cart #{self.id} - {self.user.username}"
 
+    @property
+    def lines(self):
+        """The cart's items; an unsaved cart built from the cache holds them in memory."""
+        if self.pk is None:
+            return self._lines
+        return self.items.all()
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -24,11 +60,29 @@ class CartItem(models.Model):
 
     class Meta:
         ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'menu_item'], name='unique_cart_menu_item'),
+        ]
 
     def __str__(self):
         return f"{self.quantity}x {self.menu_item.name}"
 
 
+class OrderQuerySet(models.QuerySet):
+    def for_list(self):
+        """Everything ``OrderListSerializer`` reads, in a single query."""
+        return self.select_related('restaurant', 'user').annotate(items_count=models.Count('items'))
+
+
+class DirtyCart(models.Model):
+    """A user whose cached cart has changes not yet written to ``Cart`` rows."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    marked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Dirty cart of user #{self.user_id}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -54,7 +108,10 @@ class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
     restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='orders')
     driver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='delivery_orders')
-    order_number = models.CharField(max_length=20, unique=True, editable=False)
+    order_number = models.CharField(
+        max_length=32, unique=True, editable=False,
+        db_default=NextOrderNumber(settings.TIME_ZONE),
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -69,6 +126,8 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -76,13 +135,9 @@ class Order(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['user', 'status']),
             models.Index(fields=['restaurant', 'status']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
-    def save(self, *args, **kwargs):
-        if not self.order_number:
-            self.order_number = f"FD-{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"Order {self.order_number} - {self.user.username}"
 
@@ -99,3 +154,47 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity}x {self.menu_item.name} @ Rs. {self.price}"
+
+
+class OrderEvent(models.Model):
+    """One status transition of an order; rows are only ever appended.
+
+    ``txid`` is the writing transaction, which orders the log for readers;
+    see ``orders.events.visible_events``.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name='order_events')
+    driver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    previous_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    txid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['txid', 'id']
+        indexes = [
+            models.Index(fields=['txid', 'id']),
+            models.Index(fields=['restaurant', 'txid', 'id']),
+            models.Index(fields=['driver', 'txid', 'id']),
+            models.Index(fields=['order', 'txid', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.previous_status or '-'} -> {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """A client ``Idempotency-Key`` and the response it first produced.
+
+    ``key`` is a digest of the user, method, path and header value, so one
+    fixed-width unique index serves every lookup. ``status_code`` is null
+    while the first request is still running.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
@@ -1,9 +1,9 @@
-import random
 from decimal import Decimal
-from datetime import datetime
 from rest_framework import serializers
 from django.db import transaction
-from .models import Cart, CartItem, Order, OrderItem
+from .models import Cart, CartItem, Order, OrderEvent, OrderItem
+from .carts import get_cart_backend
+from .services import OrderStateService
 from menu.models import MenuItem
 from restaurants.models import Restaurant
 
@@ -37,7 +37,7 @@ class CartRestaurantSerializer(serializers.ModelSerializer):
 
 class CartSerializer(serializers.ModelSerializer):
     restaurant = CartRestaurantSerializer(read_only=True)
-    items = CartItemSerializer(many=True, read_only=True)
+    items = CartItemSerializer(source='lines', many=True, read_only=True)
     total_amount = serializers.SerializerMethodField()
     items_count = serializers.SerializerMethodField()
 
@@ -47,13 +47,13 @@ class CartSerializer(serializers.ModelSerializer):
 
     def get_total_amount(self, obj):
         total = Decimal('0')
-        for item in obj.items.all():
+        for item in obj.lines:
             price = item.menu_item.discounted_price or item.menu_item.price
             total += price * item.quantity
         return str(total)
 
     def get_items_count(self, obj):
-        return sum(i.quantity for i in obj.items.all())
+        return sum(i.quantity for i in obj.lines)
 
 
 class AddToCartSerializer(serializers.Serializer):
@@ -61,20 +61,38 @@ class AddToCartSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1, default=1)
     special_instructions = serializers.CharField(required=False, default='', allow_blank=True)
 
-    def validate_menu_item_id(self, value):
-        try:
-            item = MenuItem.objects.select_related('restaurant').get(id=value)
-        except MenuItem.DoesNotExist:
-            raise serializers.ValidationError('Menu item not found.')
-        if not item.is_available:
-            raise serializers.ValidationError('This item is currently unavailable.')
-        return value
-
 
 class UpdateCartItemSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=0)
 
 
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['add', 'update', 'remove'])
+    item_id = serializers.IntegerField(required=False)
+    menu_item_id = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    special_instructions = serializers.CharField(required=False, default='', allow_blank=True)
+
+    def validate(self, data):
+        if data['op'] == 'add':
+            if 'menu_item_id' not in data:
+                raise serializers.ValidationError('"add" needs menu_item_id.')
+            data.setdefault('quantity', 1)
+            if data['quantity'] < 1:
+                raise serializers.ValidationError('"add" needs a quantity of at least 1.')
+        elif 'item_id' not in data and 'menu_item_id' not in data:
+            raise serializers.ValidationError(f'"{data["op"]}" needs item_id or menu_item_id.')
+        if data['op'] == 'update' and 'quantity' not in data:
+            raise serializers.ValidationError('"update" needs quantity.')
+        return data
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=CartOperationSerializer(), allow_empty=False, max_length=50,
+    )
+
+
 # ─── Orders ─────────────────────────────────────────────────────────────
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -103,14 +121,10 @@ class OrderCreateSerializer(serializers.Serializer):
 
     def validate(self, data):
         user = self.context['request'].user
-        try:
-            cart = Cart.objects.prefetch_related('items__menu_item').get(user=user)
-        except Cart.DoesNotExist:
-            raise serializers.ValidationError('Your cart is empty.')
-
-        items = list(cart.items.all())
-        if not items:
+        cart = get_cart_backend().get_cart(user)
+        if cart is None:
             raise serializers.ValidationError('Your cart is empty.')
+        items = list(cart.lines)
 
         total = sum(
             (i.menu_item.discounted_price or i.menu_item.price) * i.quantity
@@ -122,7 +136,6 @@ class OrderCreateSerializer(serializers.Serializer):
                 f'Minimum order is Rs. {restaurant.minimum_order}.'
             )
 
-        data['_cart'] = cart
         data['_items'] = items
         data['_total'] = total
         data['_restaurant'] = restaurant
@@ -131,7 +144,6 @@ class OrderCreateSerializer(serializers.Serializer):
     @transaction.atomic
     def create(self, validated_data):
         user = self.context['request'].user
-        cart = validated_data['_cart']
         items = validated_data['_items']
         total = validated_data['_total']
         restaurant = validated_data['_restaurant']
@@ -140,13 +152,9 @@ class OrderCreateSerializer(serializers.Serializer):
         tax = (total * Decimal('0.05')).quantize(Decimal('0.01'))
         grand_total = total + delivery_fee + tax
 
-        now = datetime.now()
-        order_number = f"FD-{now.strftime('%Y%m%d')}-{random.randint(1000,9999)}"
-
         order = Order.objects.create(
             user=user,
             restaurant=restaurant,
-            order_number=order_number,
             total_amount=total,
             delivery_fee=delivery_fee,
             tax_amount=tax,
@@ -170,7 +178,7 @@ class OrderCreateSerializer(serializers.Serializer):
             ))
         OrderItem.objects.bulk_create(order_items)
 
-        cart.delete()
+        get_cart_backend().remove_ordered(user, items)
         return order
 
 
@@ -178,7 +186,7 @@ class OrderListSerializer(serializers.ModelSerializer):
     restaurant_name = serializers.CharField(source='restaurant.name')
     restaurant_image = serializers.ImageField(source='restaurant.image')
     customer_name = serializers.SerializerMethodField()
-    items_count = serializers.SerializerMethodField()
+    items_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Order
@@ -193,9 +201,6 @@ class OrderListSerializer(serializers.ModelSerializer):
         full = obj.user.get_full_name()
         return full if full.strip() else obj.user.username
 
-    def get_items_count(self, obj):
-        return obj.items.count()
-
 
 class OrderDetailSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
@@ -229,36 +234,18 @@ class OrderDetailSerializer(serializers.ModelSerializer):
 class OrderStatusUpdateSerializer(serializers.Serializer):
     status = serializers.CharField()
 
-    RESTAURANT_TRANSITIONS = {
-        'pending': ['confirmed'],
-        'confirmed': ['preparing'],
-        'preparing': ['ready'],
-    }
-    DRIVER_TRANSITIONS = {
-        'ready': ['picked_up'],
-        'picked_up': ['delivered'],
-    }
-    CUSTOMER_CANCEL = {
-        'pending': ['cancelled'],
-        'confirmed': ['cancelled'],
-    }
-
     def validate_status(self, value):
-        order = self.context['order']
-        user = self.context['request'].user
-        current = order.status
-
-        if user.user_type == 'restaurant_owner':
-            allowed = self.RESTAURANT_TRANSITIONS.get(current, [])
-        elif user.user_type == 'delivery_driver':
-            allowed = self.DRIVER_TRANSITIONS.get(current, [])
-        elif user.user_type == 'customer':
-            allowed = self.CUSTOMER_CANCEL.get(current, [])
-        else:
-            allowed = []
-
-        if value not in allowed:
+        current = self.context['order'].status
+        if value not in OrderStateService.allowed_transitions(self.context['request'].user, current):
             raise serializers.ValidationError(
                 f"Cannot change status from '{current}' to '{value}'."
             )
         return value
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    order_number = serializers.CharField(source='order.order_number')
+
+    class Meta:
+        model = OrderEvent
+        fields = ['id', 'order_number', 'status', 'previous_status', 'restaurant', 'driver', 'created_at']
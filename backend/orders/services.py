@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from restaurants.models import Restaurant
+from .events import record_status_change
+from .models import Order
+
+CLAIM_FIELDS = ('order_number', 'restaurant_id', 'delivery_city', 'status')
+
+
+class OrderStateError(Exception):
+    def __init__(self, message, status_code=status.HTTP_409_CONFLICT):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class OrderStateService:
+    """Applies status transitions as compare-and-set updates.
+
+    Each transition is one ``UPDATE ... WHERE status=<expected>`` writing
+    only the columns that change, so concurrent transitions cannot
+    overwrite each other: the loser updates no row and is told so.
+    """
+
+    RESTAURANT_TRANSITIONS = {
+        'pending': ['confirmed'],
+        'confirmed': ['preparing'],
+        'preparing': ['ready'],
+    }
+    DRIVER_TRANSITIONS = {
+        'ready': ['picked_up'],
+        'picked_up': ['delivered'],
+    }
+    CUSTOMER_CANCEL = {
+        'pending': ['cancelled'],
+        'confirmed': ['cancelled'],
+    }
+
+    @staticmethod
+    def allowed_transitions(user, current):
+        table = {
+            'restaurant_owner': OrderStateService.RESTAURANT_TRANSITIONS,
+            'delivery_driver': OrderStateService.DRIVER_TRANSITIONS,
+            'customer': OrderStateService.CUSTOMER_CANCEL,
+        }.get(user.user_type, {})
+        return table.get(current, [])
+
+    @staticmethod
+    @transaction.atomic
+    def compare_and_set(order, expected, new_status, **changes):
+        """Move ``order`` from ``expected`` to ``new_status``; ``False`` if it was not in ``expected``."""
+        changes = {'status': new_status, 'updated_at': timezone.now(), **changes}
+        if not Order.objects.filter(pk=order.pk, status=expected).update(**changes):
+            return False
+        for field, value in changes.items():
+            setattr(order, field, value)
+        order._loaded_status = new_status
+        record_status_change(order, expected)
+        return True
+
+    @staticmethod
+    def transition(order, new_status, user):
+        """Apply ``user``'s requested transition to ``order`` as last read."""
+        expected = order.status
+        if new_status not in OrderStateService.allowed_transitions(user, expected):
+            raise OrderStateError(
+                f"Cannot change status from '{expected}' to '{new_status}'.",
+                status.HTTP_400_BAD_REQUEST,
+            )
+        if not OrderStateService.compare_and_set(order, expected, new_status):
+            current = Order.objects.filter(pk=order.pk).values_list('status', flat=True).first()
+            raise OrderStateError(
+                f"The order changed from '{expected}' to '{current}' in the meantime; nothing was updated."
+            )
+        return order
+
+
+class CartConflict(OrderStateError):
+    def __init__(self, restaurant_id):
+        self.restaurant = Restaurant.objects.only('name').get(pk=restaurant_id)
+        super().__init__(
+            f'Your cart has items from {self.restaurant.name}. '
+            'Clear cart first or continue with current restaurant.',
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class DispatchService:
+    """Hands ready orders to drivers; an order can only ever be claimed once."""
+
+    @staticmethod
+    def available_orders(driver):
+        qs = Order.objects.filter(status='ready')
+        if driver.city:
+            qs = qs.filter(delivery_city__iexact=driver.city)
+        return qs
+
+    @staticmethod
+    def _lock_driver(driver):
+        # Serializes one driver's claims so two taps cannot both pass the
+        # active-delivery check.
+        get_user_model().objects.select_for_update().filter(pk=driver.pk).exists()
+        if Order.objects.filter(driver=driver, status='picked_up').exists():
+            raise OrderStateError('You already have an active delivery.', status.HTTP_400_BAD_REQUEST)
+
+    @staticmethod
+    def _assign(order, driver):
+        return OrderStateService.compare_and_set(order, 'ready', 'picked_up', driver=driver)
+
+    @staticmethod
+    @transaction.atomic
+    def claim(driver, order_number):
+        """Claim one order with a conditional UPDATE; losers get a conflict."""
+        order = Order.objects.only(*CLAIM_FIELDS).filter(order_number=order_number).first()
+        if order is None:
+            raise OrderStateError('Order not found.', status.HTTP_404_NOT_FOUND)
+        DispatchService._lock_driver(driver)
+        if not DispatchService._assign(order, driver):
+            raise OrderStateError('This order is no longer available.')
+        return order.pk
+
+    @staticmethod
+    @transaction.atomic
+    def claim_next(driver):
+        """Claim the longest-waiting ready order nobody else is claiming.
+
+        ``SKIP LOCKED`` lets concurrent drivers walk past each other's
+        candidate rows instead of queueing on them.
+        """
+        DispatchService._lock_driver(driver)
+        order = (
+            DispatchService.available_orders(driver)
+            .select_for_update(skip_locked=True)
+            .only(*CLAIM_FIELDS)
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if order is None or not DispatchService._assign(order, driver):
+            raise OrderStateError('No orders are waiting for a driver.', status.HTTP_404_NOT_FOUND)
+        return order.pk
+
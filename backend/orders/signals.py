@@ -0,0 +1,21 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .events import record_status_change
+from .models import Order
+
+
+@receiver(post_init, sender=Order)
+def remember_loaded_status(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred status is not fetched just for this.
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order)
+def publish_status(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    previous = None if created else instance._loaded_status
+    if created or instance.status != previous:
+        record_status_change(instance, previous)
+    instance._loaded_status = instance.status
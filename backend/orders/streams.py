@@ -0,0 +1,137 @@
+"""Server-sent event streams of order status changes.
+
+These are plain async Django views rather than DRF views so that a waiting
+client holds no thread when served over ASGI. Browsers' ``EventSource``
+cannot set headers, so the access token may also be passed as ``?token=``.
+A reconnecting ``EventSource`` sends the last id it saw as
+``Last-Event-ID``, and the status events it missed are replayed from the
+event log before live ones. Payment events are live only.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from core.pubsub import get_broker
+from restaurants.models import Restaurant
+from .events import (
+    dispatch_channel, driver_channel, event_data, events_for, order_channel, restaurant_channel,
+    visible_events,
+)
+from .models import Order, OrderEvent
+
+REPLAY_PAGE_SIZE = 100
+
+
+def _authenticate(request):
+    auth = JWTAuthentication()
+    try:
+        token = request.GET.get('token')
+        if token:
+            return auth.get_user(auth.get_validated_token(token))
+        result = auth.authenticate(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return result[0] if result else None
+
+
+def _order_scope(user, order_number):
+    order = Order.objects.filter(order_number=order_number).filter(
+        Q(user=user) | Q(restaurant__owner=user) | Q(driver=user)
+    ).first()
+    if order is None and user.user_type == 'admin':
+        order = Order.objects.filter(order_number=order_number).first()
+    if order is None:
+        return None
+    return [order_channel(order.order_number)], OrderEvent.objects.filter(order=order)
+
+
+def _restaurant_scope(user):
+    if user.user_type != 'restaurant_owner':
+        return None
+    ids = Restaurant.objects.filter(owner=user).values_list('pk', flat=True)
+    return [restaurant_channel(pk) for pk in ids], events_for(user)
+
+
+def _driver_scope(user):
+    if user.user_type != 'delivery_driver':
+        return None
+    channels = [driver_channel(user.pk)]
+    if user.city:
+        channels.append(dispatch_channel(user.city))
+    return channels, events_for(user)
+
+
+def _event(data):
+    # Only status events come from the event log and can be resumed from.
+    if data.get('event') == 'payment':
+        return f'event: payment\ndata: {json.dumps(data)}\n\n'
+    return f'id: {data["id"]}\nevent: status\ndata: {json.dumps(data)}\n\n'
+
+
+def _missed(events, after):
+    page = visible_events(events.select_related('order'), after)[:REPLAY_PAGE_SIZE]
+    return [event_data(event, event.order) for event in page]
+
+
+async def _stream(channels, events, last_event_id):
+    # Subscribe before reading the log so nothing falls between the two;
+    # an event can then arrive both ways, and the live copy is dropped.
+    async with get_broker().subscribe(channels) as subscription:
+        yield 'retry: 3000\n\n'
+        replayed = set()
+        after = last_event_id
+        while after is not None:
+            missed = await sync_to_async(_missed)(events, after)
+            for data in missed:
+                replayed.add(data['id'])
+                yield _event(data)
+            after = missed[-1]['id'] if len(missed) == REPLAY_PAGE_SIZE else None
+        while True:
+            message = await subscription.get(timeout=settings.EVENT_STREAM_KEEPALIVE)
+            if message is None:
+                # Comment lines keep proxies from closing an idle connection.
+                yield ': keepalive\n\n'
+            elif message.get('id') not in replayed:
+                yield _event(message)
+
+
+def _last_event_id(request):
+    try:
+        return int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _respond(request, resolve_scope, *args):
+    user = await sync_to_async(_authenticate)(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    scope = await sync_to_async(resolve_scope)(user, *args)
+    if scope is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    channels, events = scope
+    response = StreamingHttpResponse(
+        _stream(channels, events, _last_event_id(request)), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def order_stream(request, order_number):
+    return await _respond(request, _order_scope, order_number)
+
+
+async def restaurant_order_stream(request):
+    return await _respond(request, _restaurant_scope)
+
+
+async def driver_order_stream(request):
+    return await _respond(request, _driver_scope)
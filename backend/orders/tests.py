@@ -1,52 +1,43 @@
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import TransactionTestCase, override_settings
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from accounts.models import CustomUser
-from restaurants.models import Restaurant
-from menu.models import MenuCategory, MenuItem
-from .models import Cart, Order
+from menu.models import MenuItem
+from .models import Cart, CartItem, DirtyCart, IdempotencyKey, Order, OrderEvent, OrderItem
+from .carts import CacheCartBackend, DatabaseCartBackend
+from .events import visible_events
+from .services import DispatchService, OrderStateError, OrderStateService
+from core.pubsub import InProcessBroker, PostgresBroker
+from core.testing import MarketplaceFixtures, create_menu_item, create_order, create_restaurant
 
 
-class OrderTests(APITestCase):
+class OrderTests(MarketplaceFixtures, APITestCase):
     def setUp(self):
-        self.customer = CustomUser.objects.create_user(
-            username='cust', email='cust@test.com', password='test1234',
-            first_name='Cust', last_name='User', user_type='customer',
-            city='Karachi',
-        )
-        self.owner = CustomUser.objects.create_user(
-            username='owner', email='owner@test.com', password='test1234',
-            user_type='restaurant_owner',
-        )
-        self.restaurant = Restaurant.objects.create(
-            owner=self.owner, name='Test Resto', slug='test-resto',
-            address='1 St', city='Karachi', phone='021111', email='r@t.com',
-            cuisine_type='Pakistani', is_active=True, is_approved=True,
-            delivery_fee=Decimal('100'), minimum_order=Decimal('200'),
-            estimated_delivery_time=30,
-            opening_time='10:00:00', closing_time='23:00:00',
-        )
-        self.restaurant2 = Restaurant.objects.create(
-            owner=self.owner, name='Other Resto', slug='other-resto',
-            address='2 St', city='Karachi', phone='021222', email='r2@t.com',
-            cuisine_type='Chinese', is_active=True, is_approved=True,
-            delivery_fee=Decimal('80'), minimum_order=Decimal('100'),
-            estimated_delivery_time=25,
-            opening_time='10:00:00', closing_time='23:00:00',
-        )
-        cat = MenuCategory.objects.create(restaurant=self.restaurant, name='Main')
-        cat2 = MenuCategory.objects.create(restaurant=self.restaurant2, name='Main')
-        self.item1 = MenuItem.objects.create(
-            category=cat, restaurant=self.restaurant, name='Item 1',
-            slug='item-1', price=Decimal('300'), is_available=True,
-        )
-        self.item2 = MenuItem.objects.create(
-            category=cat, restaurant=self.restaurant, name='Item 2',
-            slug='item-2', price=Decimal('250'), is_available=True,
-        )
-        self.item_other = MenuItem.objects.create(
-            category=cat2, restaurant=self.restaurant2, name='Other Item',
-            slug='other-item', price=Decimal('200'), is_available=True,
+        super().setUp()
+        self.item1 = self.item
+        self.item2 = create_menu_item(self.restaurant, name='Item 2', slug='item-2', price=Decimal('250'))
+        self.restaurant2 = create_restaurant(
+            self.owner, name='Other Resto', slug='other-resto', cuisine_type='Chinese',
+            delivery_fee=Decimal('80'), minimum_order=Decimal('100'), estimated_delivery_time=25,
+        )
+        self.item_other = create_menu_item(
+            self.restaurant2, name='Other Item', slug='other-item', price=Decimal('200'),
         )
 
     def _auth(self, user):
@@ -65,6 +56,68 @@ class OrderTests(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertTrue(resp.data.get('conflict'))
 
+    def test_cart_mutations_are_single_statements(self):
+        self._auth(self.customer)
+        # One upsert, one read for the response.
+        with self.assertNumQueries(2):
+            self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1})
+        with self.assertNumQueries(2):
+            resp = self.client.post('/api/cart/add/', {
+                'menu_item_id': self.item1.id, 'quantity': 2, 'special_instructions': 'extra raita',
+            })
+        self.assertEqual(len(resp.data['items']), 1)
+        self.assertEqual(resp.data['items'][0]['quantity'], 3)
+        self.assertEqual(resp.data['items'][0]['special_instructions'], 'extra raita')
+        self.assertEqual(resp.data['total_amount'], '900.00')
+
+        line_id = resp.data['items'][0]['id']
+        with self.assertNumQueries(2):
+            resp = self.client.patch(f'/api/cart/item/{line_id}/update/', {'quantity': 5})
+        self.assertEqual(resp.data['items_count'], 5)
+        resp = self.client.delete(f'/api/cart/item/{line_id}/remove/')
+        self.assertIsNone(resp.data['id'])
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_cart_batch(self):
+        self._auth(self.customer)
+        line_id = self.client.post(
+            '/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1},
+        ).data['items'][0]['id']
+        resp = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'add', 'menu_item_id': self.item2.id, 'quantity': 2},
+            {'op': 'update', 'item_id': line_id, 'quantity': 4},
+            {'op': 'add', 'menu_item_id': self.item2.id},
+            {'op': 'update', 'menu_item_id': self.item2.id, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(i['menu_item']['id'], i['quantity']) for i in resp.data['items']],
+            [(self.item1.id, 4), (self.item2.id, 1)],
+        )
+
+        resp = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'remove', 'item_id': line_id},
+            {'op': 'add', 'menu_item_id': self.item_other.id},
+            {'op': 'remove', 'menu_item_id': self.item1.id},
+        ]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['index'], 1)
+        self.assertTrue(resp.data['conflict'])
+        # Nothing from the failed batch was applied.
+        self.assertEqual(CartItem.objects.filter(cart__user=self.customer).count(), 2)
+
+        resp = self.client.post('/api/cart/batch/', {'operations': [{'op': 'update', 'item_id': line_id}]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_unavailable_item_to_cart(self):
+        MenuItem.objects.filter(pk=self.item1.pk).update(is_available=False)
+        self._auth(self.customer)
+        resp = self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.post('/api/cart/add/', {'menu_item_id': 999999})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Cart.objects.exists())
+
     def test_create_order(self):
         self._auth(self.customer)
         self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1})
@@ -74,9 +127,65 @@ class OrderTests(APITestCase):
             'payment_method': 'cod',
         })
         self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
-        self.assertIn('order_number', resp.data)
+        self.assertRegex(resp.data['order_number'], r'^FD-\d{8}-\d+$')
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_checkout_keeps_items_added_meanwhile(self):
+        backend = DatabaseCartBackend()
+        backend.add_item(self.customer, self.item1.id, 2)
+        ordered = list(backend.get_cart(self.customer).lines)
+        backend.add_item(self.customer, self.item1.id, 1)
+        backend.remove_ordered(self.customer, ordered)
+        self.assertEqual(CartItem.objects.get(cart__user=self.customer).quantity, 1)
+        backend.remove_ordered(self.customer, CartItem.objects.filter(cart__user=self.customer))
         self.assertFalse(Cart.objects.filter(user=self.customer).exists())
 
+    def test_create_order_idempotency_key(self):
+        self._auth(self.customer)
+        self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1})
+        payload = {'delivery_address': '123 Test St', 'delivery_city': 'Karachi', 'payment_method': 'cod'}
+        first = self.client.post('/api/orders/create/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        # The key lookup, inside the request's transaction.
+        with self.assertNumQueries(3):
+            replay = self.client.post('/api/orders/create/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.data['order_number'], first.data['order_number'])
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
+
+        resp = self.client.post(
+            '/api/orders/create/', {**payload, 'delivery_city': 'Lahore'}, HTTP_IDEMPOTENCY_KEY='abc',
+        )
+        self.assertEqual(resp.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_idempotency_key_in_progress_and_purge(self):
+        self._auth(self.customer)
+        self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1})
+        payload = {'delivery_address': '123 Test St', 'delivery_city': 'Karachi', 'payment_method': 'cod'}
+        self.client.post('/api/orders/create/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        resp = self.client.post('/api/orders/create/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_idempotency_key_released_when_request_dies(self):
+        self._auth(self.customer)
+        self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1})
+        payload = {'delivery_address': '123 Test St', 'delivery_city': 'Karachi', 'payment_method': 'cod'}
+        with mock.patch('rest_framework.views.APIView.finalize_response', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/orders/create/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(Order.objects.exists())
+
+        resp = self.client.post('/api/orders/create/', payload, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
     def test_order_status_update(self):
         self._auth(self.customer)
         self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1})
@@ -112,3 +221,445 @@ class OrderTests(APITestCase):
         order.save()
         resp = self.client.post(f'/api/orders/{order.order_number}/cancel/')
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _ready_order(self, delivery_city='Karachi'):
+        return create_order(self.customer, self.restaurant, status='ready', delivery_city=delivery_city)
+
+    def _driver(self, username):
+        return CustomUser.objects.create_user(
+            username=username, email=f'{username}@test.com', password='test1234',
+            user_type='delivery_driver', city='Karachi',
+        )
+
+    def test_accept_conflict(self):
+        order = self._ready_order()
+        self._auth(self._driver('d1'))
+        resp = self.client.post(f'/api/driver/orders/{order.order_number}/accept/')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['status'], 'picked_up')
+
+        self._auth(self._driver('d2'))
+        resp = self.client.post(f'/api/driver/orders/{order.order_number}/accept/')
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+
+    def test_claim_next(self):
+        first = self._ready_order()
+        self._ready_order()
+        self._ready_order(delivery_city='Lahore')
+        driver = self._driver('d1')
+        self._auth(driver)
+        resp = self.client.post('/api/driver/orders/claim-next/')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['order_number'], first.order_number)
+
+        resp = self.client.post('/api/driver/orders/claim-next/')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self._auth(self._driver('d2'))
+        self.client.post('/api/driver/orders/claim-next/')
+        resp = self.client.post('/api/driver/orders/claim-next/')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self._auth(self._driver('d3'))
+        resp = self.client.post('/api/driver/orders/claim-next/')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_order_events_since(self):
+        self._auth(self.customer)
+        self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 1})
+        order_number = self.client.post('/api/orders/create/', {
+            'delivery_address': '123 Test St', 'delivery_city': 'Karachi', 'payment_method': 'cod',
+        }).data['order_number']
+        self._auth(self.owner)
+        for value in ('confirmed', 'preparing', 'ready'):
+            self.client.patch(f'/api/restaurant/orders/{order_number}/update/', {'status': value})
+        self.assertEqual(OrderEvent.objects.count(), 4)
+
+        resp = self.client.get('/api/orders/events/')
+        self.assertEqual(
+            [(e['previous_status'], e['status']) for e in resp.data['events']],
+            [('', 'pending'), ('pending', 'confirmed'), ('confirmed', 'preparing'), ('preparing', 'ready')],
+        )
+        self.assertFalse(resp.data['has_more'])
+        last_id = resp.data['last_id']
+
+        driver = self._driver('d1')
+        self._auth(driver)
+        resp = self.client.get('/api/orders/events/')
+        self.assertEqual([e['status'] for e in resp.data['events']], ['ready'])
+        self.client.post(f'/api/driver/orders/{order_number}/accept/')
+
+        self._auth(self.customer)
+        resp = self.client.get('/api/orders/events/', {'after': last_id})
+        self.assertEqual([e['status'] for e in resp.data['events']], ['picked_up'])
+        self.assertEqual(resp.data['events'][0]['driver'], driver.id)
+
+        self._auth(self._driver('d2'))
+        resp = self.client.get('/api/orders/events/', {'after': last_id})
+        self.assertEqual([e['status'] for e in resp.data['events']], ['picked_up'])
+        resp = self.client.get('/api/orders/events/', {'after': resp.data['last_id']})
+        self.assertEqual(resp.data['events'], [])
+
+    def test_transition_reports_lost_race(self):
+        order = self._ready_order()
+        Order.objects.filter(pk=order.pk).update(status='pending')
+        stale = Order.objects.get(pk=order.pk)
+        self._auth(self.owner)
+        self.client.patch(f'/api/restaurant/orders/{order.order_number}/update/', {'status': 'confirmed'})
+
+        with self.assertRaises(OrderStateError) as ctx:
+            OrderStateService.transition(stale, 'cancelled', self.customer)
+        self.assertEqual(ctx.exception.status_code, status.HTTP_409_CONFLICT)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'confirmed')
+
+    def test_transition_writes_only_changed_columns(self):
+        order = self._ready_order()
+        with self.assertRaises(OrderStateError) as ctx:
+            OrderStateService.transition(order, 'delivered', self._driver('d1'))
+        self.assertEqual(ctx.exception.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with CaptureQueriesContext(connection) as ctx:
+            OrderStateService.transition(order, 'picked_up', self._driver('d2'))
+        update = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "orders_order"'))
+        self.assertIn('"status" = \'ready\'', update.split('WHERE')[1])
+        self.assertNotIn('grand_total', update)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'picked_up')
+
+    def test_order_lists_count_items_without_extra_queries(self):
+        driver = self._driver('d1')
+        admin = CustomUser.objects.create_user(
+            username='admin', email='admin@test.com', password='test1234', user_type='admin',
+        )
+        for order_status in ('ready', 'ready', 'delivered', 'delivered'):
+            order = self._ready_order()
+            Order.objects.filter(pk=order.pk).update(
+                status=order_status, driver=driver if order_status == 'delivered' else None,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, menu_item=self.item1, quantity=2, price=self.item1.price),
+                OrderItem(order=order, menu_item=self.item2, quantity=1, price=self.item2.price),
+            ])
+        endpoints = [
+            (self.customer, '/api/orders/'),
+            (self.owner, '/api/restaurant/orders/'),
+            (driver, '/api/driver/available-orders/'),
+            (driver, '/api/driver/order-history/'),
+            (admin, '/api/admin/orders/'),
+        ]
+        for user, url in endpoints:
+            self._auth(user)
+            # One COUNT(*) for the page count, one SELECT for the page.
+            with self.subTest(url=url), self.assertNumQueries(2):
+                resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertTrue(resp.data['results'])
+            self.assertEqual({o['items_count'] for o in resp.data['results']}, {2})
+
+    def test_admin_order_list_cursor_pagination(self):
+        admin = CustomUser.objects.create_user(
+            username='admin', email='admin@test.com', password='test1234', user_type='admin',
+        )
+        for _ in range(7):
+            create_order(self.customer, self.restaurant)
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('order_number', flat=True))
+        self._auth(admin)
+        seen = []
+        url = '/api/admin/orders/?pagination=cursor&page_size=3'
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            seen += [o['order_number'] for o in resp.data['results']]
+            url = resp.data['next']
+        self.assertEqual(seen, expected)
+
+
+class OrderNumberConcurrencyTests(MarketplaceFixtures, TransactionTestCase):
+    WORKERS = 16
+    ORDERS = 2000
+
+    def _place_orders(self, count):
+        try:
+            return [
+                create_order(self.customer, self.restaurant).order_number
+                for _ in range(count)
+            ]
+        finally:
+            connection.close()
+
+    def test_parallel_orders_get_unique_numbers(self):
+        per_worker = self.ORDERS // self.WORKERS
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            batches = list(pool.map(self._place_orders, [per_worker] * self.WORKERS))
+        numbers = [n for batch in batches for n in batch]
+        self.assertEqual(len(numbers), self.ORDERS)
+        self.assertEqual(len(set(numbers)), self.ORDERS)
+        self.assertTrue(all(re.match(r'^FD-\d{8}-\d+$', n) for n in numbers))
+        self.assertEqual(Order.objects.count(), self.ORDERS)
+
+
+class DispatchConcurrencyTests(MarketplaceFixtures, TransactionTestCase):
+    DRIVERS = 12
+    ORDERS = 8
+
+    def setUp(self):
+        super().setUp()
+        for _ in range(self.ORDERS):
+            create_order(self.customer, self.restaurant, status='ready')
+        self.drivers = [
+            CustomUser.objects.create_user(
+                username=f'd{i}', email=f'd{i}@test.com', password='test1234',
+                user_type='delivery_driver', city='Karachi',
+            )
+            for i in range(self.DRIVERS)
+        ]
+
+    def _claim_next(self, driver):
+        try:
+            return DispatchService.claim_next(driver)
+        except OrderStateError:
+            return None
+        finally:
+            connection.close()
+
+    def test_each_order_claimed_once(self):
+        with ThreadPoolExecutor(self.DRIVERS) as pool:
+            claimed = [c for c in pool.map(self._claim_next, self.drivers) if c]
+        self.assertEqual(len(claimed), self.ORDERS)
+        self.assertEqual(len(set(claimed)), self.ORDERS)
+        self.assertEqual(
+            Order.objects.filter(status='picked_up').values('driver').distinct().count(), self.ORDERS,
+        )
+
+
+class EventLogTests(MarketplaceFixtures, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = create_order(self.customer, self.restaurant)
+
+    def _log(self, status_value):
+        return OrderEvent.objects.create(
+            order=self.order, restaurant_id=self.order.restaurant_id, status=status_value,
+        )
+
+    def _hold_open(self, logged, release):
+        try:
+            with transaction.atomic():
+                self._log('confirmed')
+                logged.set()
+                release.wait(5)
+        finally:
+            connection.close()
+
+    def test_readers_never_skip_a_late_commit(self):
+        after = visible_events(OrderEvent.objects.all()).last().id
+        logged, release = threading.Event(), threading.Event()
+        writer = threading.Thread(target=self._hold_open, args=(logged, release))
+        writer.start()
+        try:
+            logged.wait(5)
+            self._log('cancelled')
+            self.assertEqual(list(visible_events(OrderEvent.objects.all(), after)), [])
+        finally:
+            release.set()
+            writer.join()
+        self.assertEqual(
+            [e.status for e in visible_events(OrderEvent.objects.all(), after)], ['confirmed', 'cancelled'],
+        )
+
+
+class OrderStreamTests(MarketplaceFixtures, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = create_order(self.customer, self.restaurant)
+
+    def _set_status(self, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = value
+            self.order.save()
+
+    async def _open(self, url, user):
+        response = await self.async_client.get(url, {'token': str(AccessToken.for_user(user))})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def test_order_stream_pushes_status_changes(self):
+        stream = await self._open(f'/api/orders/{self.order.order_number}/stream/', self.customer)
+        await sync_to_async(self._set_status)('confirmed')
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertIn(b'\nevent: status\n', chunk)
+        self.assertIn(b'"status": "confirmed"', chunk)
+        self.assertIn(b'"previous_status": "pending"', chunk)
+
+    async def test_stream_replays_events_after_last_event_id(self):
+        first = await OrderEvent.objects.aget(order=self.order)
+        await sync_to_async(self._set_status)('confirmed')
+        await sync_to_async(self._set_status)('preparing')
+        response = await self.async_client.get(
+            f'/api/orders/{self.order.order_number}/stream/',
+            {'token': str(AccessToken.for_user(self.customer))},
+            headers={'Last-Event-ID': str(first.id)},
+        )
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertIn(b'"status": "confirmed"', await anext(stream))
+        self.assertIn(b'"status": "preparing"', await anext(stream))
+
+        await sync_to_async(self._set_status)('ready')
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertIn(b'"status": "ready"', chunk)
+
+    async def test_restaurant_stream(self):
+        stream = await self._open('/api/restaurant/orders/stream/', self.owner)
+        await sync_to_async(self._set_status)('preparing')
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertIn(self.order.order_number.encode(), chunk)
+
+    async def test_stream_requires_access(self):
+        url = f'/api/orders/{self.order.order_number}/stream/'
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get(url, {'token': str(AccessToken.for_user(self.owner))})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        other = await sync_to_async(CustomUser.objects.create_user)(
+            username='other', email='other@test.com', password='test1234', user_type='customer',
+        )
+        response = await self.async_client.get(url, {'token': str(AccessToken.for_user(other))})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_broker_drops_oldest_for_slow_subscribers(self):
+        broker = InProcessBroker(maxsize=2)
+        async with broker.subscribe(['a']) as subscription:
+            for n in range(3):
+                broker.publish('a', n)
+            await asyncio.sleep(0)
+            self.assertEqual([await subscription.get(0.1) for _ in range(2)], [1, 2])
+            self.assertIsNone(await subscription.get(0.01))
+        self.assertEqual(broker._subscribers, {})
+
+
+class PostgresBrokerTests(TransactionTestCase):
+    async def test_messages_reach_subscribers_through_the_database(self):
+        broker = PostgresBroker()
+        try:
+            async with broker.subscribe(['order:FD-1']) as subscription:
+                self.assertTrue(await sync_to_async(broker.listening.wait)(5))
+                await sync_to_async(broker.publish)('order:FD-1', {'event': 'payment', 'payment_status': 'completed'})
+                await sync_to_async(broker.publish)('order:FD-2', {'event': 'payment'})
+                self.assertEqual(await subscription.get(5), {'event': 'payment', 'payment_status': 'completed'})
+                self.assertIsNone(await subscription.get(0.2))
+        finally:
+            await sync_to_async(broker.close)()
+
+
+class CartConcurrencyTests(MarketplaceFixtures, TransactionTestCase):
+    WORKERS = 16
+
+    def _add(self, backend):
+        try:
+            backend.add_item(self.customer, self.item.id, 1)
+        finally:
+            connection.close()
+
+    def test_parallel_adds_share_one_cart_and_line(self):
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            list(pool.map(self._add, [DatabaseCartBackend()] * self.WORKERS * 4))
+        self.assertEqual(Cart.objects.filter(user=self.customer).count(), 1)
+        self.assertEqual(CartItem.objects.get().quantity, self.WORKERS * 4)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_parallel_adds_to_cached_cart(self):
+        cache.clear()
+        backend = CacheCartBackend()
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            list(pool.map(self._add, [backend] * self.WORKERS * 4))
+        self.assertEqual(backend.get_cart(self.customer).lines[0].quantity, self.WORKERS * 4)
+
+
+@override_settings(CART_BACKEND='orders.carts.CacheCartBackend', CACHE_SHARED=True)
+class CacheCartTests(MarketplaceFixtures, APITestCase):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.item1 = self.item
+        self.item2 = create_menu_item(self.restaurant, name='Item 2', slug='item-2', price=Decimal('250'))
+        other = create_restaurant(
+            self.owner, name='Other Resto', slug='other-resto', cuisine_type='Chinese',
+            delivery_fee=Decimal('80'), minimum_order=Decimal('100'), estimated_delivery_time=25,
+        )
+        self.item_other = create_menu_item(other, name='Other Item', slug='other-item', price=Decimal('200'))
+        self.client.force_authenticate(user=self.customer)
+
+    def test_cart_lives_in_cache_until_flushed(self):
+        self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 2})
+        resp = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'add', 'menu_item_id': self.item2.id},
+            {'op': 'update', 'item_id': self.item1.id, 'quantity': 3},
+        ]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['items_count'], 4)
+        self.assertEqual(resp.data['restaurant']['id'], self.restaurant.id)
+        self.assertEqual(resp.data['total_amount'], '1150.00')
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(list(DirtyCart.objects.values_list('user_id', flat=True)), [self.customer.id])
+
+        resp = self.client.post('/api/cart/add/', {'menu_item_id': self.item_other.id})
+        self.assertTrue(resp.data['conflict'])
+
+        call_command('flush_carts', stdout=StringIO())
+        self.assertFalse(DirtyCart.objects.exists())
+        cart = Cart.objects.get(user=self.customer)
+        self.assertEqual(
+            sorted(cart.items.values_list('menu_item_id', 'quantity')),
+            [(self.item1.id, 3), (self.item2.id, 1)],
+        )
+
+        # A cart evicted from the cache is reloaded from its flushed rows.
+        cache.clear()
+        resp = self.client.patch(f'/api/cart/item/{self.item2.id}/update/', {'quantity': 0})
+        self.assertEqual([i['menu_item']['id'] for i in resp.data['items']], [self.item1.id])
+        CacheCartBackend().flush()
+        self.assertEqual(list(cart.items.values_list('menu_item_id', flat=True)), [self.item1.id])
+
+    def test_checkout_only_removes_what_was_ordered(self):
+        backend = CacheCartBackend()
+        backend.add_item(self.customer, self.item1.id, 2)
+        ordered = backend.get_cart(self.customer).lines
+
+        # A checkout that rolls back leaves the cart alone.
+        with self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                backend.remove_ordered(self.customer, ordered)
+                raise RuntimeError
+        self.assertEqual(backend.get_cart(self.customer).lines[0].quantity, 2)
+
+        # Added while the order was being placed: stays in the cart.
+        backend.add_item(self.customer, self.item1.id, 1)
+        backend.add_item(self.customer, self.item2.id, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            backend.remove_ordered(self.customer, ordered)
+        self.assertEqual(
+            [(line.menu_item_id, line.quantity) for line in backend.get_cart(self.customer).lines],
+            [(self.item1.id, 1), (self.item2.id, 1)],
+        )
+
+    @override_settings(CACHE_SHARED=False)
+    def test_requires_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CacheCartBackend()
+
+    def test_checkout_reads_cached_cart(self):
+        self.client.post('/api/cart/add/', {'menu_item_id': self.item1.id, 'quantity': 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post('/api/orders/create/', {
+                'delivery_address': '123 Test St', 'delivery_city': 'Karachi', 'payment_method': 'cod',
+            })
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['total_amount'], '600.00')
+        self.assertIsNone(self.client.get('/api/cart/').data['id'])
+        resp = self.client.post('/api/orders/create/', {
+            'delivery_address': '123 Test St', 'delivery_city': 'Karachi', 'payment_method': 'cod',
+        })
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,35 +1,37 @@
 from rest_framework import generics, status
 from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from accounts.permissions import IsCustomer, IsRestaurantOwner, IsDeliveryDriver
-from menu.models import MenuItem
-from .models import Cart, CartItem, Order
+from .models import Order
 from .serializers import (
-    CartSerializer, AddToCartSerializer, UpdateCartItemSerializer,
+    CartSerializer, AddToCartSerializer, UpdateCartItemSerializer, CartBatchSerializer,
     OrderCreateSerializer, OrderListSerializer, OrderDetailSerializer,
-    OrderStatusUpdateSerializer,
+    OrderStatusUpdateSerializer, OrderEventSerializer,
 )
+from .idempotency import IdempotentMixin
+from .events import events_for, visible_events
+from .carts import get_cart_backend
+from .services import CartConflict, DispatchService, OrderStateError, OrderStateService
 
 
 # ─── Cart ───────────────────────────────────────────────────────────────
 
+def _cart_response(user, backend):
+    cart = backend.get_cart(user)
+    return Response(CartSerializer(cart).data if cart else backend.EMPTY)
+
+
 class CartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            cart = Cart.objects.prefetch_related('items__menu_item', 'restaurant').get(user=request.user)
-            return Response(CartSerializer(cart).data)
-        except Cart.DoesNotExist:
-            return Response({
-                'id': None, 'restaurant': None, 'items': [],
-                'total_amount': '0', 'items_count': 0, 'created_at': None,
-            })
+        return _cart_response(request.user, get_cart_backend())
 
     def delete(self, request):
-        Cart.objects.filter(user=request.user).delete()
+        get_cart_backend().clear(request.user)
         return Response({'message': 'Cart cleared.'})
 
 
@@ -39,93 +41,70 @@ class AddToCartView(APIView):
     def post(self, request):
         serializer = AddToCartSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-
-        menu_item = MenuItem.objects.select_related('restaurant').get(
-            id=serializer.validated_data['menu_item_id']
-        )
-        restaurant = menu_item.restaurant
-        quantity = serializer.validated_data['quantity']
-        instructions = serializer.validated_data.get('special_instructions', '')
-
-        cart = Cart.objects.filter(user=request.user).first()
-
-        if cart and cart.restaurant_id != restaurant.id:
+        backend = get_cart_backend()
+        try:
+            backend.add_item(
+                request.user,
+                serializer.validated_data['menu_item_id'],
+                serializer.validated_data['quantity'],
+                serializer.validated_data.get('special_instructions', ''),
+            )
+        except CartConflict as exc:
             return Response(
-                {
-                    'error': f'Your cart has items from {cart.restaurant.name}. '
-                             'Clear cart first or continue with current restaurant.',
-                    'conflict': True,
-                    'current_restaurant': cart.restaurant.name,
-                },
-                status=status.HTTP_400_BAD_REQUEST,
+                {'error': exc.message, 'conflict': True, 'current_restaurant': exc.restaurant.name},
+                status=exc.status_code,
             )
+        except OrderStateError as exc:
+            return Response({'menu_item_id': [exc.message]}, status=exc.status_code)
+        return _cart_response(request.user, backend)
 
-        if not cart:
-            cart = Cart.objects.create(user=request.user, restaurant=restaurant)
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart, menu_item=menu_item,
-            defaults={'quantity': quantity, 'special_instructions': instructions},
-        )
-        if not created:
-            cart_item.quantity += quantity
-            if instructions:
-                cart_item.special_instructions = instructions
-            cart_item.save()
+class CartBatchView(APIView):
+    """Apply several cart operations in one request and return the final cart."""
+    permission_classes = [IsAuthenticated]
 
-        cart.refresh_from_db()
-        return Response(CartSerializer(cart).data, status=status.HTTP_200_OK)
+    def post(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        backend = get_cart_backend()
+        try:
+            backend.apply_batch(request.user, serializer.validated_data['operations'])
+        except CartConflict as exc:
+            return Response(
+                {'index': exc.index, 'error': exc.message, 'conflict': True,
+                 'current_restaurant': exc.restaurant.name},
+                status=exc.status_code,
+            )
+        except OrderStateError as exc:
+            return Response({'index': exc.index, 'error': exc.message}, status=exc.status_code)
+        return _cart_response(request.user, backend)
 
 
 class UpdateCartItemView(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, pk):
-        cart_item = get_object_or_404(CartItem, pk=pk, cart__user=request.user)
         serializer = UpdateCartItemSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-
-        qty = serializer.validated_data['quantity']
-        cart = cart_item.cart
-
-        if qty == 0:
-            cart_item.delete()
-            if not cart.items.exists():
-                cart.delete()
-                return Response({
-                    'id': None, 'restaurant': None, 'items': [],
-                    'total_amount': '0', 'items_count': 0, 'created_at': None,
-                })
-        else:
-            cart_item.quantity = qty
-            cart_item.save()
-
-        cart.refresh_from_db()
-        return Response(CartSerializer(cart).data)
+        backend = get_cart_backend()
+        if not backend.set_quantity(request.user, {'pk': pk}, serializer.validated_data['quantity']):
+            raise NotFound
+        return _cart_response(request.user, backend)
 
 
 class RemoveCartItemView(APIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, pk):
-        cart_item = get_object_or_404(CartItem, pk=pk, cart__user=request.user)
-        cart = cart_item.cart
-        cart_item.delete()
-
-        if not cart.items.exists():
-            cart.delete()
-            return Response({
-                'id': None, 'restaurant': None, 'items': [],
-                'total_amount': '0', 'items_count': 0, 'created_at': None,
-            })
-
-        cart.refresh_from_db()
-        return Response(CartSerializer(cart).data)
+        backend = get_cart_backend()
+        if not backend.remove_item(request.user, {'pk': pk}):
+            raise NotFound
+        return _cart_response(request.user, backend)
 
 
 # ─── Orders ─────────────────────────────────────────────────────────────
 
-class CreateOrderView(APIView):
+class CreateOrderView(IdempotentMixin, APIView):
     permission_classes = [IsAuthenticated, IsCustomer]
 
     def post(self, request):
@@ -146,9 +125,7 @@ class CustomerOrderListView(generics.ListAPIView):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        qs = Order.objects.filter(user=self.request.user).select_related(
-            'restaurant', 'user', 'driver'
-        ).prefetch_related('items__menu_item').order_by('-created_at')
+        qs = Order.objects.filter(user=self.request.user).for_list().order_by('-created_at')
         s = self.request.query_params.get('status')
         if s:
             qs = qs.filter(status=s)
@@ -176,11 +153,43 @@ class CancelOrderView(APIView):
                 {'error': 'Order can only be cancelled when pending or confirmed.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        order.status = 'cancelled'
-        order.save()
+        try:
+            OrderStateService.transition(order, 'cancelled', request.user)
+        except OrderStateError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
         return Response(OrderDetailSerializer(order).data)
 
 
+class OrderEventListView(APIView):
+    """Status changes after ``?after=<event id>`` on the orders the caller can see.
+
+    Clients keep ``last_id`` and pass it back as ``after``; while
+    ``has_more`` is true there are further events to fetch straight away.
+    """
+    permission_classes = [IsAuthenticated]
+    page_size = 100
+
+    def get_queryset(self):
+        return events_for(self.request.user).select_related('order')
+
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+        except ValueError:
+            return Response(
+                {'error': '"after" must be an event id.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        events = list(visible_events(self.get_queryset(), after)[:self.page_size + 1])
+        has_more = len(events) > self.page_size
+        events = events[:self.page_size]
+        return Response({
+            'events': OrderEventSerializer(events, many=True).data,
+            'last_id': events[-1].id if events else after,
+            'has_more': has_more,
+        })
+
+
 class RestaurantOrderListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsRestaurantOwner]
     serializer_class = OrderListSerializer
@@ -189,9 +198,7 @@ class RestaurantOrderListView(generics.ListAPIView):
     def get_queryset(self):
         qs = Order.objects.filter(
             restaurant__owner=self.request.user
-        ).select_related('restaurant', 'user', 'driver').prefetch_related(
-            'items__menu_item'
-        ).order_by('-created_at')
+        ).for_list().order_by('-created_at')
         s = self.request.query_params.get('status')
         if s:
             qs = qs.filter(status=s)
@@ -210,41 +217,50 @@ class RestaurantOrderUpdateView(APIView):
             context={'order': order, 'request': request},
         )
         serializer.is_valid(raise_exception=True)
-        order.status = serializer.validated_data['status']
-        order.save()
+        try:
+            OrderStateService.transition(order, serializer.validated_data['status'], request.user)
+        except OrderStateError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
         return Response(OrderDetailSerializer(order).data)
 
 
 # ─── Driver ─────────────────────────────────────────────────────────────
 
+def _claimed_order_data(order_id):
+    order = Order.objects.select_related('restaurant', 'driver').prefetch_related(
+        'items__menu_item'
+    ).get(pk=order_id)
+    return OrderDetailSerializer(order).data
+
+
 class DriverAvailableOrdersView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsDeliveryDriver]
     serializer_class = OrderListSerializer
 
     def get_queryset(self):
-        city = self.request.user.city
-        qs = Order.objects.filter(status='ready').select_related(
-            'restaurant', 'user', 'driver'
-        ).prefetch_related('items__menu_item').order_by('-created_at')
-        if city:
-            qs = qs.filter(delivery_city__iexact=city)
-        return qs
+        return DispatchService.available_orders(self.request.user).for_list().order_by('-created_at')
 
 
 class DriverAcceptOrderView(APIView):
     permission_classes = [IsAuthenticated, IsDeliveryDriver]
 
     def post(self, request, order_number):
-        order = get_object_or_404(Order, order_number=order_number, status='ready')
-        if Order.objects.filter(driver=request.user, status='picked_up').exists():
-            return Response(
-                {'error': 'You already have an active delivery.'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        order.driver = request.user
-        order.status = 'picked_up'
-        order.save()
-        return Response(OrderDetailSerializer(order).data)
+        try:
+            order_id = DispatchService.claim(request.user, order_number)
+        except OrderStateError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
+        return Response(_claimed_order_data(order_id))
+
+
+class DriverClaimNextOrderView(APIView):
+    permission_classes = [IsAuthenticated, IsDeliveryDriver]
+
+    def post(self, request):
+        try:
+            order_id = DispatchService.claim_next(request.user)
+        except OrderStateError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
+        return Response(_claimed_order_data(order_id))
 
 
 class DriverUpdateOrderView(APIView):
@@ -259,8 +275,10 @@ class DriverUpdateOrderView(APIView):
             context={'order': order, 'request': request},
         )
         serializer.is_valid(raise_exception=True)
-        order.status = serializer.validated_data['status']
-        order.save()
+        try:
+            OrderStateService.transition(order, serializer.validated_data['status'], request.user)
+        except OrderStateError as exc:
+            return Response({'error': exc.message}, status=exc.status_code)
         return Response(OrderDetailSerializer(order).data)
 
 
@@ -285,6 +303,4 @@ class DriverOrderHistoryView(generics.ListAPIView):
     def get_queryset(self):
         return Order.objects.filter(
             driver=self.request.user, status='delivered',
-        ).select_related('restaurant', 'user', 'driver').prefetch_related(
-            'items__menu_item'
-        ).order_by('-created_at')
+        ).for_list().order_by('-created_at')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, PaymentJob, PaymentWebhook
 
 
 @admin.register(Payment)
@@ -7,3 +7,16 @@ class PaymentAdmin(admin.ModelAdmin):
     list_display = ['transaction_id', 'order', 'user', 'amount', 'payment_method', 'payment_status', 'created_at']
     list_filter = ['payment_status', 'payment_method']
     search_fields = ['transaction_id', 'order__order_number']
+
+
+@admin.register(PaymentJob)
+class PaymentJobAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'attempts', 'run_after', 'locked_until', 'created_at']
+    raw_id_fields = ['payment']
+
+
+@admin.register(PaymentWebhook)
+class PaymentWebhookAdmin(admin.ModelAdmin):
+    list_display = ['gateway', 'event_id', 'transaction_id', 'status', 'outcome', 'received_at', 'processed_at']
+    list_filter = ['gateway', 'outcome']
+    search_fields = ['event_id', 'transaction_id']
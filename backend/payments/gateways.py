@@ -0,0 +1,255 @@
+"""Payment gateway adapters.
+
+``get_gateway(method)`` returns the process-wide adapter configured for a
+payment method in ``settings.PAYMENT_GATEWAYS``. HTTP adapters keep a
+bounded pool of keep-alive connections, time out every socket operation,
+stop calling a gateway for a while after repeated failures, and record
+call latency per method.
+"""
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class GatewayError(Exception):
+    """The gateway could not give an answer; the call may be retried."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The call was not attempted: the circuit is open or the pool is exhausted."""
+
+
+class LatencyHistogram:
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def observe(self, outcome, seconds):
+        with self._lock:
+            counts = self._counts.setdefault(outcome, {'buckets': [0] * (len(self.BUCKETS) + 1), 'sum': 0.0})
+            index = next((i for i, bound in enumerate(self.BUCKETS) if seconds <= bound), len(self.BUCKETS))
+            counts['buckets'][index] += 1
+            counts['sum'] += seconds
+
+    def snapshot(self):
+        """Cumulative counts per upper bound, as Prometheus reports them."""
+        labels = [str(bound) for bound in self.BUCKETS] + ['+Inf']
+        result = {}
+        with self._lock:
+            for outcome, counts in self._counts.items():
+                running, buckets = 0, {}
+                for label, count in zip(labels, counts['buckets']):
+                    running += count
+                    buckets[label] = running
+                result[outcome] = {'buckets': buckets, 'count': running, 'sum': round(counts['sum'], 6)}
+        return result
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls are refused until ``reset_timeout`` seconds have
+    passed; then a single trial call is let through, and its outcome
+    closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_skipped(self):
+        """The allowed call was never made; let the next one be the trial instead."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ConnectionPool:
+    """At most ``size`` keep-alive connections to one host.
+
+    Callers wait up to ``timeout`` seconds for a free connection, so a slow
+    gateway can hold no more than ``size`` workers at a time.
+    """
+
+    def __init__(self, url, size=4, timeout=5):
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.host, self.port = parts.hostname, parts.port
+        self.timeout = timeout
+        self._slots = queue.LifoQueue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._slots.get(timeout=self.timeout)
+        except queue.Empty:
+            raise GatewayUnavailable('No gateway connection became free in time.')
+        if conn is None:
+            conn = self.connection_class(self.host, self.port, timeout=self.timeout)
+        try:
+            yield conn
+        except BaseException:
+            # The connection may hold half a response; don't reuse it.
+            conn.close()
+            conn = None
+            raise
+        finally:
+            self._slots.put(conn)
+
+
+class BaseGateway:
+    def __init__(self, method, **options):
+        self.method = method
+        self.histogram = LatencyHistogram()
+
+    def charge(self, payment):
+        """Return ``(success, gateway_response)`` or raise ``GatewayError``."""
+        raise NotImplementedError
+
+    def stats(self):
+        return {'latency': self.histogram.snapshot()}
+
+
+class SimulatedGateway(BaseGateway):
+    """Approves nine payments in ten after ``delay`` seconds; for development."""
+
+    def __init__(self, method, delay=1, success_rate=0.9, **options):
+        super().__init__(method, **options)
+        self.delay = delay
+        self.success_rate = success_rate
+
+    def charge(self, payment):
+        started = time.monotonic()
+        time.sleep(self.delay)
+        success = random.random() < self.success_rate
+        self.histogram.observe('approved' if success else 'declined', time.monotonic() - started)
+        return success, {'simulated': True, 'success': success}
+
+
+class HTTPGateway(BaseGateway):
+    """POSTs a JSON charge request and reads ``{"success": bool, ...}`` back.
+
+    The payment's ``transaction_id`` goes in an ``Idempotency-Key`` header,
+    so repeating a call whose outcome was lost never charges twice.
+    Connection errors, timeouts and 5xx responses are failures for the
+    circuit breaker; a declined payment is an answer, not a failure, and a
+    call that found the pool exhausted was never made.
+    """
+
+    def __init__(self, method, url, pool_size=4, timeout=5, failure_threshold=5, reset_timeout=30, **options):
+        super().__init__(method, **options)
+        self.path = urlsplit(url).path or '/'
+        self.pool = ConnectionPool(url, size=pool_size, timeout=timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def payload(self, payment):
+        return {
+            'method': self.method,
+            'transaction_id': payment.transaction_id,
+            'amount': str(payment.amount),
+            'phone_number': payment.phone_number,
+            'card_last_four': payment.card_last_four,
+        }
+
+    def charge(self, payment):
+        if not self.breaker.allow():
+            raise GatewayUnavailable(f'{self.method} gateway is unavailable.')
+        started = time.monotonic()
+        try:
+            with self.pool.connection() as conn:
+                conn.request(
+                    'POST', self.path, body=json.dumps(self.payload(payment)),
+                    headers={'Content-Type': 'application/json', 'Idempotency-Key': payment.transaction_id},
+                )
+                response = conn.getresponse()
+                body = response.read()
+            if response.status >= 500:
+                raise GatewayError(f'{self.method} gateway answered {response.status}.')
+            data = json.loads(body)
+        except GatewayUnavailable:
+            # No free connection: the gateway was never asked, so this
+            # says nothing about its health.
+            self.breaker.record_skipped()
+            raise
+        except GatewayError:
+            self._failed(started)
+            raise
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            self._failed(started)
+            raise GatewayError(f'{self.method} gateway call failed: {exc}') from exc
+
+        self.breaker.record_success()
+        success = bool(data.get('success'))
+        self.histogram.observe('approved' if success else 'declined', time.monotonic() - started)
+        return success, data
+
+    def _failed(self, started):
+        self.breaker.record_failure()
+        self.histogram.observe('error', time.monotonic() - started)
+
+    def stats(self):
+        return {**super().stats(), 'circuit': self.breaker.state}
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(method):
+    with _gateways_lock:
+        if method not in _gateways:
+            config = settings.PAYMENT_GATEWAYS[method]
+            gateway_class = import_string(config['BACKEND'])
+            _gateways[method] = gateway_class(method, **config.get('OPTIONS', {}))
+        return _gateways[method]
+
+
+def reset_gateways():
+    """Drop configured adapters, e.g. after ``PAYMENT_GATEWAYS`` changes in tests."""
+    with _gateways_lock:
+        _gateways.clear()
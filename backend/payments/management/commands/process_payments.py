@@ -0,0 +1,48 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payments.gateways import get_gateway
+from payments.services import PaymentQueue
+
+logger = logging.getLogger('payments.gateways')
+
+
+class Command(BaseCommand):
+    help = (
+        'Work the queue of pending wallet and card payments. Each worker makes up to --concurrency '
+        'gateway calls at a time, so its throughput is about --concurrency divided by the gateway latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--concurrency', type=int, default=settings.PAYMENT_GATEWAY_POOL_SIZE,
+                            help='Gateway calls in flight at once (default: the gateway connection pool size)')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--stats-interval', type=float, default=60.0,
+                            help='Seconds between gateway latency/circuit reports in the log')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def log_stats(self):
+        for method in settings.PAYMENT_GATEWAYS:
+            logger.info('%s gateway: %s', method, json.dumps(get_gateway(method).stats()))
+
+    def handle(self, *args, **options):
+        total = 0
+        next_report = time.monotonic() + options['stats_interval']
+        while True:
+            processed = PaymentQueue.run_pending(options['batch_size'], options['concurrency'])
+            total += processed
+            if time.monotonic() >= next_report:
+                self.log_stats()
+                next_report = time.monotonic() + options['stats_interval']
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.log_stats()
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} payments.'))
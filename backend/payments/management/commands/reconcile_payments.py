@@ -0,0 +1,38 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from payments.services import PaymentReconciler
+
+
+class Command(BaseCommand):
+    help = 'Apply queued gateway webhooks to payments and orders, and report mismatches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--stuck-after', type=int, default=30,
+                            help='Minutes after which an unsettled payment with no queued job is reported')
+
+    def handle(self, *args, **options):
+        outcomes = Counter()
+        while True:
+            rows = PaymentReconciler.apply_batch(options['batch_size'])
+            if not rows:
+                break
+            for _id, gateway, event_id, transaction_id, callback_status, outcome in rows:
+                outcomes[outcome] += 1
+                if outcome in PaymentReconciler.MISMATCHES:
+                    self.stdout.write(self.style.WARNING(
+                        f'{outcome}: {gateway} event {event_id} says {transaction_id} is {callback_status}'
+                    ))
+
+        repaired = PaymentReconciler.repair_orders()
+        if repaired:
+            self.stdout.write(self.style.WARNING(f'Marked {repaired} orders paid to match completed payments.'))
+        stuck = PaymentReconciler.stuck_payments(timedelta(minutes=options['stuck_after']))
+        for transaction_id in stuck.values_list('transaction_id', flat=True)[:50]:
+            self.stdout.write(self.style.WARNING(f'stuck: {transaction_id} has not settled'))
+
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items())) or 'none'
+        self.stdout.write(self.style.SUCCESS(f'Processed webhooks: {summary}.'))
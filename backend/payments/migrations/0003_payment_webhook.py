@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-17 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_payment_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentWebhook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gateway', models.CharField(max_length=20)),
+                ('event_id', models.CharField(max_length=100)),
+                ('transaction_id', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')], max_length=20)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('payload', models.JSONField()),
+                ('outcome', models.CharField(blank=True, choices=[('applied', 'Applied'), ('duplicate', 'Duplicate'), ('superseded', 'Superseded'), ('unknown_payment', 'Unknown payment'), ('amount_mismatch', 'Amount mismatch'), ('conflict', 'Conflicts with payment status')], max_length=20)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='webhook_unprocessed_idx')],
+                'constraints': [models.UniqueConstraint(fields=('gateway', 'event_id'), name='unique_webhook_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-17 23:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fail_superseded_payments(apps, schema_editor):
+    Payment = apps.get_model('payments', 'Payment')
+    open_payments = Payment.objects.filter(payment_status__in=['pending', 'processing'])
+    # Keep the newest open payment of each order.
+    for row in open_payments.values('order').annotate(n=Count('id')).filter(n__gt=1):
+        newest = open_payments.filter(order=row['order']).order_by('-created_at', '-id').first()
+        open_payments.filter(order=row['order']).exclude(pk=newest.pk).update(
+            payment_status='failed', gateway_response={'error': 'Superseded by a newer payment.'},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_dirty_cart'),
+        ('payments', '0003_payment_webhook'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_superseded_payments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_status__in', ['pending', 'processing'])), fields=('order',), name='one_open_payment_per_order'),
+        ),
+    ]
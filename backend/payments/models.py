@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.db.models.functions import Now
 from django.conf import settings
 
 
@@ -38,6 +39,13 @@ class Payment(models.Model):
             models.Index(fields=['payment_status']),
             models.Index(fields=['order']),
         ]
+        constraints = [
+            # One payment in flight per order; the view reports a clash as 409.
+            models.UniqueConstraint(
+                fields=['order'], condition=models.Q(payment_status__in=['pending', 'processing']),
+                name='one_open_payment_per_order',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.transaction_id:
@@ -46,3 +54,63 @@ class Payment(models.Model):
 
     def __str__(self):
         return f"Payment {self.transaction_id} - Rs. {self.amount}"
+
+
+class PaymentJob(models.Model):
+    """A queued gateway call for a payment; deleted once the payment settles."""
+
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='job')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(db_default=Now())
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['run_after', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Job for {self.payment.transaction_id}"
+
+
+class PaymentWebhook(models.Model):
+    """Inbox of verified gateway callbacks, applied in batches by ``reconcile_payments``."""
+
+    STATUS_CHOICES = [
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('refunded', 'Refunded'),
+    ]
+    OUTCOME_CHOICES = [
+        ('applied', 'Applied'),
+        ('duplicate', 'Duplicate'),
+        ('superseded', 'Superseded'),
+        ('unknown_payment', 'Unknown payment'),
+        ('amount_mismatch', 'Amount mismatch'),
+        ('conflict', 'Conflicts with payment status'),
+    ]
+
+    gateway = models.CharField(max_length=20)
+    event_id = models.CharField(max_length=100)
+    transaction_id = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    payload = models.JSONField()
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'event_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='webhook_unprocessed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} {self.event_id} ({self.status})"
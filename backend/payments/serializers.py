@@ -0,0 +1,21 @@
+from rest_framework import serializers
+
+from .models import Payment, PaymentWebhook
+
+
+class PaymentDataSerializer(serializers.Serializer):
+    phone_number = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    card_number = serializers.CharField(max_length=19, required=False, allow_blank=True)
+
+
+class ProcessPaymentSerializer(serializers.Serializer):
+    # Defaults to the method chosen at checkout.
+    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHOD_CHOICES, required=False)
+    payment_data = PaymentDataSerializer(required=False)
+
+
+class PaymentWebhookSerializer(serializers.Serializer):
+    event_id = serializers.CharField(max_length=100)
+    transaction_id = serializers.CharField(max_length=50)
+    status = serializers.ChoiceField(choices=PaymentWebhook.STATUS_CHOICES)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
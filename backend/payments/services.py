@@ -1,9 +1,21 @@
-import time
-import random
+import hashlib
+import hmac
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
 from django.utils import timezone
-from .models import Payment
+
+from core.pubsub import get_broker
+from orders.events import order_channel
+from orders.models import Order
+from .gateways import GatewayUnavailable, get_gateway
+from .models import Payment, PaymentJob, PaymentWebhook
+
+TRANSACTION_PREFIXES = {'jazzcash': 'JC', 'easypaisa': 'EP', 'card': 'CARD'}
 
 
 class PaymentService:
@@ -11,12 +23,8 @@ class PaymentService:
     def process_payment(order, payment_method, payment_data=None):
         if payment_method == 'cod':
             return PaymentService._process_cod(order)
-        elif payment_method == 'jazzcash':
-            return PaymentService._process_jazzcash(order, payment_data)
-        elif payment_method == 'easypaisa':
-            return PaymentService._process_easypaisa(order, payment_data)
-        elif payment_method == 'card':
-            return PaymentService._process_card(order, payment_data)
+        elif payment_method in TRANSACTION_PREFIXES:
+            return PaymentService._enqueue(order, payment_method, payment_data or {})
         return {'success': False, 'message': 'Invalid payment method'}
 
     @staticmethod
@@ -32,61 +40,59 @@ class PaymentService:
         return {'success': True, 'payment': payment, 'message': 'Pay on delivery'}
 
     @staticmethod
-    def _process_jazzcash(order, data):
-        time.sleep(1)
-        success = random.random() < 0.9
+    @transaction.atomic
+    def _enqueue(order, payment_method, data):
+        # A customer who chose cash on delivery may still pay up front; the
+        # pending COD payment gives way so one_open_payment_per_order holds.
+        Payment.objects.filter(order=order, payment_method='cod', payment_status='pending').update(
+            payment_status='failed', gateway_response={'error': 'Superseded by a newer payment.'},
+            updated_at=timezone.now(),
+        )
         payment = Payment.objects.create(
             order=order,
             user=order.user,
             amount=order.grand_total,
-            payment_method='jazzcash',
-            payment_status='completed' if success else 'failed',
-            phone_number=data.get('phone_number', '') if data else '',
-            transaction_id=f"FD-JC-{uuid.uuid4().hex[:8].upper()}",
-            gateway_response={'simulated': True, 'success': success},
+            payment_method=payment_method,
+            payment_status='processing',
+            phone_number=data.get('phone_number', '') if payment_method != 'card' else '',
+            card_last_four=data.get('card_number', '')[-4:] if payment_method == 'card' else '',
+            transaction_id=f"FD-{TRANSACTION_PREFIXES[payment_method]}-{uuid.uuid4().hex[:8].upper()}",
         )
-        if success:
-            order.payment_status = 'paid'
-            order.save()
-        return {'success': success, 'payment': payment}
+        PaymentJob.objects.create(payment=payment)
+        return {'success': True, 'queued': True, 'payment': payment, 'message': 'Payment is being processed.'}
 
     @staticmethod
-    def _process_easypaisa(order, data):
-        time.sleep(1)
-        success = random.random() < 0.9
-        payment = Payment.objects.create(
-            order=order,
-            user=order.user,
-            amount=order.grand_total,
-            payment_method='easypaisa',
-            payment_status='completed' if success else 'failed',
-            phone_number=data.get('phone_number', '') if data else '',
-            transaction_id=f"FD-EP-{uuid.uuid4().hex[:8].upper()}",
-            gateway_response={'simulated': True, 'success': success},
-        )
-        if success:
-            order.payment_status = 'paid'
-            order.save()
-        return {'success': success, 'payment': payment}
+    def _call_gateway(payment):
+        return get_gateway(payment.payment_method).charge(payment)
 
     @staticmethod
-    def _process_card(order, data):
-        time.sleep(1)
-        success = random.random() < 0.9
-        payment = Payment.objects.create(
-            order=order,
-            user=order.user,
-            amount=order.grand_total,
-            payment_method='card',
-            payment_status='completed' if success else 'failed',
-            card_last_four=data.get('card_number', '')[-4:] if data else '',
-            transaction_id=f"FD-CARD-{uuid.uuid4().hex[:8].upper()}",
-            gateway_response={'simulated': True, 'success': success},
-        )
+    @transaction.atomic
+    def settle(payment, success, gateway_response):
+        """Record the gateway's answer for a processing payment; ``False`` if it already settled."""
+        now = timezone.now()
+        changes = {
+            'payment_status': 'completed' if success else 'failed',
+            'gateway_response': gateway_response,
+            'paid_at': now if success else None,
+            'updated_at': now,
+        }
+        if not Payment.objects.filter(pk=payment.pk, payment_status='processing').update(**changes):
+            return False
+        for field, value in changes.items():
+            setattr(payment, field, value)
         if success:
-            order.payment_status = 'paid'
-            order.save()
-        return {'success': success, 'payment': payment}
+            Order.objects.filter(pk=payment.order_id).update(payment_status='paid', updated_at=now)
+
+        order_number = Order.objects.values_list('order_number', flat=True).get(pk=payment.order_id)
+        data = {
+            'event': 'payment',
+            'order_number': order_number,
+            'payment_id': payment.pk,
+            'transaction_id': payment.transaction_id,
+            'payment_status': payment.payment_status,
+        }
+        transaction.on_commit(lambda: get_broker().publish(order_channel(order_number), data))
+        return True
 
     @staticmethod
     def confirm_cod_delivery(payment):
@@ -95,3 +101,236 @@ class PaymentService:
         payment.save()
         payment.order.payment_status = 'paid'
         payment.order.save()
+
+
+class PaymentQueue:
+    """Database-backed queue of gateway calls, worked by ``manage.py process_payments``.
+
+    Workers lease jobs with ``SKIP LOCKED`` so they never pick the same
+    rows, and call the gateway outside any transaction. A job whose worker
+    dies is picked up again once its lease runs out, so every attempt
+    sends the payment's ``transaction_id`` as the gateway's idempotency
+    key: a retry after a timeout is answered with the first outcome
+    rather than charged again.
+    """
+
+    @staticmethod
+    @transaction.atomic
+    def claim(batch_size):
+        now = timezone.now()
+        # Settled elsewhere, e.g. by a webhook; nothing left to charge.
+        PaymentJob.objects.exclude(payment__payment_status='processing').delete()
+        jobs = list(
+            PaymentJob.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('payment')
+            .filter(run_after__lte=now, payment__payment_status='processing')
+            .exclude(locked_until__gt=now)
+            .order_by('run_after', 'id')[:batch_size]
+        )
+        if jobs:
+            lease = now + timedelta(seconds=settings.PAYMENT_JOB_LEASE)
+            PaymentJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                locked_until=lease, attempts=F('attempts') + 1,
+            )
+            for job in jobs:
+                job.attempts += 1
+                job.locked_until = lease
+        return jobs
+
+    @staticmethod
+    def holds_lease(job):
+        """Whether ``job``'s lease outlasts the longest a gateway call can take."""
+        # Waiting for a pooled connection and the request each get the timeout.
+        budget = timedelta(seconds=2 * settings.PAYMENT_GATEWAY_TIMEOUT)
+        return timezone.now() + budget < job.locked_until
+
+    @staticmethod
+    def release(jobs):
+        """Hand back claimed jobs that were never run; their attempt doesn't count."""
+        for job in jobs:
+            PaymentJob.objects.filter(pk=job.pk, locked_until=job.locked_until).update(
+                locked_until=None, attempts=F('attempts') - 1,
+            )
+
+    @staticmethod
+    def run(job):
+        payment = job.payment
+        try:
+            success, response = PaymentService._call_gateway(payment)
+        except GatewayUnavailable as exc:
+            # Not attempted, so it doesn't count against the job.
+            PaymentQueue._retry(job, exc, attempted=False)
+            return
+        except Exception as exc:
+            PaymentQueue._retry(job, exc)
+            return
+        PaymentService.settle(payment, success, response)
+        job.delete()
+
+    @staticmethod
+    def _retry(job, exc, attempted=True):
+        if not attempted:
+            job.attempts -= 1
+        elif job.attempts >= settings.PAYMENT_JOB_MAX_ATTEMPTS:
+            PaymentService.settle(job.payment, False, {'error': str(exc)})
+            job.delete()
+            return
+        PaymentJob.objects.filter(pk=job.pk).update(
+            attempts=job.attempts,
+            locked_until=None,
+            last_error=str(exc),
+            run_after=timezone.now() + timedelta(seconds=2 ** job.attempts),
+        )
+
+    @staticmethod
+    def _run_leased(job):
+        if not PaymentQueue.holds_lease(job):
+            # Slow calls used up the lease; another worker may take it.
+            PaymentQueue.release([job])
+            return False
+        PaymentQueue.run(job)
+        return True
+
+    @staticmethod
+    def _run_in_thread(job):
+        try:
+            return PaymentQueue._run_leased(job)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def run_pending(batch_size=10, concurrency=1):
+        """Claim up to ``batch_size`` jobs and run them, ``concurrency`` gateway calls at a time."""
+        jobs = PaymentQueue.claim(batch_size)
+        if concurrency <= 1:
+            for index, job in enumerate(jobs):
+                if not PaymentQueue._run_leased(job):
+                    PaymentQueue.release(jobs[index + 1:])
+                    return index
+            return len(jobs)
+        with ThreadPoolExecutor(concurrency) as pool:
+            return sum(pool.map(PaymentQueue._run_in_thread, jobs))
+
+
+class WebhookService:
+    SIGNATURE_HEADER = 'X-Signature'
+
+    @staticmethod
+    def verify(gateway, body, signature):
+        """Check an ``X-Signature: sha256=<hex HMAC of the raw body>`` header."""
+        secret = settings.PAYMENT_WEBHOOK_SECRETS.get(gateway)
+        if not secret or not signature:
+            return False
+        expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    @staticmethod
+    def record(gateway, data):
+        """Append a callback to the inbox; redelivered events are ignored."""
+        PaymentWebhook.objects.bulk_create([PaymentWebhook(
+            gateway=gateway,
+            event_id=data['event_id'],
+            transaction_id=data['transaction_id'],
+            status=data['status'],
+            amount=data.get('amount'),
+            payload=data['payload'],
+        )], ignore_conflicts=True)
+
+
+_webhooks = PaymentWebhook._meta.db_table
+_payments = Payment._meta.db_table
+_jobs = PaymentJob._meta.db_table
+_orders = Order._meta.db_table
+
+
+class PaymentReconciler:
+    """Applies inbox callbacks to payments and orders, a batch per statement.
+
+    Within a batch only the newest callback per transaction is applied, and
+    a payment it settles has its queued gateway call dropped.
+    Each callback gets an ``outcome``, and anything other than ``applied``
+    or ``duplicate`` is a mismatch for someone to look at.
+    """
+
+    MISMATCHES = ('unknown_payment', 'amount_mismatch', 'conflict')
+
+    APPLY_SQL = f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (transaction_id) id, transaction_id, status, amount, payload
+            FROM {_webhooks} WHERE id = ANY(%(ids)s)
+            ORDER BY transaction_id, id DESC
+        ), applied AS (
+            UPDATE {_payments} p SET
+                payment_status = l.status,
+                gateway_response = l.payload,
+                paid_at = CASE WHEN l.status = 'completed' THEN %(now)s ELSE p.paid_at END,
+                updated_at = %(now)s
+            FROM latest l
+            WHERE p.transaction_id = l.transaction_id
+              AND (l.amount IS NULL OR l.amount = p.amount)
+              AND (
+                  (p.payment_status IN ('pending', 'processing') AND l.status IN ('completed', 'failed'))
+                  OR (p.payment_status = 'completed' AND l.status = 'refunded')
+              )
+            RETURNING p.id AS payment_id, p.order_id, p.payment_status, l.id AS webhook_id
+        ), jobs AS (
+            DELETE FROM {_jobs} j USING applied a WHERE j.payment_id = a.payment_id
+        ), orders AS (
+            UPDATE {_orders} o SET
+                payment_status = CASE a.payment_status WHEN 'completed' THEN 'paid' ELSE 'refunded' END,
+                updated_at = %(now)s
+            FROM applied a
+            WHERE o.id = a.order_id AND a.payment_status IN ('completed', 'refunded')
+            RETURNING o.id
+        ), checked AS (
+            SELECT w.id, p.amount, p.payment_status
+            FROM {_webhooks} w LEFT JOIN {_payments} p ON p.transaction_id = w.transaction_id
+            WHERE w.id = ANY(%(ids)s)
+        )
+        UPDATE {_webhooks} w SET
+            processed_at = %(now)s,
+            outcome = CASE
+                WHEN w.id IN (SELECT webhook_id FROM applied) THEN 'applied'
+                WHEN w.id NOT IN (SELECT id FROM latest) THEN 'superseded'
+                WHEN c.payment_status IS NULL THEN 'unknown_payment'
+                WHEN w.amount IS NOT NULL AND w.amount <> c.amount THEN 'amount_mismatch'
+                WHEN w.status = c.payment_status THEN 'duplicate'
+                ELSE 'conflict'
+            END
+        FROM checked c
+        WHERE w.id = c.id
+        RETURNING w.id, w.gateway, w.event_id, w.transaction_id, w.status, w.outcome
+    """
+
+    @staticmethod
+    @transaction.atomic
+    def apply_batch(batch_size):
+        """Apply up to ``batch_size`` unprocessed callbacks; returns their ``(.., outcome)`` rows."""
+        ids = list(
+            PaymentWebhook.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(PaymentReconciler.APPLY_SQL, {'ids': ids, 'now': timezone.now()})
+            return cursor.fetchall()
+
+    @staticmethod
+    def repair_orders():
+        """Mark orders paid whose payment completed without the order following."""
+        completed = Payment.objects.filter(order=OuterRef('pk'), payment_status='completed')
+        return Order.objects.filter(payment_status='pending').filter(Exists(completed)).update(
+            payment_status='paid', updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def stuck_payments(older_than):
+        """Wallet and card payments still unsettled with no queued gateway call."""
+        return Payment.objects.filter(
+            payment_status__in=['pending', 'processing'],
+            updated_at__lt=timezone.now() - older_than,
+            job__isnull=True,
+        ).exclude(payment_method='cod')
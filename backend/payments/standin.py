@@ -0,0 +1,95 @@
+"""A local HTTP stand-in for a payment gateway, for tests and development.
+
+    with StandInGateway() as gateway:
+        settings.PAYMENT_GATEWAYS['card'] = {
+            'BACKEND': 'payments.gateways.HTTPGateway', 'OPTIONS': {'url': gateway.url},
+        }
+
+It approves every charge by default. Set ``delay``, ``status`` or
+``decline`` to make it slow, broken or strict. A request repeating an
+``Idempotency-Key`` gets the first answer for that key back, as real
+gateways do. It also counts requests, charges and the TCP connections
+they arrived on.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.gateway.lock:
+            self.server.gateway.connections += 1
+
+    def do_POST(self):
+        gateway = self.server.gateway
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with gateway.lock:
+            gateway.requests.append(body)
+        if gateway.delay:
+            time.sleep(gateway.delay)
+
+        key = self.headers.get('Idempotency-Key')
+        with gateway.lock:
+            if key in gateway.charges:
+                code, payload = gateway.charges[key]
+            elif gateway.status >= 500:
+                code, payload = gateway.status, {'error': 'gateway error'}
+            else:
+                code = gateway.status
+                payload = {'success': not gateway.decline, 'reference': f'SI-{len(gateway.charges) + 1}'}
+                gateway.charges[key or object()] = (code, payload)
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that's expected here.
+        pass
+
+
+class StandInGateway:
+    def __init__(self, delay=0, status=200, decline=False):
+        self.delay = delay
+        self.status = status
+        self.decline = decline
+        self.lock = threading.Lock()
+        self.requests = []
+        self.charges = {}
+        self.connections = 0
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/charge'
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.gateway = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,3 +1,333 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient, APITestCase
+from rest_framework import status
+from orders.models import Order
+from .gateways import GatewayError, GatewayUnavailable, HTTPGateway, reset_gateways
+from .models import Payment, PaymentJob, PaymentWebhook
+from .services import PaymentQueue, PaymentReconciler, PaymentService
+from .standin import StandInGateway
+from core.testing import MarketplaceFixtures, create_order
+
+
+class ProcessPaymentTests(MarketplaceFixtures, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = create_order(self.customer, self.restaurant)
+        self.url = f'/api/payments/{self.order.order_number}/process/'
+        self.client.force_authenticate(user=self.customer)
+
+    def test_idempotent_retry_creates_one_payment(self):
+        first = self.client.post(self.url, {'payment_method': 'cod'}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        replay = self.client.post(self.url, {'payment_method': 'cod'}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+        # A new key is a new request, but the order already has an open payment.
+        again = self.client.post(self.url, {'payment_method': 'cod'}, format='json', HTTP_IDEMPOTENCY_KEY='k2')
+        self.assertEqual(again.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_cod_order_can_still_be_paid_by_card(self):
+        cod = self.client.post(self.url, {'payment_method': 'cod'}, format='json')
+        self.assertEqual(cod.status_code, status.HTTP_200_OK)
+        card = self.client.post(self.url, {
+            'payment_method': 'card', 'payment_data': {'card_number': '4242424242424242'},
+        }, format='json')
+        self.assertEqual(card.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Payment.objects.get(pk=cod.data['payment_id']).payment_status, 'failed')
+        self.assertEqual(Payment.objects.get(pk=card.data['payment_id']).payment_status, 'processing')
+
+        # The card payment is now the open one.
+        again = self.client.post(self.url, {
+            'payment_method': 'jazzcash', 'payment_data': {'phone_number': '03001234567'},
+        }, format='json')
+        self.assertEqual(again.status_code, status.HTTP_409_CONFLICT)
+
+    def test_malformed_payment_data_is_rejected(self):
+        for payload in (
+            {'payment_method': 'card', 'payment_data': '4242424242424242'},
+            {'payment_method': 'card', 'payment_data': {'card_number': ['4242']}},
+            {'payment_method': 'bitcoin'},
+        ):
+            resp = self.client.post(self.url, payload, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_wallet_payment_is_queued_and_settled_by_worker(self):
+        with mock.patch.object(PaymentService, '_call_gateway') as gateway:
+            resp = self.client.post(self.url, {
+                'payment_method': 'jazzcash', 'payment_data': {'phone_number': '03001234567'},
+            }, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(resp.data['payment_status'], 'processing')
+            gateway.assert_not_called()
+
+            again = self.client.post(self.url, {'payment_method': 'card'}, format='json')
+            self.assertEqual(again.status_code, status.HTTP_409_CONFLICT)
+
+            gateway.return_value = (True, {'simulated': True, 'success': True})
+            # One call at a time: worker threads would not see this test's transaction.
+            call_command('process_payments', '--once', '--concurrency', '1', stdout=StringIO())
+
+        self.assertFalse(PaymentJob.objects.exists())
+        poll = self.client.get(f'/api/payments/{resp.data["payment_id"]}/')
+        self.assertEqual(poll.data['payment_status'], 'completed')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'paid')
+
+    def test_gateway_errors_are_retried_then_fail(self):
+        payment = PaymentService.process_payment(self.order, 'card', {'card_number': '4242424242424242'})['payment']
+        self.assertEqual(payment.card_last_four, '4242')
+        job = payment.job
+        with self.settings(PAYMENT_JOB_MAX_ATTEMPTS=2), \
+                mock.patch.object(PaymentService, '_call_gateway', side_effect=TimeoutError('gateway timed out')):
+            self.assertEqual(PaymentQueue.run_pending(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.attempts, job.last_error), (1, 'gateway timed out'))
+            # Backed off: not due yet.
+            self.assertEqual(PaymentQueue.run_pending(), 0)
+
+            PaymentJob.objects.update(run_after=job.created_at)
+            self.assertEqual(PaymentQueue.run_pending(), 1)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, 'failed')
+        self.assertFalse(PaymentJob.objects.exists())
+
+    def test_jobs_for_settled_payments_are_dropped(self):
+        payment = PaymentService.process_payment(self.order, 'card', {'card_number': '4242424242424242'})['payment']
+        PaymentService.settle(payment, True, {'source': 'webhook'})
+        with mock.patch.object(PaymentService, '_call_gateway') as gateway:
+            self.assertEqual(PaymentQueue.run_pending(), 0)
+        gateway.assert_not_called()
+        self.assertFalse(PaymentJob.objects.exists())
+
+    def test_jobs_are_released_when_the_lease_runs_short(self):
+        first = PaymentService.process_payment(self.order, 'card', {'card_number': '4242424242424242'})['payment']
+        other = create_order(self.customer, self.restaurant)
+        second = PaymentService.process_payment(other, 'card', {'card_number': '4242424242424242'})['payment']
+
+        # Only enough lease left for the first call.
+        with mock.patch.object(PaymentService, '_call_gateway', return_value=(True, {})), \
+                mock.patch.object(PaymentQueue, 'holds_lease', side_effect=[True, False]):
+            self.assertEqual(PaymentQueue.run_pending(), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.payment_status, 'completed')
+        job = PaymentJob.objects.get()
+        self.assertEqual((job.payment_id, job.attempts, job.locked_until), (second.pk, 0, None))
+
+    def test_worker_charges_through_configured_gateway(self):
+        with StandInGateway() as standin:
+            gateways = {'card': {'BACKEND': 'payments.gateways.HTTPGateway', 'OPTIONS': {'url': standin.url}}}
+            with self.settings(PAYMENT_GATEWAYS=gateways):
+                reset_gateways()
+                self.addCleanup(reset_gateways)
+                resp = self.client.post(self.url, {
+                    'payment_method': 'card', 'payment_data': {'card_number': '4111111111111111'},
+                }, format='json')
+                self.assertEqual(PaymentQueue.run_pending(), 1)
+
+        self.assertEqual(standin.requests[0]['card_last_four'], '1111')
+        payment = Payment.objects.get(pk=resp.data['payment_id'])
+        self.assertEqual(payment.payment_status, 'completed')
+        self.assertEqual(payment.gateway_response['reference'], 'SI-1')
+
+
+class ConcurrentPaymentTests(MarketplaceFixtures, TransactionTestCase):
+    WORKERS = 8
+
+    def setUp(self):
+        super().setUp()
+        self.order = create_order(self.customer, self.restaurant)
+
+    def _pay(self, _):
+        try:
+            client = APIClient()
+            client.force_authenticate(user=self.customer)
+            return client.post(f'/api/payments/{self.order.order_number}/process/', {
+                'payment_method': 'card', 'payment_data': {'card_number': '4242424242424242'},
+            }, format='json').status_code
+        finally:
+            connection.close()
+
+    def test_parallel_requests_open_one_payment(self):
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            codes = sorted(pool.map(self._pay, range(self.WORKERS)))
+        self.assertEqual(codes, [status.HTTP_202_ACCEPTED] + [status.HTTP_409_CONFLICT] * (self.WORKERS - 1))
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+        self.assertEqual(PaymentJob.objects.count(), 1)
+
+    def test_worker_runs_gateway_calls_concurrently(self):
+        orders = [create_order(self.customer, self.restaurant) for _ in range(4)]
+        for order in orders:
+            PaymentService.process_payment(order, 'card', {'card_number': '4242424242424242'})
+        # Every call waits for the others, so run one at a time they would time out.
+        in_flight = threading.Barrier(len(orders), timeout=5)
+
+        def charge(payment):
+            in_flight.wait()
+            return True, {'simulated': True, 'success': True}
+
+        with mock.patch.object(PaymentService, '_call_gateway', side_effect=charge):
+            self.assertEqual(PaymentQueue.run_pending(batch_size=4, concurrency=4), 4)
+        self.assertEqual(Payment.objects.filter(payment_status='completed').count(), 4)
+
+
+class HTTPGatewayTests(APITestCase):
+    def setUp(self):
+        self.payment = Payment(transaction_id='FD-CARD-TEST', amount=Decimal('415'), card_last_four='4242')
+
+    def test_keeps_connections_alive_and_records_latency(self):
+        with StandInGateway() as standin:
+            gateway = HTTPGateway('card', standin.url)
+            for n in range(5):
+                self.payment.transaction_id = f'FD-CARD-{n}'
+                success, response = gateway.charge(self.payment)
+                self.assertTrue(success)
+            standin.decline = True
+            self.payment.transaction_id = 'FD-CARD-5'
+            self.assertEqual(gateway.charge(self.payment)[0], False)
+
+        self.assertEqual(standin.connections, 1)
+        self.assertEqual(standin.requests[0]['transaction_id'], 'FD-CARD-0')
+        stats = gateway.stats()
+        self.assertEqual(stats['circuit'], 'closed')
+        self.assertEqual(stats['latency']['approved']['count'], 5)
+        self.assertEqual(stats['latency']['declined']['buckets']['+Inf'], 1)
+
+    def test_timeouts_open_the_circuit(self):
+        with StandInGateway(delay=0.3) as standin:
+            gateway = HTTPGateway('card', standin.url, timeout=0.05, failure_threshold=2, reset_timeout=0.2)
+            for _ in range(2):
+                with self.assertRaises(GatewayError):
+                    gateway.charge(self.payment)
+            self.assertEqual(gateway.breaker.state, 'open')
+            with self.assertRaises(GatewayUnavailable):
+                gateway.charge(self.payment)
+            self.assertEqual(len(standin.requests), 2)
+
+            # After reset_timeout one trial call goes through and closes the circuit.
+            standin.delay = 0
+            time.sleep(0.25)
+            self.assertTrue(gateway.charge(self.payment)[0])
+            self.assertEqual(gateway.breaker.state, 'closed')
+        self.assertEqual(gateway.stats()['latency']['error']['count'], 2)
+        # The timed-out calls carried the same idempotency key: one charge.
+        self.assertEqual(len(standin.requests), 3)
+        self.assertEqual(list(standin.charges), ['FD-CARD-TEST'])
+
+    def test_server_errors_count_as_failures(self):
+        with StandInGateway(status=503) as standin:
+            gateway = HTTPGateway('card', standin.url, failure_threshold=1)
+            with self.assertRaises(GatewayError):
+                gateway.charge(self.payment)
+        self.assertEqual(gateway.breaker.state, 'open')
+
+    def test_exhausted_pool_is_not_a_failure(self):
+        with StandInGateway() as standin:
+            gateway = HTTPGateway('card', standin.url, pool_size=1, timeout=0.05, failure_threshold=1)
+            with gateway.pool.connection():
+                with self.assertRaises(GatewayUnavailable):
+                    gateway.charge(self.payment)
+            self.assertEqual(gateway.breaker.state, 'closed')
+            self.assertNotIn('error', gateway.stats()['latency'])
+
+            # A trial call that finds no free connection leaves the next call to try.
+            gateway.breaker.record_failure()
+            gateway.breaker.reset_timeout = 0
+            with gateway.pool.connection():
+                with self.assertRaises(GatewayUnavailable):
+                    gateway.charge(self.payment)
+            self.assertTrue(gateway.charge(self.payment)[0])
+            self.assertEqual(gateway.breaker.state, 'closed')
+        self.assertEqual(len(standin.requests), 1)
+
+
+@override_settings(PAYMENT_WEBHOOK_SECRETS={'jazzcash': 'whsec'})
+class PaymentWebhookTests(MarketplaceFixtures, APITestCase):
+    def _payment(self, transaction_id, payment_status='processing'):
+        order = create_order(self.customer, self.restaurant, payment_method='jazzcash')
+        return Payment.objects.create(
+            order=order, user=self.customer, amount=Decimal('415'), payment_method='jazzcash',
+            payment_status=payment_status, transaction_id=transaction_id,
+        )
+
+    def _post(self, data, secret='whsec', gateway='jazzcash'):
+        body = json.dumps(data).encode()
+        signature = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            f'/api/payments/webhooks/{gateway}/', body, content_type='application/json', HTTP_X_SIGNATURE=signature,
+        )
+
+    def test_only_verified_callbacks_are_queued(self):
+        event = {'event_id': 'ev1', 'transaction_id': 'FD-JC-1', 'status': 'completed', 'amount': '415.00'}
+        self.assertEqual(self._post(event, secret='wrong').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self._post(event, gateway='card').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._post({**event, 'status': 'paid'}).status_code, status.HTTP_400_BAD_REQUEST)
+        for _ in range(2):
+            self.assertEqual(self._post(event).status_code, status.HTTP_202_ACCEPTED)
+        webhook = PaymentWebhook.objects.get()
+        self.assertEqual((webhook.transaction_id, webhook.processed_at), ('FD-JC-1', None))
+
+    def test_callbacks_are_not_throttled(self):
+        cache.clear()
+        for n in range(60):
+            event = {'event_id': f'ev{n}', 'transaction_id': f'FD-JC-{n}', 'status': 'completed'}
+            self.assertEqual(self._post(event).status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(PaymentWebhook.objects.count(), 60)
+
+    def test_reconciler_applies_batch_and_reports_mismatches(self):
+        paid = self._payment('FD-JC-PAID')
+        PaymentJob.objects.create(payment=paid)
+        retried = self._payment('FD-JC-RETRY')
+        short = self._payment('FD-JC-SHORT')
+        done = self._payment('FD-JC-DONE', 'completed')
+        refunded = self._payment('FD-JC-REFUND', 'completed')
+        for event_id, transaction_id, callback_status, amount in [
+            ('1', 'FD-JC-PAID', 'completed', '415.00'),
+            ('2', 'FD-JC-RETRY', 'failed', None),
+            ('3', 'FD-JC-RETRY', 'completed', None),
+            ('4', 'FD-JC-NOPE', 'completed', '415.00'),
+            ('5', 'FD-JC-SHORT', 'completed', '1.00'),
+            ('6', 'FD-JC-DONE', 'completed', None),
+            ('7', 'FD-JC-DONE', 'failed', None),
+            ('8', 'FD-JC-REFUND', 'refunded', None),
+        ]:
+            self._post({'event_id': event_id, 'transaction_id': transaction_id,
+                        'status': callback_status, 'amount': amount})
+
+        with self.assertNumQueries(4):
+            rows = PaymentReconciler.apply_batch(100)
+        self.assertEqual({row[2]: row[5] for row in rows}, {
+            '1': 'applied', '2': 'superseded', '3': 'applied', '4': 'unknown_payment',
+            '5': 'amount_mismatch', '6': 'superseded', '7': 'conflict', '8': 'applied',
+        })
+        for payment, expected, order_status in [
+            (paid, 'completed', 'paid'), (retried, 'completed', 'paid'), (short, 'processing', 'pending'),
+            (done, 'completed', 'pending'), (refunded, 'refunded', 'refunded'),
+        ]:
+            payment.refresh_from_db()
+            self.assertEqual(payment.payment_status, expected)
+            self.assertEqual(Order.objects.get(pk=payment.order_id).payment_status, order_status)
+        self.assertFalse(PaymentJob.objects.exists())
+        self.assertEqual(PaymentReconciler.apply_batch(100), [])
+
+        # The command also lines orders up with completed payments.
+        out = StringIO()
+        call_command('reconcile_payments', stdout=out)
+        self.assertIn('Marked 1 orders paid', out.getvalue())
+        self.assertEqual(Order.objects.get(pk=done.order_id).payment_status, 'paid')
@@ -1,6 +1,8 @@
 from django.urls import path
-from .views import ProcessPaymentView
+from .views import PaymentDetailView, PaymentWebhookView, ProcessPaymentView
 
 urlpatterns = [
+    path('payments/<int:pk>/', PaymentDetailView.as_view(), name='payment-detail'),
+    path('payments/webhooks/<str:gateway>/', PaymentWebhookView.as_view(), name='payment-webhook'),
     path('payments/<str:order_number>/process/', ProcessPaymentView.as_view(), name='process-payment'),
 ]
@@ -1,14 +1,34 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
+from orders.idempotency import IdempotentMixin
 from orders.models import Order
-from .services import PaymentService
+from .models import Payment
+from .serializers import PaymentWebhookSerializer, ProcessPaymentSerializer
+from .services import PaymentService, WebhookService
 
 
-class ProcessPaymentView(APIView):
+def _payment_data(request, payment, message=None):
+    data = {
+        'success': payment.payment_status != 'failed',
+        'payment_id': payment.pk,
+        'transaction_id': payment.transaction_id,
+        'payment_status': payment.payment_status,
+    }
+    if message:
+        data['message'] = message
+    if payment.payment_status == 'processing':
+        data['status_url'] = request.build_absolute_uri(reverse('payment-detail', args=[payment.pk]))
+    return data
+
+
+class ProcessPaymentView(IdempotentMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, order_number):
@@ -20,19 +40,29 @@ class ProcessPaymentView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        payment_method = request.data.get('payment_method', order.payment_method)
-        payment_data = request.data.get('payment_data', {})
+        serializer = ProcessPaymentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payment_method = serializer.validated_data.get('payment_method', order.payment_method)
+        payment_data = serializer.validated_data.get('payment_data', {})
 
-        result = PaymentService.process_payment(order, payment_method, payment_data)
+        try:
+            with transaction.atomic():
+                result = PaymentService.process_payment(order, payment_method, payment_data)
+        except IntegrityError:
+            # one_open_payment_per_order: another payment is pending or processing.
+            return Response(
+                {'error': 'A payment for this order is already in progress.'},
+                status=status.HTTP_409_CONFLICT,
+            )
 
         if result.get('success'):
             payment = result['payment']
-            return Response({
-                'success': True,
-                'transaction_id': payment.transaction_id,
-                'payment_status': payment.payment_status,
-                'message': result.get('message', 'Payment processed successfully'),
-            })
+            # Wallet and card payments settle in the background; poll
+            # status_url or listen on the order stream for the outcome.
+            return Response(
+                _payment_data(request, payment, result.get('message', 'Payment processed successfully')),
+                status=status.HTTP_202_ACCEPTED if result.get('queued') else status.HTTP_200_OK,
+            )
         else:
             payment = result.get('payment')
             return Response({
@@ -41,3 +71,33 @@ class ProcessPaymentView(APIView):
                 'payment_status': payment.payment_status if payment else 'failed',
                 'message': result.get('message', 'Payment failed. Please try again.'),
             }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        payment = get_object_or_404(Payment, pk=pk, user=request.user)
+        return Response(_payment_data(request, payment))
+
+
+class PaymentWebhookView(APIView):
+    """Gateway callbacks. Verified ones go into the inbox for ``reconcile_payments``."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    # Gateways call from a handful of addresses; the anonymous rate would
+    # drop their callbacks. The signature check guards this endpoint.
+    throttle_classes = []
+
+    def post(self, request, gateway):
+        if gateway not in settings.PAYMENT_WEBHOOK_SECRETS:
+            return Response({'error': 'Unknown gateway.'}, status=status.HTTP_404_NOT_FOUND)
+        signature = request.headers.get(WebhookService.SIGNATURE_HEADER, '')
+        if not WebhookService.verify(gateway, request.body, signature):
+            return Response({'error': 'Invalid signature.'}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = PaymentWebhookSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        WebhookService.record(gateway, {**serializer.validated_data, 'payload': request.data})
+        return Response({'received': True}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,96 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'restaurant:{slug}:version'
+CATALOG_VERSION_KEY = 'catalog:{name}:version'
+DETAIL_KEY = 'restaurant:{slug}:detail:{version}'
+STATS_KEYS = {
+    'hits': 'restaurant-detail:stats:hits',
+    'misses': 'restaurant-detail:stats:misses',
+    'rebuild_ms': 'restaurant-detail:stats:rebuild_ms',
+}
+
+
+def _fresh_version():
+    # Seeded from the clock so an evicted version key never falls back
+    # onto a number that still has a stale payload cached under it.
+    return int(time.time() * 1000)
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def get_version(slug):
+    return _get_version(VERSION_KEY.format(slug=slug))
+
+
+def bump_version(slug):
+    _bump(VERSION_KEY.format(slug=slug))
+
+
+def get_catalog_version(name):
+    """Version shared by every row of a public listing, e.g. ``'restaurants'``."""
+    return _get_version(CATALOG_VERSION_KEY.format(name=name))
+
+
+def bump_catalog_version(name):
+    _bump(CATALOG_VERSION_KEY.format(name=name))
+
+
+def _incr(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def get_detail(slug, build):
+    """Return the cached detail payload for ``slug``, calling ``build`` on a miss.
+
+    ``build`` returns the payload or ``None`` when the restaurant is not
+    publicly visible; ``None`` is never cached.
+    """
+    key = DETAIL_KEY.format(slug=slug, version=get_version(slug))
+    data = cache.get(key)
+    if data is not None:
+        _incr(STATS_KEYS['hits'])
+        return data
+
+    started = time.perf_counter()
+    data = build()
+    if data is None:
+        return None
+    cache.set(key, data, settings.RESTAURANT_DETAIL_CACHE_TIMEOUT)
+    _incr(STATS_KEYS['misses'])
+    _incr(STATS_KEYS['rebuild_ms'], round((time.perf_counter() - started) * 1000))
+    return data
+
+
+def get_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    hits = values.get(STATS_KEYS['hits'], 0)
+    misses = values.get(STATS_KEYS['misses'], 0)
+    rebuild_ms = values.get(STATS_KEYS['rebuild_ms'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0,
+        'rebuild_ms_total': rebuild_ms,
+        'rebuild_ms_avg': round(rebuild_ms / misses, 2) if misses else 0,
+    }
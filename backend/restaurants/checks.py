@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHE_SHARED:
+        return []
+    return [Error(
+        'The default cache is local to each process, so cached restaurant pages '
+        'and their versions would go stale across workers.',
+        hint='Set REDIS_URL to a Redis instance shared by all processes.',
+        id='restaurants.E001',
+    )]
@@ -0,0 +1,58 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .cache import get_catalog_version
+from .models import Restaurant, RestaurantCategory
+
+FACETS_KEY = 'restaurant-facets:{version}'
+FACETS_TIMEOUT = 60 * 60 * 24
+
+
+def _ranked(counter):
+    return [
+        {'value': value, 'count': count}
+        for value, count in sorted(counter.items(), key=lambda kv: (-kv[1], kv[0]))
+    ]
+
+
+def compute_facets():
+    # One GROUP BY over (cuisine_type, city); every facet is folded from it.
+    rows = (
+        Restaurant.objects.filter(is_active=True, is_approved=True)
+        .values_list('cuisine_type', 'city')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    cuisines, cities = Counter(), Counter()
+    for cuisine, city, count in rows:
+        if cuisine:
+            cuisines[cuisine] += count
+        cities[city] += count
+
+    # Mirrors RestaurantListView's ``category`` filter (cuisine_type__icontains).
+    categories = []
+    for category in RestaurantCategory.objects.filter(is_active=True).values('name', 'slug'):
+        needle = category['name'].lower()
+        count = sum(n for cuisine, n in cuisines.items() if needle in cuisine.lower())
+        categories.append({**category, 'count': count})
+
+    return {
+        'cuisine_type': _ranked(cuisines),
+        'city': _ranked(cities),
+        'category': categories,
+    }
+
+
+def facets_version():
+    return f"{get_catalog_version('restaurants')}:{get_catalog_version('categories')}"
+
+
+def get_facets():
+    key = FACETS_KEY.format(version=facets_version())
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets()
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
@@ -0,0 +1,87 @@
+import math
+
+from django.db.models import F, FloatField
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+GEOHASH_PRECISION = 9
+MAX_CELLS = 16
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        ch <<= 1
+        if value >= mid:
+            ch |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[ch])
+            bits, ch = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return the ``(lat, lng)`` size in degrees of a geohash cell."""
+    total = 5 * precision
+    lng_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def covering_cells(lat, lng, radius_km):
+    """Return the geohash prefixes whose cells cover a circle's bounding box.
+
+    The longest prefix that needs no more than ``MAX_CELLS`` cells is used,
+    so the candidate set stays close to the circle however big it is.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = max(lng - dlng, -180.0), min(lng + dlng, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_h, cell_w = cell_size(precision)
+        rows = math.floor((north + 90) / cell_h) - math.floor((south + 90) / cell_h) + 1
+        cols = math.floor((east + 180) / cell_w) - math.floor((west + 180) / cell_w) + 1
+        if rows * cols <= MAX_CELLS:
+            break
+
+    cells = set()
+    first_row = math.floor((south + 90) / cell_h)
+    first_col = math.floor((west + 180) / cell_w)
+    for row in range(rows):
+        cell_lat = min((first_row + row + 0.5) * cell_h - 90, 90.0)
+        for col in range(cols):
+            cell_lng = min((first_col + col + 0.5) * cell_w - 180, 180.0)
+            cells.add(encode(cell_lat, cell_lng, precision))
+    return cells
+
+
+def distance_expression(lat, lng, lat_field='latitude', lng_field='longitude'):
+    """Haversine distance in km from ``(lat, lng)`` as a database expression."""
+    rlat, rlng = math.radians(lat), math.radians(lng)
+    row_lat = Radians(Cast(F(lat_field), FloatField()))
+    row_lng = Radians(Cast(F(lng_field), FloatField()))
+    a = (
+        Power(Sin((row_lat - rlat) / 2), 2)
+        + math.cos(rlat) * Cos(row_lat) * Power(Sin((row_lng - rlng) / 2), 2)
+    )
+    return Cast(2 * EARTH_RADIUS_KM * ASin(Sqrt(a)), FloatField())
+
+
+def parse_point(value):
+    """Parse ``"lat,lng"`` into floats, raising ``ValueError`` if malformed."""
+    lat, lng = (float(part) for part in value.split(','))
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordinates out of range.')
+    return lat, lng
@@ -0,0 +1,43 @@
+from django.db.models import Q
+from django.utils import timezone
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def minute_of_week(dt=None):
+    """Minute of the week in local time, counting from Monday 00:00."""
+    dt = timezone.localtime(dt)
+    return dt.weekday() * MINUTES_PER_DAY + dt.hour * 60 + dt.minute
+
+
+def weekly_windows(opening_time, closing_time):
+    """Expand daily opening hours into half-open minute-of-week ranges.
+
+    A closing time at or before the opening time means the restaurant
+    closes after midnight; the window that spills past Sunday night is
+    split so every range stays within the week.
+    """
+    start, end = _minutes(opening_time), _minutes(closing_time)
+    if start == end:
+        return [(0, MINUTES_PER_WEEK)]
+    if end < start:
+        end += MINUTES_PER_DAY
+    windows = []
+    for day in range(7):
+        lo, hi = day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end
+        if hi > MINUTES_PER_WEEK:
+            windows.append((lo, MINUTES_PER_WEEK))
+            windows.append((0, hi - MINUTES_PER_WEEK))
+        else:
+            windows.append((lo, hi))
+    return windows
+
+
+def open_now_q(prefix='', at=None):
+    """Filter restaurants (or rows related through ``prefix``) open at ``at``."""
+    return Q(**{f'{prefix}opening_windows__minutes__contains': minute_of_week(at)})
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from restaurants.models import Restaurant
+from menu.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Backfill the stored full-text search vectors for restaurants and menu items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only fill rows that have no search vector yet')
+
+    def handle(self, *args, **options):
+        for model in (Restaurant, MenuItem):
+            qs = model.objects.all()
+            if options['missing']:
+                qs = qs.filter(search_vector__isnull=True)
+            updated = qs.update(search_vector=model.search_vector_expression())
+            self.stdout.write(self.style.SUCCESS(f'Updated {updated} {model._meta.verbose_name_plural}.'))
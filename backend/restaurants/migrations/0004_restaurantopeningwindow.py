@@ -0,0 +1,41 @@
+# Generated by Django 5.1 on 2026-10-17 22:16
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+from restaurants.hours import weekly_windows
+
+
+def build_opening_windows(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    RestaurantOpeningWindow = apps.get_model('restaurants', 'RestaurantOpeningWindow')
+    RestaurantOpeningWindow.objects.bulk_create([
+        RestaurantOpeningWindow(restaurant_id=r.id, minutes=window)
+        for r in Restaurant.objects.only('id', 'opening_time', 'closing_time')
+        for window in weekly_windows(r.opening_time, r.closing_time)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0003_restaurant_geohash_restaurant_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantOpeningWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minutes', django.contrib.postgres.fields.ranges.IntegerRangeField(help_text='Open minutes of the week in local time, Monday 00:00 = 0')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_windows', to='restaurants.restaurant')),
+            ],
+            options={
+                'ordering': ['restaurant', 'minutes'],
+                'indexes': [django.contrib.postgres.indexes.GistIndex(fields=['minutes'], name='restaurants_minutes_5ce5fe_gist')],
+            },
+        ),
+        migrations.RunPython(build_opening_windows, migrations.RunPython.noop),
+    ]
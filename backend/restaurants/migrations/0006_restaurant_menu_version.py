@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_restaurant_restaurants_average_cfc555_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='menu_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,5 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.fields import IntegerRangeField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from .geo import encode
+from .hours import weekly_windows
 
 
 class RestaurantCategory(models.Model):
@@ -23,6 +28,9 @@ class Restaurant(models.Model):
     description = models.TextField(blank=True)
     address = models.TextField()
     city = models.CharField(max_length=100)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
     phone = models.CharField(max_length=20)
     email = models.EmailField(blank=True)
     image = models.ImageField(upload_to='restaurants/', blank=True, null=True)
@@ -34,10 +42,15 @@ class Restaurant(models.Model):
     is_approved = models.BooleanField(default=False)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
     total_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveBigIntegerField(default=0, editable=False)
     minimum_order = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     estimated_delivery_time = models.PositiveIntegerField(help_text='Estimated delivery time in minutes', default=30)
+    menu_version = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    SEARCH_FIELDS = ('name', 'cuisine_type', 'description')
 
     class Meta:
         ordering = ['-created_at']
@@ -46,7 +59,55 @@ class Restaurant(models.Model):
             models.Index(fields=['is_active', 'is_approved']),
             models.Index(fields=['slug']),
             models.Index(fields=['cuisine_type']),
+            models.Index(fields=['average_rating', 'id']),
+            GinIndex(fields=['search_vector']),
+            models.Index(fields=['geohash'], name='restaurant_geohash_idx', opclasses=['varchar_pattern_ops']),
         ]
 
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode(float(self.latitude), float(self.longitude))
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def search_vector_expression(cls):
+        return SearchVector(*cls.SEARCH_FIELDS)
+
+    @classmethod
+    def next_menu_version(cls, restaurant_id):
+        # The UPDATE row lock is held until commit, so menu writes to one
+        # restaurant commit in version order and delta syncs never skip one.
+        cls.objects.filter(pk=restaurant_id).update(menu_version=models.F('menu_version') + 1)
+        return cls.objects.filter(pk=restaurant_id).values_list('menu_version', flat=True).first()
+
     def __str__(self):
         return self.name
+
+
+class RestaurantOpeningWindow(models.Model):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='opening_windows')
+    minutes = IntegerRangeField(help_text='Open minutes of the week in local time, Monday 00:00 = 0')
+
+    class Meta:
+        ordering = ['restaurant', 'minutes']
+        indexes = [
+            GistIndex(fields=['minutes']),
+        ]
+
+    @classmethod
+    def rebuild_for(cls, restaurant):
+        opening = Restaurant._meta.get_field('opening_time').to_python(restaurant.opening_time)
+        closing = Restaurant._meta.get_field('closing_time').to_python(restaurant.closing_time)
+        cls.objects.filter(restaurant=restaurant).delete()
+        cls.objects.bulk_create([
+            cls(restaurant=restaurant, minutes=(start, end))
+            for start, end in weekly_windows(opening, closing)
+        ])
+
+    def __str__(self):
+        return f"{self.restaurant.name}: {self.minutes}"
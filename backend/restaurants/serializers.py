@@ -11,6 +11,7 @@ class RestaurantCategorySerializer(serializers.ModelSerializer):
 
 class RestaurantListSerializer(serializers.ModelSerializer):
     formatted_delivery_fee = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
 
     class Meta:
         model = Restaurant
@@ -19,11 +20,16 @@ class RestaurantListSerializer(serializers.ModelSerializer):
             'average_rating', 'total_reviews', 'delivery_fee',
             'formatted_delivery_fee', 'estimated_delivery_time',
             'minimum_order', 'is_active', 'is_approved', 'city',
+            'latitude', 'longitude', 'distance_km',
         ]
 
     def get_formatted_delivery_fee(self, obj):
         return f"Rs. {obj.delivery_fee:,.0f}"
 
+    def get_distance_km(self, obj):
+        distance = getattr(obj, 'distance', None)
+        return round(distance, 2) if distance is not None else None
+
 
 class RestaurantDetailSerializer(serializers.ModelSerializer):
     owner_name = serializers.SerializerMethodField()
@@ -35,11 +41,11 @@ class RestaurantDetailSerializer(serializers.ModelSerializer):
         model = Restaurant
         fields = [
             'id', 'owner', 'owner_name', 'name', 'slug', 'description',
-            'address', 'city', 'phone', 'email', 'image', 'logo',
+            'address', 'city', 'latitude', 'longitude', 'phone', 'email', 'image', 'logo',
             'cuisine_type', 'opening_time', 'closing_time', 'is_active',
             'is_approved', 'average_rating', 'total_reviews', 'minimum_order',
             'formatted_minimum_order', 'delivery_fee', 'formatted_delivery_fee',
-            'estimated_delivery_time', 'created_at', 'menu_categories',
+            'estimated_delivery_time', 'created_at', 'menu_version', 'menu_categories',
         ]
 
     def get_owner_name(self, obj):
@@ -53,7 +59,8 @@ class RestaurantDetailSerializer(serializers.ModelSerializer):
 
     def get_menu_categories(self, obj):
         from menu.serializers import MenuCategoryWithItemsSerializer
-        categories = obj.menu_categories.filter(is_active=True).order_by('sort_order', 'name')
+        # Filter in Python so a prefetched ``menu_categories__items`` is reused.
+        categories = [c for c in obj.menu_categories.all() if c.is_active]
         return MenuCategoryWithItemsSerializer(categories, many=True).data
 
 
@@ -61,11 +68,20 @@ class RestaurantCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Restaurant
         fields = [
-            'name', 'description', 'address', 'city', 'phone', 'email',
+            'name', 'description', 'address', 'city', 'latitude', 'longitude', 'phone', 'email',
             'image', 'logo', 'cuisine_type', 'opening_time', 'closing_time',
             'minimum_order', 'delivery_fee', 'estimated_delivery_time',
         ]
 
+    def validate(self, attrs):
+        lat = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        lng = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (lat is None) != (lng is None):
+            raise serializers.ValidationError('Latitude and longitude must be set together.')
+        if lat is not None and not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise serializers.ValidationError('Coordinates are out of range.')
+        return attrs
+
     def create(self, validated_data):
         validated_data['owner'] = self.context['request'].user
         validated_data['slug'] = self._unique_slug(validated_data['name'])
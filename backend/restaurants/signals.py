@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from menu.models import MenuCategory, MenuItem
+from .cache import bump_catalog_version, bump_version
+from .models import Restaurant, RestaurantCategory, RestaurantOpeningWindow
+from .suggest import suggest_index
+
+
+@receiver(pre_save, sender=Restaurant)
+def remember_previous_slug(sender, instance, update_fields=None, **kwargs):
+    instance._previous_slug = None
+    if instance.pk and (update_fields is None or 'slug' in update_fields):
+        instance._previous_slug = (
+            Restaurant.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Restaurant)
+def update_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & set(Restaurant.SEARCH_FIELDS):
+        Restaurant.objects.filter(pk=instance.pk).update(
+            search_vector=Restaurant.search_vector_expression(),
+        )
+
+
+@receiver(post_save, sender=Restaurant)
+def update_opening_windows(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or {'opening_time', 'closing_time'} & set(update_fields):
+        RestaurantOpeningWindow.rebuild_for(instance)
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_restaurant(sender, instance, **kwargs):
+    # Versions are bumped once the write is visible; bumping earlier would
+    # let a concurrent reader cache the old rows under the new version.
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)} - {None}
+
+    def bump():
+        for slug in slugs:
+            bump_version(slug)
+        bump_catalog_version('restaurants')
+
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=MenuCategory)
+@receiver(post_delete, sender=MenuCategory)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_menu(sender, instance, **kwargs):
+    slug = Restaurant.objects.filter(pk=instance.restaurant_id).values_list('slug', flat=True).first()
+    if slug:
+        transaction.on_commit(lambda: bump_version(slug))
+
+
+@receiver(post_save, sender=RestaurantCategory)
+@receiver(post_delete, sender=RestaurantCategory)
+def invalidate_categories(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_catalog_version('categories'))
+
+
+@receiver(post_save, sender=Restaurant)
+def refresh_restaurant_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest_index.refresh_restaurant(instance))
+
+
+@receiver(post_delete, sender=Restaurant)
+def discard_restaurant_suggestions(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest_index.discard_restaurant(pk))
+
+
+@receiver(post_save, sender=MenuItem)
+def refresh_menu_item_suggestions(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest_index.refresh_menu_item(instance))
+
+
+@receiver(post_delete, sender=MenuItem)
+def discard_menu_item_suggestions(sender, instance, **kwargs):
+    pk, restaurant_id = instance.pk, instance.restaurant_id
+    transaction.on_commit(lambda: suggest_index.discard_menu_item(pk, restaurant_id))
@@ -0,0 +1,349 @@
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+MIN_QUERY_LENGTH = 2
+FUZZY_THRESHOLD = 0.35
+KIND_ORDER = {'restaurant': 0, 'cuisine': 1, 'menu_item': 2}
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return text.lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class IndexData:
+    """The entries and token indexes behind one version of ``SuggestIndex``.
+
+    Entries are keyed by ``(kind, id)``. Every distinct token is indexed by
+    each of its prefixes for exact type-ahead, and by its trigrams so that a
+    misspelt token can still be matched against the vocabulary.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self._rank = {}
+        self._entry_tokens = {}
+        self._postings = defaultdict(set)
+        self._prefixes = defaultdict(set)
+        self._trigrams = defaultdict(set)
+        self._cuisines = defaultdict(set)
+        self._restaurant_items = defaultdict(set)
+
+    # ── Entries ───────────────────────────────────────────
+
+    def _add_entry(self, key, label, payload):
+        self._remove_entry(key)
+        tokens = set(tokenize(label))
+        if not tokens:
+            return
+        self.entries[key] = {'label': label, **payload}
+        self._rank[key] = (KIND_ORDER[key[0]], len(label), label)
+        self._entry_tokens[key] = tokens
+        for token in tokens:
+            if token not in self._postings:
+                for i in range(1, len(token) + 1):
+                    self._prefixes[token[:i]].add(token)
+                for gram in trigrams(token):
+                    self._trigrams[gram].add(token)
+            self._postings[token].add(key)
+
+    def _remove_entry(self, key):
+        tokens = self._entry_tokens.pop(key, None)
+        self.entries.pop(key, None)
+        self._rank.pop(key, None)
+        for token in tokens or ():
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(key)
+            if posting:
+                continue
+            del self._postings[token]
+            for i in range(1, len(token) + 1):
+                self._discard(self._prefixes, token[:i], token)
+            for gram in trigrams(token):
+                self._discard(self._trigrams, gram, token)
+
+    @staticmethod
+    def _discard(index, key, value):
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+    def add_restaurant(self, r):
+        self._add_entry(('restaurant', r['id']), r['name'], {'type': 'restaurant', 'slug': r['slug']})
+        cuisine = r['cuisine_type'].strip()
+        if cuisine:
+            key = ('cuisine', normalize(cuisine))
+            if not self._cuisines[key]:
+                self._add_entry(key, cuisine, {'type': 'cuisine'})
+            self._cuisines[key].add(r['id'])
+
+    def remove_restaurant(self, restaurant_id):
+        self._remove_entry(('restaurant', restaurant_id))
+        for key, ids in list(self._cuisines.items()):
+            if restaurant_id in ids:
+                ids.discard(restaurant_id)
+                if not ids:
+                    del self._cuisines[key]
+                    self._remove_entry(key)
+        for item_id in self._restaurant_items.pop(restaurant_id, ()):
+            self._remove_entry(('menu_item', item_id))
+
+    def add_menu_item(self, item):
+        self._add_entry(('menu_item', item['id']), item['name'], {
+            'type': 'menu_item',
+            'slug': item['slug'],
+            'restaurant_name': item['restaurant__name'],
+            'restaurant_slug': item['restaurant__slug'],
+        })
+        self._restaurant_items[item['restaurant_id']].add(item['id'])
+
+    def remove_menu_item(self, item_id, restaurant_id):
+        self._remove_entry(('menu_item', item_id))
+        self._restaurant_items.get(restaurant_id, set()).discard(item_id)
+
+    # ── Lookup ────────────────────────────────────────────
+
+    def _match_token(self, token):
+        """Return ``{vocabulary_token: score}`` for one query token."""
+        matches = {t: 1.0 for t in self._prefixes.get(token, ())}
+        if matches:
+            return matches
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigrams.get(gram, ()))
+        # A same-length word needs at least this many trigrams in common to
+        # reach the threshold; the -1 allows for the end-of-word trigram that
+        # a half-typed word never shares.
+        needed = math.ceil(2 * FUZZY_THRESHOLD * len(grams) / (1 + FUZZY_THRESHOLD)) - 1
+        for candidate, count in shared.items():
+            if count < needed:
+                continue
+            # Compare against the candidate's same-length prefix as well so a
+            # typo in a half-typed word still finds the full word.
+            score = max(
+                similarity(grams, trigrams(candidate)),
+                similarity(grams, trigrams(candidate[:len(token)])),
+            )
+            if score >= FUZZY_THRESHOLD:
+                matches[candidate] = score
+        return matches
+
+    def search(self, tokens, limit):
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for vocab, score in self._match_token(token).items():
+                posting = self._postings.get(vocab, ())
+                if score == 1.0:
+                    token_scores.update(dict.fromkeys(posting, score))
+                    continue
+                for key in posting:
+                    if score > token_scores.get(key, 0):
+                        token_scores[key] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {k: s + token_scores[k] for k, s in scores.items() if k in token_scores}
+            if not scores:
+                return []
+        ranked = heapq.nsmallest(limit, scores, key=lambda k: (-scores[k], self._rank[k]))
+        return [dict(self.entries[key]) for key in ranked]
+
+
+class SuggestIndex:
+    """Per-process autocomplete index over restaurants, cuisines and menu items.
+
+    A rebuild fills a fresh ``IndexData`` without holding the lock and then
+    swaps it in, so lookups only ever wait for a swap or an incremental
+    update. Updates that arrive while a rebuild runs are applied to the
+    current data and replayed onto the new data before the swap, so the
+    rebuild's older snapshot can't undo them.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.RLock()
+        self._rebuilding = False
+        self._pending = None
+        self._data = IndexData()
+        self.built_at = None
+
+    # ── Building ──────────────────────────────────────────
+
+    def build(self):
+        from menu.models import MenuItem
+        from .models import Restaurant
+
+        with self._build_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                restaurants = list(
+                    Restaurant.objects.filter(is_active=True, is_approved=True)
+                    .values('id', 'name', 'slug', 'cuisine_type')
+                )
+                items = list(
+                    MenuItem.objects.filter(
+                        is_available=True,
+                        restaurant__is_active=True,
+                        restaurant__is_approved=True,
+                    ).values('id', 'name', 'slug', 'restaurant_id', 'restaurant__name', 'restaurant__slug')
+                )
+                data = IndexData()
+                for r in restaurants:
+                    data.add_restaurant(r)
+                for item in items:
+                    data.add_menu_item(item)
+                self._install(data)
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def _install(self, data):
+        with self._lock:
+            for update in self._pending:
+                update(data)
+            self._data = data
+            self.built_at = time.monotonic()
+
+    def warm(self):
+        try:
+            self.build()
+        except DatabaseError:
+            logger.warning('Could not build the search suggestion index; it will be built on first use.')
+
+    def ensure_built(self):
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None:
+                    self.build()
+            return
+        # Writes made through other worker processes only reach this index
+        # through a periodic rebuild, which runs in the background so that
+        # lookups keep answering from the current index in the meantime.
+        if time.monotonic() - self.built_at > settings.SUGGEST_INDEX_MAX_AGE:
+            self._rebuild_in_background()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.warm()
+            finally:
+                self._rebuilding = False
+                connections.close_all()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # ── Incremental updates ───────────────────────────────
+
+    def _tracking(self):
+        """Whether updates matter: the index is built or being built."""
+        return self.built_at is not None or self._pending is not None
+
+    def _apply(self, update):
+        with self._lock:
+            update(self._data)
+            if self._pending is not None:
+                self._pending.append(update)
+
+    def refresh_restaurant(self, restaurant):
+        if not self._tracking():
+            return
+        from menu.models import MenuItem
+
+        items = []
+        visible = restaurant.is_active and restaurant.is_approved
+        if visible:
+            items = list(
+                MenuItem.objects.filter(restaurant=restaurant, is_available=True)
+                .values('id', 'name', 'slug', 'restaurant_id', 'restaurant__name', 'restaurant__slug')
+            )
+        row = {
+            'id': restaurant.pk, 'name': restaurant.name,
+            'slug': restaurant.slug, 'cuisine_type': restaurant.cuisine_type,
+        }
+
+        def update(data):
+            data.remove_restaurant(restaurant.pk)
+            if visible:
+                data.add_restaurant(row)
+                for item in items:
+                    data.add_menu_item(item)
+
+        self._apply(update)
+
+    def discard_restaurant(self, restaurant_id):
+        if self._tracking():
+            self._apply(lambda data: data.remove_restaurant(restaurant_id))
+
+    def refresh_menu_item(self, item):
+        if not self._tracking():
+            return
+
+        def update(data):
+            restaurant = data.entries.get(('restaurant', item.restaurant_id))
+            if restaurant is None or not item.is_available:
+                data.remove_menu_item(item.pk, item.restaurant_id)
+                return
+            data.add_menu_item({
+                'id': item.pk, 'name': item.name, 'slug': item.slug,
+                'restaurant_id': item.restaurant_id,
+                'restaurant__name': restaurant['label'],
+                'restaurant__slug': restaurant['slug'],
+            })
+
+        self._apply(update)
+
+    def discard_menu_item(self, item_id, restaurant_id):
+        if self._tracking():
+            self._apply(lambda data: data.remove_menu_item(item_id, restaurant_id))
+
+    # ── Lookup ────────────────────────────────────────────
+
+    def search(self, query, limit=8):
+        tokens = tokenize(query)
+        if not tokens or len(''.join(tokens)) < MIN_QUERY_LENGTH:
+            return []
+        self.ensure_built()
+        with self._lock:
+            return self._data.search(tokens, limit)
+
+
+suggest_index = SuggestIndex()
@@ -1,12 +1,22 @@
+from datetime import datetime
 from decimal import Decimal
+from unittest import mock
+from zoneinfo import ZoneInfo
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from accounts.models import CustomUser
-from .models import Restaurant
+from menu.models import MenuCategory, MenuItem
+from .models import Restaurant, RestaurantCategory
+from .suggest import SuggestIndex, suggest_index
 
 
 class RestaurantTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.customer = CustomUser.objects.create_user(
             username='cust', email='cust@test.com', password='test1234',
             first_name='Cust', last_name='User', user_type='customer',
@@ -67,3 +77,254 @@ class RestaurantTests(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         for r in resp.data['results']:
             self.assertEqual(r['city'], 'Karachi')
+
+    def test_restaurant_detail_served_from_cache(self):
+        self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        with self.assertNumQueries(0):
+            resp = self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['name'], 'Test Restaurant')
+
+    def test_cached_detail_has_no_request_host(self):
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(image='restaurants/test.jpg')
+        self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        resp = self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self.assertEqual(resp.data['image'], '/media/restaurants/test.jpg')
+
+    def test_menu_change_invalidates_detail_cache(self):
+        self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            cat = MenuCategory.objects.create(restaurant=self.restaurant, name='Main')
+            item = MenuItem.objects.create(
+                category=cat, restaurant=self.restaurant, name='Biryani',
+                slug='biryani', price=Decimal('450'),
+            )
+        resp = self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self.assertEqual(resp.data['menu_categories'][0]['items'][0]['name'], 'Biryani')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.price = Decimal('500')
+            item.save()
+        resp = self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self.assertEqual(resp.data['menu_categories'][0]['items'][0]['price'], '500.00')
+
+    def test_unapproved_restaurant_detail_not_cached(self):
+        self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.is_approved = False
+            self.restaurant.save()
+        resp = self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_cache_stats(self):
+        admin = CustomUser.objects.create_user(
+            username='admin', email='admin@test.com', password='test1234',
+            user_type='admin',
+        )
+        self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self._auth(admin)
+        resp = self.client.get('/api/admin/cache-stats/')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        stats = resp.data['restaurant_detail']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_search_uses_stored_vectors(self):
+        cat = MenuCategory.objects.create(restaurant=self.restaurant, name='Main')
+        MenuItem.objects.create(
+            category=cat, restaurant=self.restaurant, name='Chicken Karahi',
+            slug='chicken-karahi', price=Decimal('900'),
+        )
+        resp = self.client.get('/api/restaurants/search/?q=karahi')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['name'] for m in resp.data['menu_items']], ['Chicken Karahi'])
+
+        self.restaurant.name = 'Karachi Grill'
+        self.restaurant.save()
+        resp = self.client.get('/api/restaurants/search/?q=grill')
+        self.assertEqual([r['name'] for r in resp.data['restaurants']], ['Karachi Grill'])
+
+    def test_search_suggest_prefix_and_typo(self):
+        cat = MenuCategory.objects.create(restaurant=self.restaurant, name='Rice')
+        MenuItem.objects.create(
+            category=cat, restaurant=self.restaurant, name='Chicken Biryani',
+            slug='chicken-biryani', price=Decimal('650'),
+        )
+        suggest_index.build()
+        with self.assertNumQueries(0):
+            resp = self.client.get('/api/restaurants/search/suggest/?q=bir')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['suggestions'][0]['label'], 'Chicken Biryani')
+        self.assertEqual(resp.data['suggestions'][0]['restaurant_slug'], 'test-restaurant')
+
+        resp = self.client.get('/api/restaurants/search/suggest/?q=chiken biryni')
+        self.assertEqual([s['label'] for s in resp.data['suggestions']], ['Chicken Biryani'])
+
+        resp = self.client.get('/api/restaurants/search/suggest/?q=pak')
+        self.assertEqual(resp.data['suggestions'][0], {'label': 'Pakistani', 'type': 'cuisine'})
+
+    def test_search_suggest_refreshes_on_write(self):
+        suggest_index.build()
+        cat = MenuCategory.objects.create(restaurant=self.restaurant, name='Grill')
+        with self.captureOnCommitCallbacks(execute=True):
+            item = MenuItem.objects.create(
+                category=cat, restaurant=self.restaurant, name='Seekh Kabab',
+                slug='seekh-kabab', price=Decimal('500'),
+            )
+        resp = self.client.get('/api/restaurants/search/suggest/?q=seekh')
+        self.assertEqual(len(resp.data['suggestions']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.is_available = False
+            item.save()
+        resp = self.client.get('/api/restaurants/search/suggest/?q=seekh')
+        self.assertEqual(resp.data['suggestions'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.is_approved = False
+            self.restaurant.save()
+        resp = self.client.get('/api/restaurants/search/suggest/?q=test')
+        self.assertEqual(resp.data['suggestions'], [])
+
+    def test_search_suggest_keeps_updates_made_during_rebuild(self):
+        install = SuggestIndex._install
+
+        def delist_then_install(index, data):
+            # Lands after the rebuild read the database, before the swap.
+            index.discard_restaurant(self.restaurant.pk)
+            install(index, data)
+
+        with mock.patch.object(SuggestIndex, '_install', delist_then_install):
+            suggest_index.build()
+        resp = self.client.get('/api/restaurants/search/suggest/?q=test')
+        self.assertEqual(resp.data['suggestions'], [])
+
+    def test_restaurant_list_near_orders_by_distance(self):
+        # Saddar, Clifton and Lahore, from a point in Saddar.
+        self.restaurant.latitude, self.restaurant.longitude = Decimal('24.860700'), Decimal('67.001100')
+        self.restaurant.save()
+        for slug, lat, lng in [('clifton', '24.813800', '67.029900'), ('lahore', '31.520400', '74.358700')]:
+            Restaurant.objects.create(
+                owner=self.owner, name=slug.title(), slug=slug, address='1 St',
+                city='Karachi', phone='021', cuisine_type='BBQ', is_approved=True,
+                opening_time='10:00:00', closing_time='23:00:00',
+                latitude=Decimal(lat), longitude=Decimal(lng),
+            )
+        resp = self.client.get('/api/restaurants/?near=24.8615,67.0099&radius=10')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['slug'] for r in resp.data['results']], ['test-restaurant', 'clifton'])
+        self.assertLess(resp.data['results'][0]['distance_km'], resp.data['results'][1]['distance_km'])
+
+        resp = self.client.get('/api/restaurants/?near=24.8615,67.0099&radius=10&ordering=-distance')
+        self.assertEqual([r['slug'] for r in resp.data['results']], ['clifton', 'test-restaurant'])
+
+    def test_restaurant_list_near_invalid(self):
+        resp = self.client.get('/api/restaurants/?near=abc')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get('/api/restaurants/?near=24.86,67.0&radius=500')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_restaurant_list_open_now(self):
+        Restaurant.objects.create(
+            owner=self.owner, name='Late Night', slug='late-night', address='1 St',
+            city='Karachi', phone='021', cuisine_type='BBQ', is_approved=True,
+            opening_time='18:00:00', closing_time='02:00:00',
+        )
+        karachi = ZoneInfo('Asia/Karachi')
+        cases = [
+            (datetime(2026, 10, 13, 12, 0, tzinfo=karachi), ['test-restaurant']),  # Tuesday noon
+            (datetime(2026, 10, 14, 1, 0, tzinfo=karachi), ['late-night']),  # Wednesday 1am
+            (datetime(2026, 10, 19, 0, 30, tzinfo=karachi), ['late-night']),  # Sunday night spill-over
+            (datetime(2026, 10, 15, 3, 0, tzinfo=karachi), []),
+        ]
+        for now, expected in cases:
+            with mock.patch('django.utils.timezone.now', return_value=now):
+                resp = self.client.get('/api/restaurants/?open_now=true')
+            self.assertEqual([r['slug'] for r in resp.data['results']], expected, now)
+
+    def test_restaurant_list_cursor_pagination(self):
+        Restaurant.objects.bulk_create([
+            Restaurant(
+                owner=self.owner, name=f'R{i}', slug=f'r{i}', address='1 St', city='Karachi',
+                phone='021', is_approved=True, average_rating=Decimal(i % 3),
+                opening_time='10:00:00', closing_time='23:00:00',
+            )
+            for i in range(25)
+        ])
+        expected = list(
+            Restaurant.objects.filter(is_approved=True).order_by('-average_rating', '-id')
+            .values_list('slug', flat=True)
+        )
+        seen = []
+        url = '/api/restaurants/?pagination=cursor'
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, status.HTTP_200_OK)
+                self.assertNotIn('count', resp.data)
+                seen += [r['slug'] for r in resp.data['results']]
+                url = resp.data['next']
+        self.assertEqual(seen, expected)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_restaurant_list_invalid_cursor(self):
+        resp = self.client.get('/api/restaurants/?cursor=not-a-cursor')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_restaurant_detail_conditional_get(self):
+        url = f'/api/restaurants/{self.restaurant.slug}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.delivery_fee = Decimal('150')
+            self.restaurant.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_restaurant_list_conditional_get(self):
+        etag = self.client.get('/api/restaurants/?city=Karachi')['ETag']
+        resp = self.client.get('/api/restaurants/?city=Karachi', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        resp = self.client.get('/api/restaurants/?city=Lahore', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_no_etag_without_shared_cache(self):
+        resp = self.client.get(f'/api/restaurants/{self.restaurant.slug}/')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', resp)
+
+    def test_restaurant_facets(self):
+        RestaurantCategory.objects.create(name='Fast Food', slug='fast-food')
+        RestaurantCategory.objects.create(name='Pakistani', slug='pakistani')
+        for slug, city, cuisine in [('a', 'Lahore', 'Fast Food'), ('b', 'Karachi', 'Fast Food'), ('c', 'Lahore', '')]:
+            Restaurant.objects.create(
+                owner=self.owner, name=slug, slug=slug, address='1 St', city=city, phone='021',
+                cuisine_type=cuisine, is_approved=True,
+                opening_time='10:00:00', closing_time='23:00:00',
+            )
+        with self.assertNumQueries(2):
+            resp = self.client.get('/api/restaurants/facets/')
+        self.assertEqual(resp.data['city'], [{'value': 'Karachi', 'count': 2}, {'value': 'Lahore', 'count': 2}])
+        self.assertEqual(resp.data['cuisine_type'], [
+            {'value': 'Fast Food', 'count': 2}, {'value': 'Pakistani', 'count': 1},
+        ])
+        self.assertEqual(resp.data['category'], [
+            {'name': 'Fast Food', 'slug': 'fast-food', 'count': 2},
+            {'name': 'Pakistani', 'slug': 'pakistani', 'count': 1},
+        ])
+        with self.assertNumQueries(0):
+            self.client.get('/api/restaurants/facets/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Restaurant.objects.filter(slug='a').first().delete()
+        resp = self.client.get('/api/restaurants/facets/')
+        self.assertEqual(resp.data['city'], [{'value': 'Karachi', 'count': 2}, {'value': 'Lahore', 'count': 1}])
@@ -1,12 +1,21 @@
 from rest_framework import generics, status, filters
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.throttling import ScopedRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Sum, Q
-from django.contrib.postgres.search import SearchVector, SearchRank, SearchQuery
+from django.db.models import Count, Sum, Q, F
+from django.http import Http404
+from django.contrib.postgres.search import SearchRank, SearchQuery
 from accounts.permissions import IsRestaurantOwner
+from core.conditional import ConditionalGetMixin
 from .models import Restaurant, RestaurantCategory
+from .cache import get_catalog_version, get_detail, get_version
+from .suggest import suggest_index
+from .geo import covering_cells, distance_expression, parse_point
+from .hours import minute_of_week, open_now_q
+from .facets import facets_version, get_facets
 from .serializers import (
     RestaurantCategorySerializer,
     RestaurantListSerializer,
@@ -16,35 +25,94 @@ from .serializers import (
 from menu.models import MenuItem
 
 
-class RestaurantCategoryListView(generics.ListAPIView):
+class RestaurantCategoryListView(ConditionalGetMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = RestaurantCategorySerializer
     queryset = RestaurantCategory.objects.filter(is_active=True)
     pagination_class = None
 
+    def get_etag_version(self):
+        return get_catalog_version('categories')
 
-class RestaurantListView(generics.ListAPIView):
+
+class RestaurantListView(ConditionalGetMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = RestaurantListSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['city', 'cuisine_type']
     search_fields = ['name', 'description', 'cuisine_type']
-    ordering_fields = ['average_rating', 'delivery_fee', 'estimated_delivery_time', 'created_at']
-    ordering = ['-average_rating']
+    DEFAULT_RADIUS_KM = 5
+    MAX_RADIUS_KM = 50
+
+    def get_etag_version(self):
+        version = get_catalog_version('restaurants')
+        if 'open_now' in self.request.query_params:
+            return f'{version}:{minute_of_week()}'
+        return version
+
+    @property
+    def ordering_fields(self):
+        fields = ['average_rating', 'delivery_fee', 'estimated_delivery_time', 'created_at']
+        return fields + ['distance'] if self.get_near() else fields
+
+    @property
+    def ordering(self):
+        return ['distance'] if self.get_near() else ['-average_rating']
+
+    def get_near(self):
+        if not hasattr(self, '_near'):
+            self._near = None
+            near = self.request.query_params.get('near')
+            if near:
+                try:
+                    lat, lng = parse_point(near)
+                    radius = float(self.request.query_params.get('radius', self.DEFAULT_RADIUS_KM))
+                except ValueError:
+                    raise ValidationError({'near': 'Expected near=<lat>,<lng> and a numeric radius in km.'})
+                if not 0 < radius <= self.MAX_RADIUS_KM:
+                    raise ValidationError({'radius': f'Radius must be between 0 and {self.MAX_RADIUS_KM} km.'})
+                self._near = (lat, lng, radius)
+        return self._near
 
     def get_queryset(self):
         qs = Restaurant.objects.filter(is_active=True, is_approved=True).select_related('owner')
         category = self.request.query_params.get('category')
         if category:
             qs = qs.filter(cuisine_type__icontains=category)
+        if self.request.query_params.get('open_now', '').lower() in ('true', '1'):
+            qs = qs.filter(open_now_q())
+        near = self.get_near()
+        if near:
+            lat, lng, radius = near
+            # Narrow to the geohash cells around the point first, so the
+            # distance is only computed for nearby rows.
+            cells = Q()
+            for cell in covering_cells(lat, lng, radius):
+                cells |= Q(geohash__startswith=cell)
+            qs = qs.filter(cells).annotate(
+                distance=distance_expression(lat, lng),
+            ).filter(distance__lte=radius)
         return qs
 
 
-class RestaurantDetailView(generics.RetrieveAPIView):
+class RestaurantFacetsView(ConditionalGetMixin, APIView):
+    permission_classes = [AllowAny]
+
+    def get_etag_version(self):
+        return facets_version()
+
+    def get(self, request):
+        return Response(get_facets())
+
+
+class RestaurantDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     permission_classes = [AllowAny]
     serializer_class = RestaurantDetailSerializer
     lookup_field = 'slug'
 
+    def get_etag_version(self):
+        return get_version(self.kwargs['slug'])
+
     def get_queryset(self):
         return Restaurant.objects.filter(
             is_active=True, is_approved=True
@@ -52,6 +120,20 @@ class RestaurantDetailView(generics.RetrieveAPIView):
             'menu_categories__items'
         )
 
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            instance = self.get_queryset().filter(slug=kwargs['slug']).first()
+            if instance is None:
+                return None
+            # Shared by every caller, so no request: media URLs must not
+            # carry the host of whoever happened to miss the cache.
+            return self.get_serializer_class()(instance, context={'view': self}).data
+
+        data = get_detail(kwargs['slug'], build)
+        if data is None:
+            raise Http404
+        return Response(data)
+
 
 class RestaurantCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, IsRestaurantOwner]
@@ -139,31 +221,32 @@ class SearchView(APIView):
             return Response({'restaurants': [], 'menu_items': []})
 
         search_query = SearchQuery(q)
+        open_now = request.query_params.get('open_now', '').lower() in ('true', '1')
 
         # Search restaurants
+        restaurants = Restaurant.objects.filter(is_active=True, is_approved=True)
+        if open_now:
+            restaurants = restaurants.filter(open_now_q())
         restaurants = (
-            Restaurant.objects.filter(is_active=True, is_approved=True)
-            .annotate(
-                search=SearchVector('name', 'cuisine_type', 'description'),
-                rank=SearchRank(SearchVector('name', 'cuisine_type', 'description'), search_query),
-            )
-            .filter(search=search_query)
+            restaurants
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
             .order_by('-rank')[:10]
         )
         restaurant_data = RestaurantListSerializer(restaurants, many=True).data
 
         # Search menu items
+        menu_items = MenuItem.objects.filter(
+            is_available=True,
+            restaurant__is_active=True,
+            restaurant__is_approved=True,
+        )
+        if open_now:
+            menu_items = menu_items.filter(open_now_q('restaurant__'))
         menu_items = (
-            MenuItem.objects.filter(
-                is_available=True,
-                restaurant__is_active=True,
-                restaurant__is_approved=True,
-            )
-            .annotate(
-                search=SearchVector('name', 'description'),
-                rank=SearchRank(SearchVector('name', 'description'), search_query),
-            )
-            .filter(search=search_query)
+            menu_items
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
             .select_related('restaurant')
             .order_by('-rank')[:15]
         )
@@ -185,3 +268,17 @@ class SearchView(APIView):
         ]
 
         return Response({'restaurants': restaurant_data, 'menu_items': menu_data})
+
+
+class SearchSuggestView(APIView):
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'suggest'
+
+    def get(self, request):
+        q = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 8)), 20)
+        except ValueError:
+            limit = 8
+        return Response({'query': q, 'suggestions': suggest_index.search(q, limit=max(limit, 1))})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Review
+from .models import Review, ReviewSummary
 
 
 @admin.register(Review)
@@ -7,3 +7,9 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ['user', 'restaurant', 'rating', 'created_at']
     list_filter = ['rating']
     search_fields = ['user__username', 'restaurant__name']
+
+
+@admin.register(ReviewSummary)
+class ReviewSummaryAdmin(admin.ModelAdmin):
+    list_display = ['restaurant', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5', 'updated_at']
+    raw_id_fields = ['restaurant']
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from restaurants.models import Restaurant
+from reviews.services import RatingService, ReviewSummaryService
+
+
+class Command(BaseCommand):
+    help = "Recompute restaurants' rating totals, averages and review summaries from their reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Only these restaurants (default: all)')
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only build review summaries for restaurants that have none yet, leaving rating totals alone',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.all()
+        if options['slugs']:
+            restaurants = restaurants.filter(slug__in=options['slugs'])
+        if options['missing']:
+            restaurants = restaurants.filter(review_summary__isnull=True)
+            fixed = 0
+        else:
+            fixed = RatingService.recompute(restaurants)
+        rebuilt = 0
+        for pk in restaurants.values_list('pk', flat=True).iterator():
+            ReviewSummaryService.rebuild(pk)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Corrected {fixed} restaurants; rebuilt {rebuilt} review summaries.'))
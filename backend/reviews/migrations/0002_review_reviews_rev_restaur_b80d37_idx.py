@@ -0,0 +1,21 @@
+# Generated by Django 5.1 on 2026-10-17 22:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_orders_orde_created_0fb29d_idx'),
+        ('restaurants', '0005_restaurant_restaurants_average_cfc555_idx'),
+        ('reviews', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['restaurant', 'created_at', 'id'], name='reviews_rev_restaur_b80d37_idx'),
+        ),
+    ]
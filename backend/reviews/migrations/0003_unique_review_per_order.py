@@ -0,0 +1,52 @@
+# Generated by Django 5.1 on 2026-10-17 23:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+
+def drop_duplicate_reviews(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    # Keep the first review of each order.
+    for row in Review.objects.values('order').annotate(n=Count('id')).filter(n__gt=1):
+        keep = Review.objects.filter(order=row['order']).order_by('created_at', 'id').first()
+        Review.objects.filter(order=row['order']).exclude(pk=keep.pk).delete()
+
+
+def fill_rating_totals(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    Review = apps.get_model('reviews', 'Review')
+    totals = (
+        Review.objects.filter(restaurant=OuterRef('pk')).order_by()
+        .values('restaurant').annotate(rating_sum=Sum('rating'), count=Count('id'))
+    )
+    rating_sum = Coalesce(Subquery(totals.values('rating_sum')), 0)
+    count = Coalesce(Subquery(totals.values('count')), 0)
+    Restaurant.objects.update(
+        rating_sum=rating_sum,
+        total_reviews=count,
+        average_rating=Coalesce(
+            Round(Cast(rating_sum, DecimalField(max_digits=20, decimal_places=4)) / NullIf(count, 0), 2),
+            0, output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_unique_cart_rows'),
+        ('restaurants', '0007_restaurant_rating_sum'),
+        ('reviews', '0002_review_reviews_rev_restaur_b80d37_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_reviews, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('order',), name='unique_review_per_order'),
+        ),
+        migrations.RunPython(fill_rating_totals, migrations.RunPython.noop),
+    ]
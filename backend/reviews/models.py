@@ -15,7 +15,36 @@ class Review(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['restaurant', 'rating']),
+            models.Index(fields=['restaurant', 'created_at', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['order'], name='unique_review_per_order'),
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.restaurant.name} ({self.rating}/5)"
+
+
+class ReviewSummary(models.Model):
+    """Star counts and the newest reviews of a restaurant, kept up to date as reviews come and go."""
+
+    restaurant = models.OneToOneField(
+        'restaurants.Restaurant', on_delete=models.CASCADE, primary_key=True, related_name='review_summary',
+    )
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    recent = models.JSONField(default=list, blank=True, help_text='First page of reviews, newest first')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Review summaries'
+
+    @property
+    def histogram(self):
+        return {str(stars): getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+
+    def __str__(self):
+        return f"Review summary for restaurant #{self.restaurant_id}"
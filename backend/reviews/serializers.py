@@ -1,3 +1,4 @@
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 from .models import Review
 from orders.models import Order
@@ -19,17 +20,19 @@ class ReviewCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('This order is not from this restaurant.')
         if order.status != 'delivered':
             raise serializers.ValidationError('You can only review delivered orders.')
-        if Review.objects.filter(order=order).exists():
-            raise serializers.ValidationError('You have already reviewed this order.')
         return attrs
 
     def create(self, validated_data):
-        return Review.objects.create(
-            user=self.context['request'].user,
-            restaurant=self.context['restaurant'],
-            order=self.context['order'],
-            **validated_data,
-        )
+        try:
+            with transaction.atomic():
+                return Review.objects.create(
+                    user=self.context['request'].user,
+                    restaurant=self.context['restaurant'],
+                    order=self.context['order'],
+                    **validated_data,
+                )
+        except IntegrityError:
+            raise serializers.ValidationError('You have already reviewed this order.')
 
 
 class ReviewListSerializer(serializers.ModelSerializer):
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+from restaurants.cache import bump_catalog_version, bump_version
+from restaurants.models import Restaurant
+from .models import Review, ReviewSummary
+from .serializers import ReviewListSerializer
+
+# Size of the first page of reviews, which ReviewSummary.recent mirrors.
+RECENT_REVIEWS = 10
+
+
+def _average(rating_sum, count):
+    return Coalesce(
+        Round(Cast(rating_sum, DecimalField(max_digits=20, decimal_places=4)) / NullIf(count, 0), 2),
+        0, output_field=DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+class RatingService:
+    """Keeps ``Restaurant.rating_sum``/``total_reviews``/``average_rating`` in step with reviews.
+
+    Each review adjusts the running totals in one ``UPDATE`` with ``F()``
+    expressions, so concurrent reviews add up instead of overwriting each
+    other, and nothing rescans the restaurant's reviews.
+    """
+
+    @staticmethod
+    def _invalidate(restaurant_ids):
+        slugs = list(Restaurant.objects.filter(pk__in=restaurant_ids).values_list('slug', flat=True))
+
+        def bump():
+            for slug in slugs:
+                bump_version(slug)
+            bump_catalog_version('restaurants')
+
+        # update() skips the Restaurant signals that normally do this.
+        transaction.on_commit(bump)
+
+    @staticmethod
+    def apply(restaurant_id, rating, count=1):
+        """Add (``count=1``) or remove (``count=-1``) one review's ``rating``."""
+        rating_sum = F('rating_sum') + rating * count
+        total = F('total_reviews') + count
+        Restaurant.objects.filter(pk=restaurant_id).update(
+            rating_sum=rating_sum, total_reviews=total, average_rating=_average(rating_sum, total),
+        )
+        RatingService._invalidate([restaurant_id])
+
+    @staticmethod
+    @transaction.atomic
+    def recompute(restaurants=None):
+        """Rebuild the totals from the reviews table; returns how many restaurants were off."""
+        totals = (
+            Review.objects.filter(restaurant=OuterRef('pk')).order_by()
+            .values('restaurant').annotate(rating_sum=Sum('rating'), count=Count('id'))
+        )
+        rating_sum = Coalesce(Subquery(totals.values('rating_sum')), 0)
+        total = Coalesce(Subquery(totals.values('count')), 0)
+        qs = Restaurant.objects.all() if restaurants is None else restaurants
+        stale = list(
+            qs.annotate(actual_sum=rating_sum, actual_count=total, actual_average=_average(rating_sum, total))
+            .exclude(
+                rating_sum=F('actual_sum'), total_reviews=F('actual_count'), average_rating=F('actual_average'),
+            )
+            .values_list('pk', flat=True)
+        )
+        if stale:
+            Restaurant.objects.filter(pk__in=stale).update(
+                rating_sum=rating_sum, total_reviews=total, average_rating=_average(rating_sum, total),
+            )
+            RatingService._invalidate(stale)
+        return len(stale)
+
+
+class ReviewSummaryService:
+    """Maintains ``ReviewSummary`` so the summary endpoint never reads the reviews table.
+
+    Changes run after ``RatingService.apply`` in the same transaction, so
+    the restaurant's row lock already serializes them. Deploys backfill
+    missing rows with ``recompute_ratings --missing``; a restaurant that
+    still has none gets one built from its reviews the first time it is
+    needed.
+    """
+
+    @staticmethod
+    def _entry(review):
+        return dict(ReviewListSerializer(review).data)
+
+    @staticmethod
+    def _recent(restaurant_id):
+        reviews = (
+            Review.objects.filter(restaurant_id=restaurant_id)
+            .select_related('user', 'order').order_by('-created_at', '-id')[:RECENT_REVIEWS]
+        )
+        return [ReviewSummaryService._entry(review) for review in reviews]
+
+    @staticmethod
+    def rebuild(restaurant_id):
+        counts = dict(
+            Review.objects.filter(restaurant_id=restaurant_id).order_by()
+            .values_list('rating').annotate(n=Count('id'))
+        )
+        summary, _ = ReviewSummary.objects.update_or_create(restaurant_id=restaurant_id, defaults={
+            **{f'stars_{stars}': counts.get(stars, 0) for stars in range(1, 6)},
+            'recent': ReviewSummaryService._recent(restaurant_id),
+        })
+        return summary
+
+    @staticmethod
+    def get(restaurant):
+        try:
+            return restaurant.review_summary
+        except ReviewSummary.DoesNotExist:
+            with transaction.atomic():
+                Restaurant.objects.select_for_update().filter(pk=restaurant.pk).exists()
+                return ReviewSummaryService.rebuild(restaurant.pk)
+
+    @staticmethod
+    @transaction.atomic
+    def add(review):
+        summary = ReviewSummary.objects.select_for_update().filter(pk=review.restaurant_id).first()
+        if summary is None:
+            ReviewSummaryService.rebuild(review.restaurant_id)
+            return
+        field = f'stars_{review.rating}'
+        setattr(summary, field, F(field) + 1)
+        summary.recent = [ReviewSummaryService._entry(review), *summary.recent][:RECENT_REVIEWS]
+        summary.save(update_fields=[field, 'recent', 'updated_at'])
+
+    @staticmethod
+    @transaction.atomic
+    def remove(review):
+        summary = ReviewSummary.objects.select_for_update().filter(pk=review.restaurant_id).first()
+        if summary is None:
+            ReviewSummaryService.rebuild(review.restaurant_id)
+            return
+        field = f'stars_{review.rating}'
+        setattr(summary, field, F(field) - 1)
+        update_fields = [field, 'updated_at']
+        if any(entry['id'] == review.pk for entry in summary.recent):
+            # The page needs the next-newest review to stay full.
+            summary.recent = ReviewSummaryService._recent(review.restaurant_id)
+            update_fields.append('recent')
+        summary.save(update_fields=update_fields)
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from restaurants.models import Restaurant
+from .models import Review
+from .services import RatingService, ReviewSummaryService
+
+
+@receiver(post_save, sender=Review)
+def add_rating(sender, instance, created, **kwargs):
+    if created:
+        RatingService.apply(instance.restaurant_id, instance.rating)
+        ReviewSummaryService.add(instance)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Restaurant):
+        return
+    RatingService.apply(instance.restaurant_id, instance.rating, count=-1)
+    ReviewSummaryService.remove(instance)
@@ -1,42 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from rest_framework.test import APITestCase
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
-from accounts.models import CustomUser
 from restaurants.models import Restaurant
-from menu.models import MenuCategory, MenuItem
-from orders.models import Order, OrderItem
-from .models import Review
+from orders.models import OrderItem
+from restaurants.cache import get_version
+from .models import Review, ReviewSummary
+from core.testing import MarketplaceFixtures, create_order
 
 
-class ReviewTests(APITestCase):
+class ReviewTests(MarketplaceFixtures, APITestCase):
     def setUp(self):
-        self.customer = CustomUser.objects.create_user(
-            username='cust', email='cust@test.com', password='test1234',
-            first_name='Cust', last_name='User', user_type='customer',
-        )
-        self.owner = CustomUser.objects.create_user(
-            username='owner', email='owner@test.com', password='test1234',
-            user_type='restaurant_owner',
-        )
-        self.restaurant = Restaurant.objects.create(
-            owner=self.owner, name='Test Resto', slug='test-resto',
-            address='1 St', city='Karachi', phone='021111', email='r@t.com',
-            cuisine_type='Pakistani', is_active=True, is_approved=True,
-            delivery_fee=Decimal('100'), minimum_order=Decimal('200'),
-            estimated_delivery_time=30,
-            opening_time='10:00:00', closing_time='23:00:00',
-        )
-        cat = MenuCategory.objects.create(restaurant=self.restaurant, name='Main')
-        self.item = MenuItem.objects.create(
-            category=cat, restaurant=self.restaurant, name='Item 1',
-            slug='item-1', price=Decimal('300'), is_available=True,
-        )
-        self.order = Order.objects.create(
-            user=self.customer, restaurant=self.restaurant,
+        super().setUp()
+        self.order = create_order(
+            self.customer, self.restaurant,
             status='delivered', payment_method='cod', payment_status='paid',
-            total_amount=Decimal('300'), delivery_fee=Decimal('100'),
-            tax_amount=Decimal('15'), grand_total=Decimal('415'),
-            delivery_address='123 Test St', delivery_city='Karachi',
+            delivery_fee=Decimal('100'), tax_amount=Decimal('15'),
         )
         OrderItem.objects.create(order=self.order, menu_item=self.item, quantity=1, price=Decimal('300'))
 
@@ -73,3 +57,117 @@ class ReviewTests(APITestCase):
         self.restaurant.refresh_from_db()
         self.assertEqual(float(self.restaurant.average_rating), 4.0)
         self.assertEqual(self.restaurant.total_reviews, 1)
+
+    def _delivered_order(self):
+        return create_order(self.customer, self.restaurant, status='delivered')
+
+    def test_rating_totals_follow_reviews(self):
+        version = get_version(self.restaurant.slug)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Review.objects.create(user=self.customer, restaurant=self.restaurant, order=self.order, rating=4)
+            Review.objects.create(user=self.customer, restaurant=self.restaurant, order=self._delivered_order(), rating=5)
+        self.assertNotEqual(get_version(self.restaurant.slug), version)
+        self.restaurant.refresh_from_db()
+        self.assertEqual(
+            (self.restaurant.rating_sum, self.restaurant.total_reviews, self.restaurant.average_rating),
+            (9, 2, Decimal('4.50')),
+        )
+
+        first.delete()
+        self.restaurant.refresh_from_db()
+        self.assertEqual((self.restaurant.total_reviews, self.restaurant.average_rating), (1, Decimal('5.00')))
+
+    def test_recompute_ratings_repairs_drift(self):
+        Review.objects.create(user=self.customer, restaurant=self.restaurant, order=self.order, rating=3)
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(rating_sum=40, total_reviews=9, average_rating=Decimal('4.44'))
+
+        out = StringIO()
+        call_command('recompute_ratings', stdout=out)
+        self.assertIn('Corrected 1 restaurants; rebuilt 1 review summaries', out.getvalue())
+        self.restaurant.refresh_from_db()
+        self.assertEqual(
+            (self.restaurant.rating_sum, self.restaurant.total_reviews, self.restaurant.average_rating),
+            (3, 1, Decimal('3.00')),
+        )
+        call_command('recompute_ratings', stdout=out)
+        self.assertIn('Corrected 0 restaurants', out.getvalue())
+
+    def test_recompute_ratings_backfills_missing_summaries(self):
+        Review.objects.create(user=self.customer, restaurant=self.restaurant, order=self.order, rating=4)
+        ReviewSummary.objects.all().delete()
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(rating_sum=40)
+
+        out = StringIO()
+        call_command('recompute_ratings', '--missing', stdout=out)
+        self.assertIn('rebuilt 1 review summaries', out.getvalue())
+        self.assertEqual(ReviewSummary.objects.get().stars_4, 1)
+        # Rating totals are left to the full run.
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.rating_sum, 40)
+
+        call_command('recompute_ratings', '--missing', stdout=out)
+        self.assertIn('rebuilt 0 review summaries', out.getvalue())
+
+    def test_summary_is_maintained_without_reading_reviews(self):
+        url = f'/api/restaurants/{self.restaurant.slug}/reviews/summary/'
+        reviews = [
+            Review.objects.create(user=self.customer, restaurant=self.restaurant, order=order, rating=rating)
+            for order, rating in [(self.order, 5)] + [(self._delivered_order(), r) for r in (4, 4, 1, 5, 3, 5, 4, 2, 5, 4, 5)]
+        ]
+        with self.assertNumQueries(1):
+            resp = self.client.get(url)
+        self.assertEqual(resp.data['histogram'], {'1': 1, '2': 1, '3': 1, '4': 4, '5': 5})
+        self.assertEqual(resp.data['total_reviews'], 12)
+        self.assertEqual([r['id'] for r in resp.data['recent']], [r.id for r in reviews[::-1][:10]])
+        self.assertEqual(resp.data['recent'][0]['user_name'], 'Cust User')
+
+        # Deleting a review on the first page pulls the next one up.
+        reviews[-1].delete()
+        resp = self.client.get(url)
+        self.assertEqual(resp.data['histogram']['5'], 4)
+        self.assertEqual([r['id'] for r in resp.data['recent']], [r.id for r in reviews[-2::-1][:10]])
+
+    def test_summary_is_built_once_for_older_restaurants(self):
+        Review.objects.create(user=self.customer, restaurant=self.restaurant, order=self.order, rating=3)
+        ReviewSummary.objects.all().delete()
+        resp = self.client.get(f'/api/restaurants/{self.restaurant.slug}/reviews/summary/')
+        self.assertEqual(resp.data['histogram']['3'], 1)
+        self.assertEqual(len(resp.data['recent']), 1)
+        Review.objects.create(user=self.customer, restaurant=self.restaurant, order=self._delivered_order(), rating=3)
+        self.assertEqual(ReviewSummary.objects.get().stars_3, 2)
+
+
+class ConcurrentReviewTests(MarketplaceFixtures, TransactionTestCase):
+    WORKERS = 8
+
+    def setUp(self):
+        super().setUp()
+        self.orders = [
+            create_order(self.customer, self.restaurant, status='delivered')
+            for _ in range(self.WORKERS * 4)
+        ]
+
+    def _review(self, args):
+        order, rating = args
+        client = APIClient()
+        client.force_authenticate(user=self.customer)
+        try:
+            return client.post(
+                f'/api/restaurants/{self.restaurant.slug}/reviews/create/{order.order_number}/',
+                {'rating': rating},
+            ).status_code
+        finally:
+            connection.close()
+
+    def test_parallel_reviews_all_count(self):
+        jobs = [(order, i % 5 + 1) for i, order in enumerate(self.orders)]
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            codes = list(pool.map(self._review, jobs + jobs[:self.WORKERS]))
+        self.assertEqual(codes.count(201), len(self.orders))
+        self.assertEqual(codes.count(400), self.WORKERS)
+        self.restaurant.refresh_from_db()
+        self.assertEqual(self.restaurant.total_reviews, len(self.orders))
+        self.assertEqual(self.restaurant.rating_sum, sum(rating for _, rating in jobs))
+        summary = ReviewSummary.objects.get()
+        self.assertEqual(sum(summary.histogram.values()), len(self.orders))
+        self.assertEqual(len(summary.recent), 10)
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import CreateReviewView, RestaurantReviewListView
+from .views import CreateReviewView, RestaurantReviewListView, RestaurantReviewSummaryView
 
 urlpatterns = [
     path('<slug:slug>/reviews/', RestaurantReviewListView.as_view(), name='restaurant-reviews'),
+    path('<slug:slug>/reviews/summary/', RestaurantReviewSummaryView.as_view(), name='restaurant-review-summary'),
     path('<slug:slug>/reviews/create/<str:order_number>/', CreateReviewView.as_view(), name='create-review'),
 ]
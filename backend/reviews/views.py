@@ -3,17 +3,19 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
+from core.pagination import KeysetPaginationMixin
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg
+from django.db import transaction
 
 from restaurants.models import Restaurant
 from orders.models import Order
 from .models import Review
 from .serializers import ReviewCreateSerializer, ReviewListSerializer
+from .services import RECENT_REVIEWS, ReviewSummaryService
 
 
-class ReviewPagination(PageNumberPagination):
-    page_size = 10
+class ReviewPagination(KeysetPaginationMixin, PageNumberPagination):
+    page_size = RECENT_REVIEWS
 
 
 class CreateReviewView(APIView):
@@ -28,13 +30,9 @@ class CreateReviewView(APIView):
             context={'request': request, 'restaurant': restaurant, 'order': order},
         )
         serializer.is_valid(raise_exception=True)
-        review = serializer.save()
-
-        # Update restaurant stats
-        stats = Review.objects.filter(restaurant=restaurant).aggregate(avg=Avg('rating'))
-        restaurant.average_rating = round(stats['avg'] or 0, 2)
-        restaurant.total_reviews = Review.objects.filter(restaurant=restaurant).count()
-        restaurant.save(update_fields=['average_rating', 'total_reviews'])
+        # The restaurant's rating totals are updated in the same transaction.
+        with transaction.atomic():
+            review = serializer.save()
 
         return Response(ReviewListSerializer(review).data, status=status.HTTP_201_CREATED)
 
@@ -48,3 +46,19 @@ class RestaurantReviewListView(generics.ListAPIView):
         return Review.objects.filter(
             restaurant__slug=self.kwargs['slug']
         ).select_related('user', 'order').order_by('-created_at')
+
+
+class RestaurantReviewSummaryView(APIView):
+    """Rating, star histogram and newest reviews, read from precomputed rows."""
+
+    permission_classes = []
+
+    def get(self, request, slug):
+        restaurant = get_object_or_404(Restaurant.objects.select_related('review_summary'), slug=slug)
+        summary = ReviewSummaryService.get(restaurant)
+        return Response({
+            'average_rating': str(restaurant.average_rating),
+            'total_reviews': restaurant.total_reviews,
+            'histogram': summary.histogram,
+            'recent': summary.recent,
+        })